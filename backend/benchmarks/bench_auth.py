@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Mede o custo de autenticação por requisição: decodificar o JWT + buscar o User vs principal em cache.
+
+Uso: python benchmarks/bench_auth.py [requisições]
+"""
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from main import app
+from src.models import db
+from src.models.user import User
+from src.routes.auth import issue_tokens, load_principal, principal_cache
+
+
+def _seed():
+    user = User(username='benchmark', email='benchmark@email.com', family_id='familia_benchmark')
+    user.set_password('senha')
+    db.session.add(user)
+    db.session.commit()
+    return issue_tokens(user)['token']
+
+
+def _legacy(token):
+    # Caminho anterior: decodificação + User.query.get a cada requisição
+    secret_key = os.environ.get('JWT_SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+    data = jwt.decode(token, secret_key, algorithms=['HS256'])
+    return User.query.get(data['id'])
+
+
+def _measure(label, count, token, resolve):
+    headers = {'x-access-token': token}
+    start = time.perf_counter()
+    for _ in range(count):
+        with app.test_request_context(headers=headers):
+            resolve(token)
+            db.session.remove()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {elapsed:8.3f}s  {elapsed / count * 1e6:8.2f} µs/requisição")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with app.app_context():
+        token = _seed()
+    print(f"{count} requisições")
+    _measure('decode + User', count, token, _legacy)
+    principal_cache.clear()
+    _measure('principal em cache', count, token, lambda token: load_principal())
+    stats = principal_cache.stats()
+    print(f"cache: {stats['hits']} hits, {stats['misses']} misses")
+
+
+if __name__ == '__main__':
+    main()
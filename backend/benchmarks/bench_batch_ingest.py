@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Compara a vazão (linhas/s) de POST /api/transactions item a item com POST /api/transactions/batch.
+
+Uso: python benchmarks/bench_batch_ingest.py [quantidade]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Banco SQLite em arquivo temporário, para medir commits reais em disco
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+
+
+def _token(client):
+    client.post('/api/register', json={
+        'username': 'bench',
+        'email': 'bench@email.com',
+        'password': 'senha',
+        'confirm_password': 'senha'
+    })
+    return client.post('/api/auth/login', json={
+        'email': 'bench@email.com',
+        'password': 'senha'
+    }).get_json()['token']
+
+
+def _items(count):
+    return [{
+        'date': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+        'description': f'Lançamento {i}',
+        'category': ('Mercado', 'Transporte', 'Lazer', 'Moradia')[i % 4],
+        'amount': 10.0 + i % 100,
+        'transaction_type': 'despesa',
+        'payment_method': 'PIX'
+    } for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    client = app.test_client()
+    headers = {'x-access-token': _token(client)}
+    items = _items(count)
+
+    start = time.perf_counter()
+    for item in items:
+        client.post('/api/transactions', json=item, headers=headers)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/api/transactions/batch', json={'transactions': items}, headers=headers)
+    batch = time.perf_counter() - start
+    assert response.get_json()['created'] == count
+
+    print(f"{count} transações")
+    print(f"item a item: {single:8.3f}s  {count / single:10.0f} linhas/s")
+    print(f"lote:        {batch:8.3f}s  {count / batch:10.0f} linhas/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Mede latência e taxa de "database is locked" com escritores concorrentes nas rotas de orçamento.
+
+Cada thread é um membro de uma família diferente gravando o orçamento do mês
+e uma categoria, como faz a tela de Orçamento. Use um banco em arquivo para
+reproduzir a disputa pelo lock de escrita do SQLite.
+
+Uso: python benchmarks/bench_budget_writes.py [threads] [requisições_por_thread]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+
+
+def _token(client, username):
+    client.post('/api/register', json={
+        'username': username, 'email': f'{username}@email.com',
+        'password': 'senha', 'confirm_password': 'senha'
+    })
+    return client.post('/api/auth/login', json={
+        'email': f'{username}@email.com', 'password': 'senha'
+    }).get_json()['token']
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    tokens = [_token(app.test_client(), f'escritor{i}') for i in range(threads)]
+    latencies = []
+    locked = []
+    failed = []
+
+    def writer(token):
+        client = app.test_client()
+        headers = {'x-access-token': token}
+        for i in range(requests):
+            start = time.perf_counter()
+            if i % 2 == 0:
+                resp = client.post('/api/budget', json={
+                    'month': 1 + i % 12, 'year': 2025, 'planned_income': 5000, 'planned_expenses': i
+                }, headers=headers)
+            else:
+                budget_id = client.get('/api/budget/current', headers=headers).get_json()['id']
+                resp = client.post(f'/api/budget/{budget_id}/categories', json={
+                    'category_name': f'Categoria {i}', 'planned_amount': 100
+                }, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code >= 500:
+                body = resp.get_data(as_text=True)
+                (locked if 'locked' in body else failed).append(body)
+
+    workers = [threading.Thread(target=writer, args=(token,)) for token in tokens]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"{threads} escritores x {requests} requisições em {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"latência p50 {latencies[total // 2] * 1000:.2f} ms  p99 {latencies[int(total * 0.99) - 1] * 1000:.2f} ms")
+    print(f"database is locked: {len(locked)} ({len(locked) / total:.2%})  outros erros: {len(failed)}")
+
+
+if __name__ == '__main__':
+    main()
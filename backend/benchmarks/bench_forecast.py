@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Mede a vazão da previsão de fim de mês em famílias por segundo.
+
+Compara o lote (todas as famílias em uma passada vetorizada, como o job
+noturno) com uma chamada por família (como a rota /api/budget/forecast), e
+o custo só do cálculo NumPy sobre arrays já montados.
+
+Uso: python benchmarks/bench_forecast.py [famílias] [categorias]
+"""
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date
+import numpy as np
+from sqlalchemy import insert
+from main import app
+from src.models import db
+from src.models.rollup import MonthlyRollup
+from src.models.transaction import Transaction
+from src.services.forecast import HISTORY_MONTHS, compute_forecasts, family_forecast, project_month_end
+from src.services.periods import shift_month
+
+AS_OF = date(2025, 3, 20)
+
+
+def _seed(families, categories):
+    rng = np.random.default_rng(42)
+    transactions = []
+    rollup = []
+    for f in range(families):
+        family_id = f'familia_{f}'
+        for c in range(categories):
+            category = f'Categoria {c}'
+            for day in rng.choice(AS_OF.day, size=8, replace=False) + 1:
+                transactions.append({
+                    'family_id': family_id, 'date': AS_OF.replace(day=int(day)), 'description': category,
+                    'category': category, 'amount': float(rng.integers(5, 200)),
+                    'transaction_type': 'despesa', 'payment_method': 'PIX'
+                })
+            for months_back in range(1, HISTORY_MONTHS + 1):
+                year, month = shift_month(AS_OF.year, AS_OF.month, -months_back)
+                total = float(rng.integers(200, 2000))
+                rollup.append({
+                    'family_id': family_id, 'year': year, 'month': month, 'transaction_type': 'despesa',
+                    'category': category, 'total_amount': total, 'count': 1,
+                    'min_amount': total, 'max_amount': total
+                })
+    db.session.execute(insert(Transaction), transactions)
+    db.session.execute(insert(MonthlyRollup), rollup)
+    db.session.commit()
+    return len(transactions)
+
+
+def _report(label, families, elapsed):
+    print(f"{label:<26} {elapsed:8.3f}s  {families / elapsed:10.0f} famílias/s")
+
+
+def main():
+    families = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    categories = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with app.app_context():
+        count = _seed(families, categories)
+        print(f"{families} famílias x {categories} categorias, {count} transações no mês")
+
+        start = time.perf_counter()
+        result = compute_forecasts(AS_OF)
+        _report('lote (consulta + NumPy)', families, time.perf_counter() - start)
+
+        sample = min(families, 200)
+        start = time.perf_counter()
+        for f in range(sample):
+            family_forecast(f'familia_{f}', AS_OF)
+        _report('uma chamada por família', sample, time.perf_counter() - start)
+
+    series = families * categories
+    daily = np.random.default_rng(1).gamma(1.0, 20.0, size=(series, 31))
+    history = np.random.default_rng(2).gamma(4.0, 250.0, size=(series, HISTORY_MONTHS))
+    start = time.perf_counter()
+    project_month_end(daily, history, AS_OF.day, 31)
+    _report('só o cálculo NumPy', families, time.perf_counter() - start)
+    print(f"séries previstas no lote: {len(result['forecast'])}")
+
+
+if __name__ == '__main__':
+    main()
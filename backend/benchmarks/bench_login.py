@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Mede logins por segundo e a latência p99 das demais requisições durante uma rajada de logins.
+
+Compara o hashing na própria thread da requisição (workers=0) com o pool limitado.
+
+Uso: python benchmarks/bench_login.py [segundos] [threads_de_login] [threads_de_leitura]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from src.services import passwords
+from src.services.passwords import PasswordHasher
+
+
+def _token(client):
+    client.post('/api/register', json={
+        'username': 'benchmark', 'email': 'benchmark@email.com',
+        'password': 'senha', 'confirm_password': 'senha'
+    })
+    return client.post('/api/auth/login', json={
+        'email': 'benchmark@email.com', 'password': 'senha'
+    }).get_json()['token']
+
+
+def _run(label, duration, login_threads, read_threads, token):
+    stop = threading.Event()
+    logins = []
+    rejected = []
+    latencies = []
+
+    def login_loop():
+        client = app.test_client()
+        while not stop.is_set():
+            resp = client.post('/api/auth/login', json={
+                'email': 'benchmark@email.com', 'password': 'senha'
+            })
+            (logins if resp.status_code == 200 else rejected).append(1)
+
+    def read_loop():
+        client = app.test_client()
+        headers = {'x-access-token': token}
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get('/api/users/family-id', headers=headers)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(login_threads)]
+    threads += [threading.Thread(target=read_loop) for _ in range(read_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float('nan')
+    print(f"{label:<22} {len(logins) / duration:8.1f} logins/s  {len(rejected):5d} rejeitados  "
+          f"p99 leitura {p99:8.2f} ms  ({len(latencies)} leituras)")
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    login_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    read_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    token = _token(app.test_client())
+    print(f"{duration:.0f}s, {login_threads} threads de login, {read_threads} de leitura, "
+          f"método {passwords.HASH_METHOD}, {os.cpu_count()} CPUs")
+
+    for label, workers in (('hash na requisição', 0), (f'pool de {passwords.HASH_WORKERS}', passwords.HASH_WORKERS)):
+        passwords.hasher = PasswordHasher(workers=workers)
+        _run(label, duration, login_threads, read_threads, token)
+        passwords.hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
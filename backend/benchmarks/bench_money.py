@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Compara SUM/GROUP BY sobre valores FLOAT e sobre centavos inteiros (BIGINT), e a diferença acumulada.
+
+Uso: python benchmarks/bench_money.py [quantidade] [url do banco]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decimal import Decimal
+from sqlalchemy import create_engine, text
+
+QUERIES = {
+    'SUM total': 'SELECT SUM(amount) FROM {table}',
+    'GROUP BY categoria/mês': 'SELECT category, month, SUM(amount), COUNT(*) FROM {table} GROUP BY category, month',
+}
+
+
+def _seed(conn, count):
+    random.seed(42)
+    rows = [{
+        'category': f'categoria_{i % 30}',
+        'month': i % 60,
+        'cents': random.randint(1, 500000)
+    } for i in range(count)]
+    conn.execute(text('CREATE TABLE money_float (category VARCHAR(100), month INTEGER, amount FLOAT)'))
+    conn.execute(text('CREATE TABLE money_cents (category VARCHAR(100), month INTEGER, amount BIGINT)'))
+    conn.execute(text('INSERT INTO money_float VALUES (:category, :month, :amount)'),
+                 [dict(row, amount=row['cents'] / 100) for row in rows])
+    conn.execute(text('INSERT INTO money_cents VALUES (:category, :month, :cents)'), rows)
+    return sum(Decimal(row['cents']) for row in rows) / 100
+
+
+def _time(conn, sql, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = conn.execute(text(sql)).all()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    engine = create_engine(sys.argv[2] if len(sys.argv) > 2 else 'sqlite://')
+    with engine.begin() as conn:
+        exact = _seed(conn, count)
+        print(f"{count} linhas ({engine.dialect.name})")
+        for label, sql in QUERIES.items():
+            float_time, float_rows = _time(conn, sql.format(table='money_float'))
+            cents_time, cents_rows = _time(conn, sql.format(table='money_cents'))
+            print(f"{label:<24} FLOAT {float_time * 1000:9.1f} ms   BIGINT {cents_time * 1000:9.1f} ms")
+            if label == 'SUM total':
+                float_total = Decimal(repr(float_rows[0][0]))
+                cents_total = Decimal(cents_rows[0][0]) / 100
+                print(f"{'':<24} desvio FLOAT {float_total - exact}   desvio BIGINT {cents_total - exact}")
+        conn.execute(text('DROP TABLE money_float'))
+        conn.execute(text('DROP TABLE money_cents'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Mede a lista de revogação: memória por milhão de jti, custo do lookup e latência de revogação.
+
+Uso: python benchmarks/bench_revocation.py [quantidade]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from src.services import revocation
+from src.services.revocation import RevocationList, revoke_token, revoked_tokens, sync_revocations
+
+
+def _memory(count):
+    jtis = [uuid.uuid4().hex for _ in range(count)]
+    expires_at = time.time() + 3600
+    tracemalloc.start()
+    revocations = RevocationList()
+    for i, jti in enumerate(jtis):
+        revocations.add(jti, expires_at + i % 86400)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memória            {used / 1024 / 1024:8.1f} MiB para {count} jti "
+          f"({used / count:.0f} bytes/jti, {used / count * 1e6 / 1024 / 1024:.0f} MiB por milhão)")
+
+    probes = jtis[::max(count // 100000, 1)] + [uuid.uuid4().hex for _ in range(100000)]
+    start = time.perf_counter()
+    for jti in probes:
+        jti in revocations
+    elapsed = time.perf_counter() - start
+    print(f"lookup             {elapsed / len(probes) * 1e9:8.0f} ns/consulta")
+
+
+def _latency(count=1000):
+    expires_at = int(time.time()) + 3600
+    with app.app_context():
+        start = time.perf_counter()
+        for i in range(count):
+            revoke_token(uuid.uuid4().hex, 1, expires_at)
+        elapsed = time.perf_counter() - start
+        print(f"revogação local    {elapsed / count * 1000:8.2f} ms (commit + lista em memória)")
+
+        # Outro worker: só enxerga a revogação na próxima sincronização
+        revoked_tokens.clear()
+        revocation._synced_at['revoked_at'] = revocation.datetime(1970, 1, 1)
+        start = time.perf_counter()
+        sync_revocations(force=True)
+        elapsed = time.perf_counter() - start
+        print(f"sincronização      {elapsed * 1000:8.2f} ms para {len(revoked_tokens)} revogações; "
+              f"atraso máximo entre workers {revocation.SYNC_SECONDS:.0f}s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    _memory(count)
+    _latency()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Mede o custo por linha de listar transações via ORM + to_dict() e via plano de colunas do Core.
+
+Uso: python benchmarks/bench_serialization.py [quantidade]
+"""
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date, timedelta
+from flask import jsonify
+from sqlalchemy import insert
+from main import app
+from src.models import db
+from src.models.transaction import Transaction
+from src.services.serialization import list_family_rows
+
+FAMILY_ID = 'familia_benchmark'
+
+
+def _seed(count):
+    start = date(2015, 1, 1)
+    db.session.execute(insert(Transaction), [{
+        'family_id': FAMILY_ID,
+        'date': start + timedelta(days=i % 3650),
+        'description': f'Lançamento {i}',
+        'category': ('Mercado', 'Transporte', 'Lazer', 'Moradia')[i % 4],
+        'amount': 10.0 + i % 1000 / 10,
+        'transaction_type': 'despesa' if i % 5 else 'receita',
+        'payment_method': 'PIX'
+    } for i in range(count)])
+    db.session.commit()
+
+
+def _measure(label, count, build):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    body = jsonify(build()).get_data()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {elapsed:8.3f}s  {elapsed / count * 1e6:8.2f} µs/linha")
+    return body
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with app.test_request_context():
+        _seed(count)
+        print(f"{count} transações")
+        orm_body = _measure('ORM + to_dict', count, lambda: [
+            transaction.to_dict()
+            for transaction in Transaction.query.filter_by(family_id=FAMILY_ID).all()
+        ])
+        lean_body = _measure('plano do Core', count, lambda: list_family_rows(Transaction, FAMILY_ID))
+        print(f"saída idêntica: {orm_body == lean_body}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Mede a latência das sugestões de orçamento para uma família com anos de histórico.
+
+Uso: python benchmarks/bench_suggestions.py [anos] [transações_por_dia]
+"""
+import os
+import sys
+import tempfile
+import time
+from statistics import median
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault('FLASK_ENV', 'production')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date, timedelta
+from sqlalchemy import insert
+from main import app
+from src.models import db
+from src.models.rollup import rebuild_rollup
+from src.models.transaction import Transaction
+from src.services.budgets import MAX_SUGGESTION_MONTHS, build_budget_suggestions, cached_budget_suggestions
+from src.services.cache import suggestion_cache
+
+FAMILY_ID = 'familia_benchmark'
+CATEGORIES = ('Mercado', 'Transporte', 'Lazer', 'Moradia', 'Saúde', 'Educação', 'Restaurantes', 'Pets')
+
+
+def _seed(years, per_day):
+    start = date.today() - timedelta(days=365 * years)
+    rows = [{
+        'family_id': FAMILY_ID,
+        'date': start + timedelta(days=i // per_day),
+        'description': f'Lançamento {i}',
+        'category': CATEGORIES[i % len(CATEGORIES)],
+        'amount': 10.0 + i % 300,
+        'transaction_type': 'despesa' if i % 20 else 'receita',
+        'payment_method': 'PIX'
+    } for i in range(365 * years * per_day)]
+    db.session.execute(insert(Transaction), rows)
+    db.session.commit()
+    rebuild_rollup()
+    return len(rows)
+
+
+def _measure(label, runs, fn):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<28} mediana {median(timings) * 1000:8.3f} ms  máx {max(timings) * 1000:8.3f} ms")
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    today = date.today()
+    with app.app_context():
+        print(f"{_seed(years, per_day)} transações em {years} anos")
+        for months in (6, 24, MAX_SUGGESTION_MONTHS):
+            _measure(f'sem cache, janela {months}', 50,
+                     lambda: build_budget_suggestions(FAMILY_ID, today.year, today.month, months))
+        suggestion_cache.clear()
+        _measure('com cache, janela 6', 1000,
+                 lambda: cached_budget_suggestions(FAMILY_ID, today.year, today.month))
+
+
+if __name__ == '__main__':
+    main()
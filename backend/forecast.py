@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import os
+import time
+from datetime import date
+
+# Adiciona o backend ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.services.forecast import compute_forecasts, store_forecasts
+from main import app
+
+def main():
+    parser = argparse.ArgumentParser(description='Calcula e grava a previsão de gasto do mês de todas as famílias (job noturno)')
+    parser.add_argument('--date', type=date.fromisoformat, default=date.today(),
+                        help='Data de referência (AAAA-MM-DD); padrão: hoje')
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        result = compute_forecasts(args.date)
+        rows = store_forecasts(args.date, result)
+        elapsed = time.perf_counter() - start
+        families = len(set(result['family_id'].tolist()))
+        print(f"Previsão de {args.date:%m/%Y} gravada: {rows} categoria(s) de {families} família(s) em {elapsed:.2f}s")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
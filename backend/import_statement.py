@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import os
+
+# Adiciona o backend ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.services.events import family_changed
+from src.services.statement_import import STATEMENT_PARSERS, DEFAULT_CHUNK_SIZE, import_statement
+from main import app
+
+def print_progress(report):
+    print(f"{report['rows']} linha(s) lidas, {report['imported']} importada(s), "
+          f"{report['failed']} com erro - {report['rows_per_second']:.0f} linhas/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa um extrato bancário (CSV ou OFX) para uma família')
+    parser.add_argument('file')
+    parser.add_argument('--family-id', required=True)
+    parser.add_argument('--format', choices=sorted(STATEMENT_PARSERS))
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--encoding', default='utf-8-sig')
+    parser.add_argument('--category', default='Outros')
+    parser.add_argument('--payment-method', default='Importado')
+    args = parser.parse_args()
+
+    statement_format = args.format or os.path.splitext(args.file)[1].lstrip('.').lower()
+    if statement_format not in STATEMENT_PARSERS:
+        parser.error('formato não reconhecido; informe --format csv ou --format ofx')
+
+    committed = {'imported': 0}
+
+    def on_progress(report):
+        committed['imported'] = report['imported']
+        print_progress(report)
+
+    try:
+        with app.app_context(), open(args.file, encoding=args.encoding, errors='replace', newline='') as lines:
+            report = import_statement(
+                lines,
+                statement_format,
+                args.family_id,
+                chunk_size=args.chunk_size,
+                progress=on_progress,
+                category=args.category,
+                payment_method=args.payment_method
+            )
+    finally:
+        # Descarta o cache e avisa o servidor (com EVENTS_BACKEND=redis), mesmo após falha no meio
+        if committed['imported']:
+            family_changed(args.family_id, 'transactions', 'imported')
+
+    for error in report['errors']:
+        print(f"Linha {error['row']}: {error['error']}")
+    print(f"Concluído em {report['elapsed']:.2f}s")
+    return 0 if report['imported'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
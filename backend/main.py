@@ -5,10 +5,13 @@ import logging
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models import db
+from src.models.migrations import upgrade
+from src.services.revocation import load_revocations
 from src.routes.user import user_bp
 from src.routes.transactions import transactions_bp
 from src.routes.auth import auth_bp
 from src.routes.budget_simple import budget_bp
+from src.routes.events import events_bp
 
 # Adiciona o diretório 'backend' ao sys.path para garantir que as importações de 'src' funcionem
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -48,6 +51,7 @@ app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(transactions_bp, url_prefix='/api')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(budget_bp, url_prefix='/api')
+app.register_blueprint(events_bp, url_prefix='/api')
 
 # Configuração de banco de dados
 # O caminho para o banco de dados é ajustado para a nova estrutura
@@ -64,7 +68,8 @@ else:
     logging.basicConfig(level=logging.DEBUG)
 
 with app.app_context():
-    db.create_all()
+    upgrade()
+    load_revocations()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+import sys
+import os
+
+# Adiciona o backend ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.models import db
+from src.models.migrations import schema_version, upgrade
+from main import app
+
+def run_migrations():
+    # main já aplica as migrações na inicialização; aqui só relatamos o resultado
+    with app.app_context():
+        applied = upgrade()
+        print(f"Banco: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        for version, description in applied:
+            print(f"Migração {version} aplicada: {description}")
+        print(f"Versão do esquema: {schema_version(db.engine)}")
+
+if __name__ == "__main__":
+    run_migrations()
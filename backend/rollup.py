@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import os
+
+# Adiciona o backend ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.models import db
+from src.models.rollup import MonthlyRollup, verify_rollup, rebuild_rollup
+from src.models.transaction import Transaction
+from src.services.events import family_changed
+from main import app
+
+def affected_families(family_id):
+    if family_id is not None:
+        return [family_id]
+    return sorted(
+        set(db.session.scalars(db.select(Transaction.family_id).distinct()))
+        | set(db.session.scalars(db.select(MonthlyRollup.family_id).distinct()))
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica ou reconstrói o agregado mensal de transações')
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--family-id', help='Restringe a operação a uma família')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'rebuild':
+            families = affected_families(args.family_id)
+            rows = rebuild_rollup(args.family_id)
+            # O servidor em execução recalcula o dashboard (com EVENTS_BACKEND=redis)
+            for family_id in families:
+                family_changed(family_id, '*', 'resync')
+            print(f"Agregado reconstruído: {rows} linha(s) de {len(families)} família(s)")
+            return 0
+
+        drift = verify_rollup(args.family_id)
+        for item in drift:
+            print(f"Divergência em {item['key']}: esperado={item['expected']} gravado={item['stored']}")
+        print(f"{len(drift)} divergência(s) encontrada(s)")
+        return 1 if drift else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
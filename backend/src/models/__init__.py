@@ -4,6 +4,11 @@ db = SQLAlchemy()
 # Importar todos os modelos para garantir que sejam registrados
 from .user import User
 from .transaction import Transaction, CreditCard, Investment, Debt, Goal
+from .rollup import MonthlyRollup
+from .sync import FamilyChangeSequence, Tombstone
+from .token import RevokedToken
+from .forecast import SpendForecast
+from .budget_models import budgets_table, budget_categories_table
 # Temporariamente comentado para resolver importação circular
 # from .budget import Budget, BudgetCategory
 
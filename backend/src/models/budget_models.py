@@ -1,207 +1,269 @@
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, and_, text
-from flask_sqlalchemy import SQLAlchemy
-from flask import current_app
-
-# Acesso ao db através do current_app para evitar import circular
-def get_db():
-    """Helper para acessar db sem importação circular"""
-    try:
-        return current_app.extensions['sqlalchemy']
-    except:
-        # Fallback para desenvolvimento
-        from src.models import db
-        return db
+from sqlalchemy import bindparam, func, and_, text
+from src.models import db
+from src.models.money import from_cents
+from src.services.periods import shift_month
+
+# Tabelas criadas pelas migrações na inicialização (src/models/migrations.py)
+budgets_table = db.Table(
+    'budgets',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('family_id', db.String(50), nullable=False),
+    db.Column('month', db.Integer, nullable=False),
+    db.Column('year', db.Integer, nullable=False),
+    db.Column('total_income', db.Float, server_default=text('0.0')),
+    db.Column('total_planned', db.Float, server_default=text('0.0')),
+    db.Column('created_at', db.DateTime, server_default=func.current_timestamp()),
+    db.Column('updated_at', db.DateTime, server_default=func.current_timestamp()),
+    db.Index('uq_budgets_family_period', 'family_id', 'year', 'month', unique=True),
+    sqlite_autoincrement=True,
+)
+
+budget_categories_table = db.Table(
+    'budget_categories',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('budget_id', db.Integer, db.ForeignKey('budgets.id', ondelete='CASCADE'), nullable=False),
+    db.Column('category_name', db.String(100), nullable=False),
+    db.Column('planned_amount', db.Float, server_default=text('0.0')),
+    db.Column('spent_amount', db.Float, server_default=text('0.0')),
+    db.Column('color', db.String(7), server_default='#3B82F6'),
+    db.Column('description', db.Text),
+    db.Column('priority', db.Integer, server_default=text('2')),
+    db.Column('created_at', db.DateTime, server_default=func.current_timestamp()),
+    db.Column('updated_at', db.DateTime, server_default=func.current_timestamp()),
+    db.Index('uq_budget_categories_budget_name', 'budget_id', 'category_name', unique=True),
+    sqlite_autoincrement=True,
+)
+
+# Um orçamento por família e mês, garantido pelo índice único uq_budgets_family_period
+UPSERT_BUDGET_SQL = '''
+    INSERT INTO budgets (family_id, month, year, total_income, total_planned)
+    VALUES (:family_id, :month, :year, :total_income, :total_planned)
+    ON CONFLICT (family_id, year, month) DO UPDATE SET
+        total_income = excluded.total_income,
+        total_planned = excluded.total_planned,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING id
+'''
 
 class Budget:
-    """Modelo Budget usando padrão sem importação circular"""
-    
-    @staticmethod
-    def create_budget_table():
-        """Cria a tabela de orçamento dinamicamente"""
-        db = get_db()
-        
-        # Definir tabela budget se não existir
-        try:
-            with db.engine.connect() as conn:
-                # Tentar consultar a tabela para ver se existe
-                conn.execute(text('SELECT 1 FROM budgets LIMIT 1'))
-        except:
-            # Tabela não existe, criar
-            with db.engine.connect() as conn:
-                conn.execute(text('''
-                    CREATE TABLE budgets (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        family_id INTEGER NOT NULL,
-                        month INTEGER NOT NULL,
-                        year INTEGER NOT NULL,
-                        total_income FLOAT DEFAULT 0.0,
-                        total_planned FLOAT DEFAULT 0.0,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (family_id) REFERENCES users (family_id)
-                    )
-                '''))
-                conn.commit()
+    """Orçamento mensal da família, em SQL direto sobre a tabela budgets.
+
+    Os métodos usam db.session, a mesma conexão/transação da requisição, e não
+    fazem commit: a rota confirma tudo de uma vez ao final.
+    """
     
     @staticmethod
     def get_current_budget(family_id):
         """Obter orçamento atual da família"""
-        db = get_db()
         current_date = datetime.now()
         
-        Budget.create_budget_table()  # Garantir que tabela existe
+        result = db.session.execute(text('''
+            SELECT * FROM budgets 
+            WHERE family_id = :family_id 
+            AND month = :month 
+            AND year = :year
+        '''), {
+            'family_id': family_id,
+            'month': current_date.month,
+            'year': current_date.year
+        })
         
-        with db.engine.connect() as conn:
-            result = conn.execute(text('''
-                SELECT * FROM budgets 
-                WHERE family_id = :family_id 
-                AND month = :month 
-                AND year = :year
-            '''), {
-                'family_id': family_id,
-                'month': current_date.month,
-                'year': current_date.year
-            })
-            
-            row = result.fetchone()
-            if row:
-                return {
-                    'id': row[0],
-                    'family_id': row[1],
-                    'month': row[2], 
-                    'year': row[3],
-                    'total_income': row[4],
-                    'total_planned': row[5],
-                    'created_at': row[6],
-                    'updated_at': row[7]
-                }
+        row = result.fetchone()
+        if row:
+            return {
+                'id': row[0],
+                'family_id': row[1],
+                'month': row[2], 
+                'year': row[3],
+                'total_income': row[4],
+                'total_planned': row[5],
+                'created_at': row[6],
+                'updated_at': row[7]
+            }
         return None
     
     @staticmethod
     def create_or_update_budget(family_id, month, year, total_income=0.0, total_planned=0.0):
-        """Criar ou atualizar orçamento"""
-        db = get_db()
-        Budget.create_budget_table()
-        
-        with db.engine.connect() as conn:
-            # Verificar se já existe
-            result = conn.execute(text('''
-                SELECT id FROM budgets 
-                WHERE family_id = :family_id AND month = :month AND year = :year
-            '''), {'family_id': family_id, 'month': month, 'year': year})
-            
-            existing = result.fetchone()
-            
-            if existing:
-                # Atualizar existente
-                conn.execute(text('''
-                    UPDATE budgets 
-                    SET total_income = :total_income, 
-                        total_planned = :total_planned,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = :id
-                '''), {
-                    'total_income': total_income,
-                    'total_planned': total_planned, 
-                    'id': existing[0]
-                })
-                budget_id = existing[0]
-            else:
-                # Criar novo
-                result = conn.execute(text('''
-                    INSERT INTO budgets (family_id, month, year, total_income, total_planned)
-                    VALUES (:family_id, :month, :year, :total_income, :total_planned)
-                '''), {
-                    'family_id': family_id,
-                    'month': month,
-                    'year': year,
-                    'total_income': total_income,
-                    'total_planned': total_planned
-                })
-                budget_id = result.lastrowid
-            
-            conn.commit()
-            return budget_id
+        """Criar ou atualizar orçamento em um único comando atômico"""
+        return db.session.execute(text(UPSERT_BUDGET_SQL), {
+            'family_id': family_id,
+            'month': month,
+            'year': year,
+            'total_income': total_income,
+            'total_planned': total_planned
+        }).scalar()
 
-class BudgetCategory:
-    """Modelo BudgetCategory usando padrão sem importação circular"""
-    
     @staticmethod
-    def create_category_table():
-        """Cria a tabela de categorias de orçamento dinamicamente"""
-        db = get_db()
-        
-        try:
-            with db.engine.connect() as conn:
-                # Tentar consultar a tabela para ver se existe
-                conn.execute(text('SELECT 1 FROM budget_categories LIMIT 1'))
-        except:
-            # Tabela não existe, criar
-            with db.engine.connect() as conn:
-                conn.execute(text('''
-                    CREATE TABLE budget_categories (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        budget_id INTEGER NOT NULL,
-                        category_name VARCHAR(100) NOT NULL,
-                        planned_amount FLOAT DEFAULT 0.0,
-                        spent_amount FLOAT DEFAULT 0.0,
-                        color VARCHAR(7) DEFAULT '#3B82F6',
-                        description TEXT,
-                        priority INTEGER DEFAULT 2,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (budget_id) REFERENCES budgets (id) ON DELETE CASCADE
-                    )
-                '''))
-                conn.commit()
+    def ensure_budget(family_id, month, year):
+        """Criar orçamento vazio para o mês se ainda não existir, sem tocar em um existente"""
+        db.session.execute(text('''
+            INSERT INTO budgets (family_id, month, year)
+            VALUES (:family_id, :month, :year)
+            ON CONFLICT (family_id, year, month) DO NOTHING
+        '''), {'family_id': family_id, 'month': month, 'year': year})
+
+    @staticmethod
+    def belongs_to(budget_id, family_id):
+        """Verificar se o orçamento pertence à família"""
+        return db.session.execute(text('''
+            SELECT 1 FROM budgets WHERE id = :id AND family_id = :family_id
+        '''), {'id': budget_id, 'family_id': family_id}).first() is not None
+
+    @staticmethod
+    def rollover(family_id, year, month, months, adjustment_percent=0.0):
+        """Copiar o orçamento de year/month e suas categorias para os `months` meses seguintes.
+
+        Usa um INSERT ... SELECT para os orçamentos e outro para as categorias,
+        independente da quantidade de meses e categorias. Meses de destino que
+        já têm orçamento, ou que um rollover concorrente acabou de criar, são
+        mantidos como estão. Retorna None se o mês de
+        origem não tiver orçamento, ou (id de origem, meses criados, meses
+        ignorados, categorias copiadas).
+        """
+        source = db.session.execute(text('''
+            SELECT id FROM budgets
+            WHERE family_id = :family_id AND month = :month AND year = :year
+        '''), {'family_id': family_id, 'month': month, 'year': year}).fetchone()
+        if not source:
+            return None
+
+        targets = [shift_month(year, month, offset) for offset in range(1, months + 1)]
+
+        # Meses de destino como CTE: SELECT :year_0, :month_0 UNION ALL SELECT ...
+        params = {'family_id': family_id, 'source_id': source[0], 'factor': 1 + adjustment_percent / 100}
+        selects = []
+        for i, (target_year, target_month) in enumerate(targets):
+            selects.append(f'SELECT :year_{i}, :month_{i}')
+            params[f'year_{i}'] = target_year
+            params[f'month_{i}'] = target_month
+        targets_cte = f"WITH targets (year, month) AS ({' UNION ALL '.join(selects)})"
+
+        # ON CONFLICT mantém os meses que já têm orçamento, inclusive os criados por
+        # um rollover concorrente; o RETURNING diz quais foram criados por este
+        inserted = db.session.execute(text('''
+            INSERT INTO budgets (family_id, month, year, total_income, total_planned)
+            ''' + targets_cte + '''
+            SELECT b.family_id, t.month, t.year,
+                   ROUND(CAST(b.total_income * :factor AS NUMERIC), 2),
+                   ROUND(CAST(b.total_planned * :factor AS NUMERIC), 2)
+            FROM budgets b CROSS JOIN targets t
+            WHERE b.id = :source_id
+            ON CONFLICT (family_id, year, month) DO NOTHING
+            RETURNING id, year, month
+        '''), params).all()
+        created_ids = {(row[1], row[2]): row[0] for row in inserted}
+        created = [target for target in targets if target in created_ids]
+        skipped = [target for target in targets if target not in created_ids]
+        if not created:
+            return source[0], created, skipped, 0
+
+        result = db.session.execute(text('''
+            INSERT INTO budget_categories
+            (budget_id, category_name, planned_amount, color, description, priority)
+            SELECT nb.id, bc.category_name,
+                   ROUND(CAST(bc.planned_amount * :factor AS NUMERIC), 2),
+                   bc.color, bc.description, bc.priority
+            FROM budget_categories bc CROSS JOIN budgets nb
+            WHERE bc.budget_id = :source_id AND nb.id IN :budget_ids
+        ''').bindparams(bindparam('budget_ids', expanding=True)), {
+            'source_id': source[0],
+            'factor': params['factor'],
+            'budget_ids': list(created_ids.values())
+        })
+        return source[0], created, skipped, result.rowcount
+
+class BudgetCategory:
+    """Categoria de um orçamento; mesma convenção de sessão de Budget"""
     
     @staticmethod
     def create_category(budget_id, category_name, planned_amount, color='#3B82F6', description='', priority=2):
         """Criar nova categoria de orçamento"""
-        db = get_db()
-        BudgetCategory.create_category_table()
-        
-        with db.engine.connect() as conn:
-            result = conn.execute(text('''
-                INSERT INTO budget_categories 
+        result = db.session.execute(text('''
+            INSERT INTO budget_categories 
+            (budget_id, category_name, planned_amount, color, description, priority)
+            VALUES (:budget_id, :category_name, :planned_amount, :color, :description, :priority)
+        '''), {
+            'budget_id': budget_id,
+            'category_name': category_name,
+            'planned_amount': planned_amount,
+            'color': color,
+            'description': description,
+            'priority': priority
+        })
+        return result.lastrowid
+    
+    @staticmethod
+    def replace_categories(budget_id, categories):
+        """Aplicar a lista completa de categorias do orçamento como diferença.
+
+        As categorias são identificadas pelo nome: as ausentes da lista são
+        removidas em um DELETE e as demais inseridas ou atualizadas em um único
+        INSERT ... ON CONFLICT sobre o índice (budget_id, category_name).
+        Retorna (removidas, gravadas).
+        """
+        names = [category['category_name'] for category in categories]
+        if names:
+            deleted = db.session.execute(text('''
+                DELETE FROM budget_categories
+                WHERE budget_id = :budget_id AND category_name NOT IN :names
+            ''').bindparams(bindparam('names', expanding=True)), {'budget_id': budget_id, 'names': names})
+        else:
+            deleted = db.session.execute(text(
+                'DELETE FROM budget_categories WHERE budget_id = :budget_id'
+            ), {'budget_id': budget_id})
+        if categories:
+            db.session.execute(text('''
+                INSERT INTO budget_categories
                 (budget_id, category_name, planned_amount, color, description, priority)
                 VALUES (:budget_id, :category_name, :planned_amount, :color, :description, :priority)
-            '''), {
-                'budget_id': budget_id,
-                'category_name': category_name,
-                'planned_amount': planned_amount,
-                'color': color,
-                'description': description,
-                'priority': priority
-            })
-            conn.commit()
-            return result.lastrowid
+                ON CONFLICT (budget_id, category_name) DO UPDATE SET
+                    planned_amount = excluded.planned_amount,
+                    color = excluded.color,
+                    description = excluded.description,
+                    priority = excluded.priority,
+                    updated_at = CURRENT_TIMESTAMP
+            '''), [dict(category, budget_id=budget_id) for category in categories])
+        return deleted.rowcount, len(categories)
     
     @staticmethod
     def get_categories_by_budget(budget_id):
-        """Obter categorias por ID do orçamento"""
-        db = get_db()
-        BudgetCategory.create_category_table()
+        """Obter categorias por ID do orçamento, com o gasto real do mês.
+
+        O gasto vem do agregado mensal (monthly_rollup) em um único LEFT JOIN,
+        então o custo não cresce com o número de categorias.
+        """
+        result = db.session.execute(text('''
+            SELECT bc.id, bc.budget_id, bc.category_name, bc.planned_amount,
+                   COALESCE(r.total_amount, 0) AS spent_cents,
+                   bc.color, bc.description, bc.priority, bc.created_at, bc.updated_at
+            FROM budget_categories bc
+            JOIN budgets b ON b.id = bc.budget_id
+            LEFT JOIN monthly_rollup r
+                ON r.family_id = b.family_id
+                AND r.year = b.year
+                AND r.month = b.month
+                AND r.transaction_type = 'despesa'
+                AND r.category = bc.category_name
+            WHERE bc.budget_id = :budget_id
+            ORDER BY bc.priority ASC, bc.category_name ASC
+        '''), {'budget_id': budget_id})
         
-        with db.engine.connect() as conn:
-            result = conn.execute(text('''
-                SELECT * FROM budget_categories WHERE budget_id = :budget_id
-                ORDER BY priority ASC, category_name ASC
-            '''), {'budget_id': budget_id})
-            
-            categories = []
-            for row in result:
-                categories.append({
-                    'id': row[0],
-                    'budget_id': row[1],
-                    'category_name': row[2],
-                    'planned_amount': row[3],
-                    'spent_amount': row[4],
-                    'color': row[5],
-                    'description': row[6],
-                    'priority': row[7],
-                    'created_at': row[8],
-                    'updated_at': row[9]
-                })
-            return categories
+        categories = []
+        for row in result:
+            spent = from_cents(row[4])
+            categories.append({
+                'id': row[0],
+                'budget_id': row[1],
+                'category_name': row[2],
+                'planned_amount': row[3],
+                'spent_amount': spent,
+                # Nome usado pela tela de Orçamento
+                'actual_spent': spent,
+                'color': row[5],
+                'description': row[6],
+                'priority': row[7],
+                'created_at': row[8],
+                'updated_at': row[9]
+            })
+        return categories
@@ -0,0 +1,21 @@
+from datetime import datetime
+from src.models import db
+from src.models.money import Money
+
+
+class SpendForecast(db.Model):
+    """Previsão de gasto no fim do mês por família e categoria, gravada pelo job noturno"""
+    __tablename__ = 'spend_forecast'
+    __table_args__ = (
+        db.UniqueConstraint('family_id', 'year', 'month', 'category', name='uq_spend_forecast_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    family_id = db.Column(db.String(50), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    as_of = db.Column(db.Date, nullable=False)
+    spent_to_date = db.Column(Money(), nullable=False)
+    forecast = db.Column(Money(), nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,391 @@
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import Float, Integer, MetaData, Numeric, func, insert, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from src.models import db
+from src.models.rollup import rebuild_rollup
+from src.models.money import Money
+from src.models.sync import SYNCED_MODELS, FamilyChangeSequence, Tombstone
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos no SQLite
+    fcntl = None
+
+
+def create_missing_indexes(engine):
+    """Cria os índices declarados nos modelos que ainda não existem no banco.
+
+    `db.create_all()` só cria índices junto com tabelas novas; bancos já
+    existentes (SQLite ou Postgres) recebem os índices por aqui.
+    """
+    created = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+                created.append(index.name)
+    return created
+
+
+def add_missing_columns(engine):
+    """Adiciona às tabelas existentes as colunas novas (anuláveis) dos modelos"""
+    added = []
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def backfill_change_sequences(engine):
+    """Numera registros anteriores à sincronização incremental.
+
+    Registros sem `change_seq` recebem 1 e cada família com dados passa a ter
+    contador, para que alterações novas sempre fiquem acima do cursor de
+    quem fez a sincronização completa.
+    """
+    families = set()
+    with engine.begin() as conn:
+        for model in SYNCED_MODELS.values():
+            table = model.__table__
+            families.update(conn.execute(
+                select(table.c.family_id).where(table.c.change_seq.is_(None)).distinct()
+            ).scalars())
+            conn.execute(
+                update(table)
+                .where(table.c.change_seq.is_(None))
+                .values(change_seq=1, updated_at=func.coalesce(table.c.updated_at, table.c.created_at))
+            )
+        sequences = FamilyChangeSequence.__table__
+        known = set(conn.execute(select(sequences.c.family_id)).scalars())
+        missing = families - known
+        if missing:
+            conn.execute(insert(sequences), [{'family_id': family_id, 'last_seq': 1} for family_id in missing])
+    return len(families)
+
+
+def _float_money_columns(engine, table):
+    """Colunas Money do modelo que ainda estão como ponto flutuante no banco"""
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []
+    money_columns = {column.name for column in table.columns if isinstance(column.type, Money)}
+    return [
+        column['name'] for column in inspector.get_columns(table.name)
+        if column['name'] in money_columns and isinstance(column['type'], (Float, Numeric))
+    ]
+
+
+def convert_money_columns(engine):
+    """Migra colunas monetárias de FLOAT para centavos inteiros (BIGINT).
+
+    No Postgres a conversão é um ALTER COLUMN ... USING. O SQLite não altera
+    tipos de coluna, então a tabela é reconstruída com o esquema atual do
+    modelo e os dados são copiados com os valores multiplicados por 100.
+    """
+    converted = []
+    for table in db.metadata.sorted_tables:
+        columns = _float_money_columns(engine, table)
+        if not columns:
+            continue
+        with engine.begin() as conn:
+            if engine.dialect.name == 'sqlite':
+                _rebuild_sqlite_table(conn, table, columns)
+            else:
+                for name in columns:
+                    conn.execute(text(
+                        f'ALTER TABLE "{table.name}" ALTER COLUMN {name} TYPE BIGINT '
+                        f'USING round({name} * 100)::bigint'
+                    ))
+        converted.extend(f'{table.name}.{name}' for name in columns)
+    return converted
+
+
+def _rebuild_sqlite_table(conn, table, money_columns=()):
+    legacy_name = f'{table.name}_legacy'
+    conn.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{legacy_name}"'))
+    # Índices e triggers acompanham a tabela renomeada; liberar os nomes
+    for kind, name in conn.execute(text(
+        "SELECT type, name FROM sqlite_master WHERE tbl_name = :table AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ), {'table': legacy_name}).all():
+        conn.execute(text(f'DROP {kind.upper()} "{name}"'))
+    table.create(conn)
+
+    legacy_columns = {column['name'] for column in inspect(conn).get_columns(legacy_name)}
+    names = [column.name for column in table.columns if column.name in legacy_columns]
+    targets = ', '.join(f'"{name}"' for name in names)
+    values = ', '.join(
+        f'CAST(ROUND("{name}" * 100) AS INTEGER)' if name in money_columns else f'"{name}"'
+        for name in names
+    )
+    conn.execute(text(f'INSERT INTO "{table.name}" ({targets}) SELECT {values} FROM "{legacy_name}"'))
+    conn.execute(text(f'DROP TABLE "{legacy_name}"'))
+
+
+# Busca textual: tabela FTS5 de conteúdo externo no SQLite, mantida por triggers
+SQLITE_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS transaction_fts USING fts5(
+        description,
+        content='transaction',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER transaction_fts_ai AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO transaction_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER transaction_fts_ad AFTER DELETE ON "transaction" BEGIN
+        INSERT INTO transaction_fts(transaction_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER transaction_fts_au AFTER UPDATE OF description ON "transaction" BEGIN
+        INSERT INTO transaction_fts(transaction_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO transaction_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+)
+
+SQLITE_SEARCH_TRIGGERS = ('transaction_fts_ai', 'transaction_fts_ad', 'transaction_fts_au')
+
+# No Postgres, um índice GIN sobre a expressão tsvector dispensa triggers. O texto
+# passa por unaccent, como o remove_diacritics do FTS5: 'acucar' encontra 'açúcar'.
+# unaccent() é só STABLE; o wrapper IMMUTABLE permite usá-lo na expressão do índice
+POSTGRES_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$""",
+    "DROP INDEX IF EXISTS ix_transaction_description_fts",
+    """CREATE INDEX IF NOT EXISTS ix_transaction_description_unaccent_fts ON "transaction"
+        USING gin (to_tsvector('portuguese', immutable_unaccent(description)))""",
+)
+
+
+def create_search_index(engine):
+    """Cria o índice de busca textual sobre as descrições das transações"""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            for statement in POSTGRES_SEARCH_DDL:
+                conn.execute(text(statement))
+            return True
+        if engine.dialect.name != 'sqlite':
+            return False
+
+        triggers = set(conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'transaction_fts_%'"
+        )).scalars())
+        if triggers == set(SQLITE_SEARCH_TRIGGERS):
+            return True
+        conn.execute(text(SQLITE_SEARCH_DDL[0]))
+        for name in triggers:
+            conn.execute(text(f'DROP TRIGGER {name}'))
+        for statement in SQLITE_SEARCH_DDL[1:]:
+            conn.execute(text(statement))
+        # Sem triggers o índice pode estar defasado: reconstruir a partir da tabela
+        conn.execute(text("INSERT INTO transaction_fts(transaction_fts) VALUES ('rebuild')"))
+    return True
+
+
+def dedupe_budget_categories(engine):
+    """Remove categorias repetidas no mesmo orçamento antes do índice único (budget_id, category_name)"""
+    with engine.begin() as conn:
+        return conn.execute(text('''
+            DELETE FROM budget_categories
+            WHERE id NOT IN (
+                SELECT MIN(id) FROM budget_categories GROUP BY budget_id, category_name
+            )
+        ''')).rowcount
+
+
+def _dedupe_budgets(conn):
+    """Mantém o orçamento mais antigo de cada (family_id, ano, mês) e move para ele as categorias dos repetidos"""
+    duplicates = conn.execute(text('''
+        SELECT b.id, (
+            SELECT MIN(k.id) FROM budgets k
+            WHERE k.family_id = b.family_id AND k.year = b.year AND k.month = b.month
+        ) AS keeper
+        FROM budgets b
+    ''')).all()
+    removed = 0
+    for budget_id, keeper in duplicates:
+        if budget_id == keeper:
+            continue
+        conn.execute(text('''
+            UPDATE budget_categories SET budget_id = :keeper
+            WHERE budget_id = :id AND category_name NOT IN (
+                SELECT category_name FROM budget_categories WHERE budget_id = :keeper
+            )
+        '''), {'id': budget_id, 'keeper': keeper})
+        conn.execute(text('DELETE FROM budget_categories WHERE budget_id = :id'), {'id': budget_id})
+        conn.execute(text('DELETE FROM budgets WHERE id = :id'), {'id': budget_id})
+        removed += 1
+    return removed
+
+
+def convert_budget_family_ids(engine):
+    """Converte budgets.family_id de INTEGER para VARCHAR e remove orçamentos repetidos no mês.
+
+    O family_id é um UUID em texto; a coluna antiga era INTEGER e o índice
+    único (family_id, year, month), criado logo depois, exige os dois ajustes.
+    """
+    table = db.metadata.tables['budgets']
+    column = next(c for c in inspect(engine).get_columns('budgets') if c['name'] == 'family_id')
+    with engine.begin() as conn:
+        removed = _dedupe_budgets(conn)
+        if not isinstance(column['type'], Integer):
+            return removed
+        if engine.dialect.name == 'sqlite':
+            # Cria a tabela nova e renomeia ao final: renomear a antiga reescreveria a
+            # FOREIGN KEY de budget_categories para o nome temporário
+            new_table = table.to_metadata(MetaData(), name='budgets_new')
+            new_table.indexes.clear()
+            new_table.create(conn)
+            names = ', '.join(f'"{c.name}"' for c in table.columns)
+            values = ', '.join('CAST(family_id AS TEXT)' if c.name == 'family_id' else f'"{c.name}"'
+                               for c in table.columns)
+            conn.execute(text(f'INSERT INTO budgets_new ({names}) SELECT {values} FROM budgets'))
+            conn.execute(text('DROP TABLE budgets'))
+            conn.execute(text('ALTER TABLE budgets_new RENAME TO budgets'))
+        else:
+            conn.execute(text(
+                'ALTER TABLE budgets ALTER COLUMN family_id TYPE VARCHAR(50) USING family_id::varchar'
+            ))
+    return removed
+
+
+def autoincrement_synced_ids(engine):
+    """Reconstrói no SQLite as tabelas sincronizadas com AUTOINCREMENT.
+
+    Sem ele o SQLite reutiliza o maior id excluído, e o tombstone do item
+    antigo apagaria o novo nos clientes. O contador começa acima dos ids já
+    excluídos registrados em tombstones. No Postgres as sequências nunca
+    reutilizam ids.
+    """
+    if engine.dialect.name != 'sqlite':
+        return []
+    rebuilt = []
+    with engine.begin() as conn:
+        for entity, model in SYNCED_MODELS.items():
+            table = model.__table__
+            ddl = conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"
+            ), {'table': table.name}).scalar()
+            if ddl is None or 'AUTOINCREMENT' in ddl.upper():
+                continue
+            _rebuild_sqlite_table(conn, table)
+            last_id = max(
+                conn.execute(select(func.max(table.c.id))).scalar() or 0,
+                conn.execute(select(func.max(Tombstone.entity_id)).where(Tombstone.entity == entity)).scalar() or 0,
+            )
+            conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :table'), {'table': table.name})
+            conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:table, :seq)'),
+                         {'table': table.name, 'seq': last_id})
+            rebuilt.append(table.name)
+    if 'transaction' in rebuilt:
+        # A reconstrução remove os triggers da busca textual
+        create_search_index(engine)
+    return rebuilt
+
+
+class SchemaVersion(db.Model):
+    """Migrações versionadas já aplicadas neste banco"""
+    __tablename__ = 'schema_version'
+
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Migrações de dados e de estruturas fora dos modelos, em ordem; cada uma roda
+# uma única vez por banco. Tabelas, colunas anuláveis e índices declarados nos
+# modelos continuam sendo criados por create_all/add_missing_columns.
+MIGRATIONS = (
+    (1, 'colunas monetárias em centavos', convert_money_columns),
+    (2, 'numeração das alterações para a sincronização', backfill_change_sequences),
+    (3, 'índice de busca textual das transações', create_search_index),
+    (4, 'agregado mensal das transações', lambda engine: rebuild_rollup()),
+    (5, 'categorias de orçamento únicas por nome', dedupe_budget_categories),
+    (6, 'family_id dos orçamentos como texto e um orçamento por mês', convert_budget_family_ids),
+    (7, 'ids das tabelas sincronizadas nunca reutilizados', autoincrement_synced_ids),
+    (8, 'busca textual sem acentos também no Postgres', create_search_index),
+)
+
+
+def schema_version(engine):
+    """Maior versão aplicada, ou 0 em um banco sem migrações registradas"""
+    with engine.connect() as conn:
+        return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+# Chave do advisory lock do Postgres que serializa as migrações entre workers
+MIGRATION_LOCK_KEY = 0x706c616e6e6572
+
+
+@contextmanager
+def migration_lock(engine):
+    """Serializa upgrade() entre processos que sobem juntos.
+
+    No Postgres usa um advisory lock de sessão; no SQLite em arquivo, um
+    flock em `<banco>.migrate.lock`. Sem ele, dois workers veriam as mesmas
+    colunas FLOAT e converteriam os valores para centavos duas vezes.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.execute(select(func.pg_advisory_lock(MIGRATION_LOCK_KEY)))
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(select(func.pg_advisory_unlock(MIGRATION_LOCK_KEY)))
+                conn.commit()
+        return
+
+    database = engine.url.database
+    if engine.dialect.name != 'sqlite' or fcntl is None or not database or database == ':memory:':
+        # Banco em memória é de um único processo
+        yield
+        return
+    with open(f'{database}.migrate.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def upgrade():
+    """Aplica as migrações pendentes no banco configurado.
+
+    Roda na inicialização da aplicação e pelo migrate.py, sob migration_lock;
+    retorna as migrações aplicadas nesta execução.
+    """
+    with migration_lock(db.engine):
+        return _upgrade()
+
+
+def _upgrade():
+    db.create_all()
+    add_missing_columns(db.engine)
+    with db.engine.connect() as conn:
+        done = set(conn.execute(select(SchemaVersion.version)).scalars())
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        migrate(db.engine)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(SchemaVersion), {'version': version, 'description': description})
+        except IntegrityError:
+            # Bancos sem lock entre processos: outro aplicou a mesma versão em paralelo
+            pass
+        applied.append((version, description))
+    create_missing_indexes(db.engine)
+    return applied
@@ -0,0 +1,43 @@
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import BigInteger, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+
+def to_cents(amount):
+    """Converte um valor em reais para centavos inteiros, com arredondamento comercial"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Converte centavos inteiros para reais, só na fronteira com o JSON"""
+    return cents / 100
+
+
+class Money(TypeDecorator):
+    """Valor monetário armazenado como centavos inteiros (BIGINT).
+
+    A aplicação continua lendo e gravando reais (float), mas o banco guarda
+    unidades mínimas exatas: SUM/MIN/MAX rodam sobre inteiros e o resultado
+    só é convertido para reais ao ser lido.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return from_cents(int(value))
+
+    @property
+    def python_type(self):
+        return float
+
+
+def cents(column):
+    """Expressão que lê uma coluna Money (ou um agregado dela) como centavos inteiros"""
+    return type_coerce(column, BigInteger)
@@ -0,0 +1,243 @@
+from sqlalchemy import BigInteger, bindparam, func, extract
+from src.models import db
+from src.models.transaction import Transaction
+from src.models.money import Money, cents, to_cents
+from src.services.periods import month_bounds
+
+# Valores em centavos inteiros: a verificação compara somas, mínimos e máximos
+# de forma exata, sem tolerância de ponto flutuante
+DRIFT_TOLERANCE = 0
+
+
+class MonthlyRollup(db.Model):
+    """Agregado mensal de transações por família, tipo e categoria.
+
+    Mantido de forma incremental nas escritas de transações, dentro da mesma
+    transação de banco, para que o dashboard e o orçamento leiam
+    O(meses × categorias) linhas em vez de varrer a tabela de transações.
+    """
+    __tablename__ = 'monthly_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('family_id', 'year', 'month', 'transaction_type', 'category',
+                            name='uq_monthly_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    family_id = db.Column(db.String(50), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    transaction_type = db.Column(db.String(20), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    total_amount = db.Column(Money(), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    min_amount = db.Column(Money())
+    max_amount = db.Column(Money())
+
+    def __repr__(self):
+        return f'<MonthlyRollup {self.family_id} {self.month:02d}/{self.year} {self.category}: R$ {self.total_amount}>'
+
+    def key(self):
+        return (self.family_id, self.year, self.month, self.transaction_type, self.category)
+
+
+def _rollup_row(family_id, year, month, transaction_type, category):
+    return MonthlyRollup.query.filter_by(
+        family_id=family_id,
+        year=year,
+        month=month,
+        transaction_type=transaction_type,
+        category=category
+    ).with_for_update().first()
+
+
+def upsert_rollup(connection, deltas):
+    """Soma deltas ao agregado com um único INSERT ... ON CONFLICT DO UPDATE.
+
+    `deltas` mapeia (family_id, ano, mês, tipo, categoria) para (total, count,
+    mínimo, máximo) em centavos. O incremento é atômico no banco: duas escritas
+    concorrentes que criam o mesmo grupo não colidem no índice único.
+    """
+    if not deltas:
+        return
+    table = MonthlyRollup.__table__
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        least, greatest = func.least, func.greatest
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        # min/max com dois argumentos são funções escalares no SQLite
+        least, greatest = func.min, func.max
+
+    statement = insert(table).values(
+        family_id=bindparam('k_family_id'),
+        year=bindparam('k_year'),
+        month=bindparam('k_month'),
+        transaction_type=bindparam('k_transaction_type'),
+        category=bindparam('k_category'),
+        total_amount=bindparam('k_total', type_=BigInteger),
+        count=bindparam('k_count'),
+        min_amount=bindparam('k_min', type_=BigInteger),
+        max_amount=bindparam('k_max', type_=BigInteger),
+    )
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=['family_id', 'year', 'month', 'transaction_type', 'category'],
+        set_={
+            'total_amount': cents(table.c.total_amount) + cents(excluded.total_amount),
+            'count': table.c.count + excluded.count,
+            'min_amount': least(cents(table.c.min_amount), cents(excluded.min_amount)),
+            'max_amount': greatest(cents(table.c.max_amount), cents(excluded.max_amount)),
+        }
+    )
+    connection.execute(statement, [{
+        'k_family_id': family_id, 'k_year': year, 'k_month': month,
+        'k_transaction_type': transaction_type, 'k_category': category,
+        'k_total': total, 'k_count': count, 'k_min': minimum, 'k_max': maximum
+    } for (family_id, year, month, transaction_type, category), (total, count, minimum, maximum) in deltas.items()])
+
+
+def record_transaction(transaction):
+    """Soma uma transação recém-criada ao agregado do seu mês"""
+    record_transactions([{
+        'family_id': transaction.family_id,
+        'date': transaction.date,
+        'transaction_type': transaction.transaction_type,
+        'category': transaction.category,
+        'amount': transaction.amount,
+    }])
+
+
+def record_transactions(rows):
+    """Soma ao agregado um lote de transações inseridas em massa.
+
+    `rows` são dicionários com as colunas de Transaction. Os deltas são
+    consolidados por chave, em centavos, antes de tocar o banco, então o
+    custo depende da quantidade de grupos (mês × tipo × categoria) e não de linhas.
+    """
+    deltas = {}
+    for row in rows:
+        key = (row['family_id'], row['date'].year, row['date'].month, row['transaction_type'], row['category'])
+        amount = to_cents(row['amount'])
+        total, count, minimum, maximum = deltas.get(key, (0, 0, amount, amount))
+        deltas[key] = (total + amount, count + 1, min(minimum, amount), max(maximum, amount))
+    upsert_rollup(db.session.connection(), deltas)
+
+
+def forget_transaction(transaction):
+    """Retira do agregado uma transação que está sendo removida.
+
+    Deve ser chamada depois de `db.session.delete(transaction)`; quando o
+    valor removido era o mínimo ou o máximo do grupo, eles são recalculados
+    a partir das transações restantes.
+    """
+    db.session.flush()
+    row = _rollup_row(transaction.family_id, transaction.date.year, transaction.date.month,
+                      transaction.transaction_type, transaction.category)
+    if row is None:
+        return None
+
+    row.count -= 1
+    if row.count <= 0:
+        db.session.delete(row)
+        return None
+
+    row.total_amount -= transaction.amount
+    if transaction.amount in (row.min_amount, row.max_amount):
+        start, end = month_bounds(row.year, row.month)
+        row.min_amount, row.max_amount = db.session.query(
+            func.min(Transaction.amount),
+            func.max(Transaction.amount)
+        ).filter(
+            Transaction.family_id == row.family_id,
+            Transaction.transaction_type == row.transaction_type,
+            Transaction.category == row.category,
+            Transaction.date >= start,
+            Transaction.date < end
+        ).one()
+    return row
+
+
+def compute_rollup(family_id=None):
+    """Recalcula os agregados a partir das transações, em uma única consulta"""
+    year_col = extract('year', Transaction.date)
+    month_col = extract('month', Transaction.date)
+    query = db.session.query(
+        Transaction.family_id,
+        year_col,
+        month_col,
+        Transaction.transaction_type,
+        Transaction.category,
+        func.sum(Transaction.amount),
+        func.count(Transaction.id),
+        func.min(Transaction.amount),
+        func.max(Transaction.amount)
+    )
+    if family_id is not None:
+        query = query.filter(Transaction.family_id == family_id)
+    rows = query.group_by(
+        Transaction.family_id, year_col, month_col, Transaction.transaction_type, Transaction.category
+    ).all()
+
+    return {
+        (fam, int(year), int(month), transaction_type, category): (total, count, minimum, maximum)
+        for fam, year, month, transaction_type, category, total, count, minimum, maximum in rows
+    }
+
+
+def verify_rollup(family_id=None):
+    """Compara o agregado mantido com o recalculado e retorna as divergências"""
+    expected = compute_rollup(family_id)
+    query = MonthlyRollup.query
+    if family_id is not None:
+        query = query.filter_by(family_id=family_id)
+    stored = {
+        row.key(): (row.total_amount, row.count, row.min_amount, row.max_amount)
+        for row in query.all()
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        exp = expected.get(key)
+        got = stored.get(key)
+        if not _same_aggregate(exp, got):
+            drift.append({'key': key, 'expected': exp, 'stored': got})
+    return drift
+
+
+def _same_aggregate(expected, stored):
+    if expected is None or stored is None:
+        return False
+    (exp_total, exp_count, exp_min, exp_max) = expected
+    (got_total, got_count, got_min, got_max) = stored
+    return exp_count == got_count and all(
+        abs(e - g) <= DRIFT_TOLERANCE
+        for e, g in ((exp_total, got_total), (exp_min, got_min), (exp_max, got_max))
+    )
+
+
+def rebuild_rollup(family_id=None):
+    """Reconstrói o agregado do zero e retorna a quantidade de linhas gravadas"""
+    expected = compute_rollup(family_id)
+    query = MonthlyRollup.query
+    if family_id is not None:
+        query = query.filter_by(family_id=family_id)
+    # 'fetch' remove da sessão as linhas excluídas, que voltam com as mesmas chaves
+    query.delete(synchronize_session='fetch')
+
+    db.session.add_all([
+        MonthlyRollup(
+            family_id=fam,
+            year=year,
+            month=month,
+            transaction_type=transaction_type,
+            category=category,
+            total_amount=total,
+            count=count,
+            min_amount=minimum,
+            max_amount=maximum
+        )
+        for (fam, year, month, transaction_type, category), (total, count, minimum, maximum) in expected.items()
+    ])
+    db.session.commit()
+    return len(expected)
+
@@ -0,0 +1,95 @@
+from datetime import datetime
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from src.models import db
+from src.models.transaction import Transaction, CreditCard, Investment, Debt, Goal
+
+# Coleções sincronizadas com os clientes, pelo nome exposto na API
+SYNCED_MODELS = {
+    'transactions': Transaction,
+    'credit_cards': CreditCard,
+    'investments': Investment,
+    'debts': Debt,
+    'goals': Goal,
+}
+ENTITY_BY_MODEL = {model: entity for entity, model in SYNCED_MODELS.items()}
+
+
+class FamilyChangeSequence(db.Model):
+    """Contador monotônico de alterações por família.
+
+    A linha da família é bloqueada pelo UPDATE que reserva a sequência até o
+    commit, então as alterações ficam visíveis na mesma ordem dos números.
+    """
+    __tablename__ = 'family_change_sequence'
+
+    family_id = db.Column(db.String(50), primary_key=True)
+    last_seq = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class Tombstone(db.Model):
+    """Registro de exclusão, para que clientes sincronizados removam o item"""
+    __tablename__ = 'tombstone'
+    __table_args__ = (
+        db.Index('ix_tombstone_family_change_seq', 'family_id', 'change_seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    family_id = db.Column(db.String(50), nullable=False)
+    entity = db.Column(db.String(30), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    change_seq = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def reserve_sequence(connection, family_id, count=1):
+    """Reserva `count` números de sequência da família e devolve o primeiro"""
+    sequences = FamilyChangeSequence.__table__
+    updated = connection.execute(
+        update(sequences)
+        .where(sequences.c.family_id == family_id)
+        .values(last_seq=sequences.c.last_seq + count)
+    )
+    if updated.rowcount:
+        last_seq = connection.execute(
+            select(sequences.c.last_seq).where(sequences.c.family_id == family_id)
+        ).scalar()
+    else:
+        last_seq = count
+        connection.execute(insert(sequences).values(family_id=family_id, last_seq=last_seq))
+    return last_seq - count + 1
+
+
+@event.listens_for(Session, 'before_flush')
+def assign_change_sequences(session, flush_context, instances):
+    """Numera as alterações dos modelos sincronizados antes de cada flush.
+
+    Inserções e alterações recebem `change_seq`; exclusões geram um
+    Tombstone com o número reservado para elas.
+    """
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if type(obj) in ENTITY_BY_MODEL and (obj in session.new or session.is_modified(obj))
+    ]
+    deleted = [obj for obj in session.deleted if type(obj) in ENTITY_BY_MODEL]
+    if not changed and not deleted:
+        return
+
+    by_family = {}
+    for obj in changed + deleted:
+        by_family.setdefault(obj.family_id, []).append(obj)
+
+    connection = session.connection()
+    for family_id, objects in by_family.items():
+        seq = reserve_sequence(connection, family_id, len(objects))
+        for obj in objects:
+            if obj in session.deleted:
+                session.add(Tombstone(
+                    family_id=family_id,
+                    entity=ENTITY_BY_MODEL[type(obj)],
+                    entity_id=obj.id,
+                    change_seq=seq
+                ))
+            else:
+                obj.change_seq = seq
+            seq += 1
@@ -0,0 +1,17 @@
+from datetime import datetime
+from src.models import db
+
+
+class RevokedToken(db.Model):
+    """Token JWT revogado antes de expirar (logout ou refresh já utilizado).
+
+    Só serve para reconstruir a lista em memória na inicialização e para
+    propagar revogações entre workers; a verificação por requisição não
+    consulta esta tabela.
+    """
+    __tablename__ = 'revoked_token'
+
+    jti = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -1,17 +1,30 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models import db
+from src.models.money import Money
 
 class Transaction(db.Model):
+    # Índices compostos para os filtros por família e período (dashboard, orçamento).
+    # AUTOINCREMENT nas tabelas sincronizadas: um id excluído nunca é reutilizado,
+    # senão o tombstone do item antigo apagaria o novo nos clientes
+    __table_args__ = (
+        db.Index('ix_transaction_family_date', 'family_id', 'date'),
+        db.Index('ix_transaction_family_type_date', 'family_id', 'transaction_type', 'date'),
+        db.Index('ix_transaction_family_change_seq', 'family_id', 'change_seq'),
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     family_id = db.Column(db.String(50), nullable=False)  # ID da família
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     description = db.Column(db.String(200), nullable=False)
     category = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money(), nullable=False)
     transaction_type = db.Column(db.String(20), nullable=False)  # 'receita' ou 'despesa'
     payment_method = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger)  # Sequência de alterações da família (sincronização)
 
     def __repr__(self):
         return f'<Transaction {self.description}: R$ {self.amount}>'
@@ -26,16 +39,24 @@ class Transaction(db.Model):
             'amount': self.amount,
             'transaction_type': self.transaction_type,
             'payment_method': self.payment_method,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class CreditCard(db.Model):
+    __table_args__ = (
+        db.Index('ix_credit_card_family_change_seq', 'family_id', 'change_seq'),
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     family_id = db.Column(db.String(50), nullable=False)  # ID da família
     name = db.Column(db.String(100), nullable=False)
     closing_day = db.Column(db.Integer, nullable=False)  # Dia do fechamento (1-31)
     due_day = db.Column(db.Integer, nullable=False)  # Dia do vencimento (1-31)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger)  # Sequência de alterações da família (sincronização)
 
     def __repr__(self):
         return f'<CreditCard {self.name}>'
@@ -47,17 +68,25 @@ class CreditCard(db.Model):
             'name': self.name,
             'closing_day': self.closing_day,
             'due_day': self.due_day,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Investment(db.Model):
+    __table_args__ = (
+        db.Index('ix_investment_family_change_seq', 'family_id', 'change_seq'),
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     family_id = db.Column(db.String(50), nullable=False)  # ID da família
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     asset_name = db.Column(db.String(200), nullable=False)
     broker = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money(), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger)  # Sequência de alterações da família (sincronização)
 
     def __repr__(self):
         return f'<Investment {self.asset_name}: R$ {self.amount}>'
@@ -70,17 +99,25 @@ class Investment(db.Model):
             'asset_name': self.asset_name,
             'broker': self.broker,
             'amount': self.amount,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Debt(db.Model):
+    __table_args__ = (
+        db.Index('ix_debt_family_change_seq', 'family_id', 'change_seq'),
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     family_id = db.Column(db.String(50), nullable=False)  # ID da família
     description = db.Column(db.String(200), nullable=False)
-    total_amount = db.Column(db.Float, nullable=False)
-    paid_amount = db.Column(db.Float, default=0)
-    monthly_payment = db.Column(db.Float, nullable=False)
+    total_amount = db.Column(Money(), nullable=False)
+    paid_amount = db.Column(Money(), default=0)
+    monthly_payment = db.Column(Money(), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger)  # Sequência de alterações da família (sincronização)
 
     def __repr__(self):
         return f'<Debt {self.description}: R$ {self.total_amount}>'
@@ -94,16 +131,24 @@ class Debt(db.Model):
             'paid_amount': self.paid_amount,
             'remaining_amount': self.total_amount - self.paid_amount,
             'monthly_payment': self.monthly_payment,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Goal(db.Model):
+    __table_args__ = (
+        db.Index('ix_goal_family_change_seq', 'family_id', 'change_seq'),
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     family_id = db.Column(db.String(50), nullable=False)  # ID da família
     name = db.Column(db.String(200), nullable=False)
-    target_amount = db.Column(db.Float, nullable=False)
-    saved_amount = db.Column(db.Float, default=0)
+    target_amount = db.Column(Money(), nullable=False)
+    saved_amount = db.Column(Money(), default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger)  # Sequência de alterações da família (sincronização)
 
     def __repr__(self):
         return f'<Goal {self.name}: R$ {self.target_amount}>'
@@ -116,6 +161,7 @@ class Goal(db.Model):
             'target_amount': self.target_amount,
             'saved_amount': self.saved_amount,
             'progress_percentage': (self.saved_amount / self.target_amount * 100) if self.target_amount > 0 else 0,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
@@ -1,5 +1,5 @@
 from src.models import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.services.passwords import hash_password, verify_password
 from datetime import datetime
 
 class User(db.Model):
@@ -13,10 +13,10 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.username}>'
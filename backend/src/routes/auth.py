@@ -1,29 +1,89 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 import jwt
 import os
+import time
+import uuid
+from collections import namedtuple
 from functools import wraps
 from src.models.user import User
 from src.models import db
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from src.services.cache import principal_cache
+from src.services.passwords import HasherBusy, needs_rehash
+from src.services.revocation import revoke_token, revoked_tokens, sync_revocations
 
 auth_bp = Blueprint("auth", __name__)
 
+# Identidade mínima usada pelas rotas: evita carregar o User completo a cada requisição
+Principal = namedtuple('Principal', ['id', 'family_id'])
+
+ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL', 15 * 60))
+REFRESH_TOKEN_TTL = int(os.environ.get('REFRESH_TOKEN_TTL', 30 * 24 * 3600))
+
+def _secret_key():
+    return os.environ.get('JWT_SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+
+def issue_tokens(user):
+    """Gera um par de tokens: acesso de curta duração e refresh de uso único"""
+    now = int(time.time())
+    access = {"id": user.id, "family_id": user.family_id, "type": "access",
+              "jti": uuid.uuid4().hex, "iat": now, "exp": now + ACCESS_TOKEN_TTL}
+    refresh = {"id": user.id, "type": "refresh",
+               "jti": uuid.uuid4().hex, "iat": now, "exp": now + REFRESH_TOKEN_TTL}
+    return {
+        "token": jwt.encode(access, _secret_key(), algorithm="HS256"),
+        "refresh_token": jwt.encode(refresh, _secret_key(), algorithm="HS256"),
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
+
+def _decode_token(token, token_type="access"):
+    """Valida assinatura, expiração, tipo e revogação; retorna o payload ou None"""
+    try:
+        data = jwt.decode(token, _secret_key(), algorithms=["HS256"],
+                          options={"require": ["exp", "jti", "id"]})
+    except jwt.InvalidTokenError:
+        return None
+    if data.get("type") != token_type:
+        return None
+    sync_revocations()
+    if data["jti"] in revoked_tokens:
+        return None
+    return data
+
+def principal_from_token(token):
+    """Decodifica o token JWT e retorna o Principal, ou None se for inválido"""
+    data = _decode_token(token)
+    if data is None:
+        return None
+    return _principal_for(data["id"])
+
+def _principal_for(user_id):
+    """Principal do usuário, pelo cache ou com uma consulta de (id, family_id)"""
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        row = db.session.query(User.id, User.family_id).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        principal = Principal(row.id, row.family_id)
+        principal_cache.set(user_id, principal)
+    return principal
+
+def load_principal():
+    """Resolve o usuário da requisição uma única vez e guarda em flask.g"""
+    if 'principal' not in g:
+        # EventSource não envia cabeçalhos customizados: aceita o token na query string
+        token = request.headers.get("x-access-token") or request.args.get("access_token")
+        g.token_claims = _decode_token(token) if token else None
+        g.principal = _principal_for(g.token_claims["id"]) if g.token_claims else None
+    return g.principal
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if "x-access-token" in request.headers:
-            token = request.headers["x-access-token"]
-
-        if not token:
+        if not request.headers.get("x-access-token"):
             return jsonify({"message": "Token is missing!"}), 401
 
-        try:
-            secret_key = os.environ.get('JWT_SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-            data = jwt.decode(token, secret_key, algorithms=["HS256"])
-            current_user = User.query.get(data["id"])
-        except:
+        current_user = load_principal()
+        if current_user is None:
             return jsonify({"message": "Token is invalid!"}), 401
 
         return f(current_user, *args, **kwargs)
@@ -41,28 +101,48 @@ def login():
 
     user = User.query.filter_by(email=email).first()
 
-    if not user or not user.check_password(password):
-        return jsonify({"message": "Invalid email or password"}), 401
+    try:
+        if not user or not user.check_password(password):
+            return jsonify({"message": "Invalid email or password"}), 401
 
-    token = jwt.encode(
-        {"id": user.id, "family_id": user.family_id},
-        os.environ.get('JWT_SECRET_KEY', 'asdf#FGSgvasgf$5$WGT'),
-        algorithm="HS256",
-    )
+        # Hashes gerados com um método/fator antigo são atualizados de forma transparente
+        if needs_rehash(user.password_hash):
+            user.set_password(password)
+            db.session.commit()
+    except HasherBusy:
+        return jsonify({"message": "Too many login attempts, try again"}), 503, {"Retry-After": "1"}
 
-    return jsonify({"token": token})
+    return jsonify(issue_tokens(user))
 
-def get_current_user_family_id():
-    token = request.headers.get("x-access-token")
-    if not token:
-        return None
-    try:
-        secret_key = os.environ.get('JWT_SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-        data = jwt.decode(token, secret_key, algorithms=["HS256"])
-        return data.get("family_id")
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
+@auth_bp.route("/refresh", methods=["POST"])
+def refresh():
+    data = request.get_json(silent=True) or {}
+    payload = _decode_token(data.get("refresh_token") or "", token_type="refresh")
+    if payload is None:
+        return jsonify({"message": "Refresh token is invalid!"}), 401
 
+    user = db.session.get(User, payload["id"])
+    if user is None:
+        return jsonify({"message": "Refresh token is invalid!"}), 401
 
+    # Rotação: o refresh usado é revogado e não pode ser reaproveitado
+    revoke_token(payload["jti"], user.id, payload["exp"])
+    return jsonify(issue_tokens(user))
+
+@auth_bp.route("/logout", methods=["POST"])
+def logout():
+    """Revoga o token de acesso do cabeçalho e o refresh enviado no corpo"""
+    data = request.get_json(silent=True) or {}
+    tokens = [
+        (request.headers.get("x-access-token"), "access"),
+        (data.get("refresh_token"), "refresh"),
+    ]
+    for token, token_type in tokens:
+        payload = _decode_token(token, token_type) if token else None
+        if payload is not None:
+            revoke_token(payload["jti"], payload["id"], payload["exp"])
+    return jsonify({"message": "Logged out"})
+
+def get_current_user_family_id():
+    principal = load_principal()
+    return principal.family_id if principal else None
@@ -5,6 +5,10 @@ from src.routes.auth import token_required
 from sqlalchemy import func, extract, and_
 from src.models.budget import Budget, BudgetCategory
 from src.models.transaction import Transaction
+from src.services.budgets import (
+    DEFAULT_TREND_MONTHS, MAX_TREND_MONTHS, MAX_SUGGESTION_MONTHS, SUGGESTION_MONTHS,
+    cached_budget_suggestions, category_spend_history, trend_fields
+)
 
 budget_bp = Blueprint('budget', __name__)
 
@@ -160,31 +164,16 @@ def get_budget_analytics(current_user):
         if not budget:
             return jsonify({'error': 'Orçamento não encontrado'}), 404
         
-        # Análises por categoria
+        # Análises por categoria; tendências de todas as categorias em uma única consulta
+        trend_months = request.args.get('trend_months', DEFAULT_TREND_MONTHS, type=int)
+        trend_months = min(max(trend_months, 2), MAX_TREND_MONTHS)
+        history = category_spend_history(current_user.family_id, year, month, trend_months)
         category_analysis = []
         for category in budget.budget_categories:
             category_data = category.to_dict()
-            
-            # Adicionar tendência (comparar com mês anterior)
-            prev_month = month - 1 if month > 1 else 12
-            prev_year = year if month > 1 else year - 1
-            
-            prev_spent = db.session.query(func.sum(Transaction.amount)).filter(
-                Transaction.family_id == current_user.family_id,
-                Transaction.transaction_type == 'despesa',
-                Transaction.category == category.category_name,
-                extract('month', Transaction.date) == prev_month,
-                extract('year', Transaction.date) == prev_year
-            ).scalar() or 0
-            
-            if prev_spent > 0:
-                trend = ((category_data['actual_spent'] - prev_spent) / prev_spent) * 100
-                category_data['trend'] = round(trend, 1)
-                category_data['trend_direction'] = 'up' if trend > 0 else 'down' if trend < 0 else 'stable'
-            else:
-                category_data['trend'] = 0
-                category_data['trend_direction'] = 'stable'
-            
+            values = history.get(category.category_name, [0] * trend_months)
+            category_data.update(trend_fields(values))
+            category_data['trend_history'] = values
             category_analysis.append(category_data)
         
         # Resumo geral
@@ -213,47 +202,12 @@ def get_budget_analytics(current_user):
 def get_budget_suggestions(current_user):
     """Retorna sugestões de orçamento baseadas no histórico"""
     try:
-        # Analisar últimos 3 meses para criar sugestões
-        suggestions = []
         current_date = date.today()
-        
-        # Categorias mais gastadas nos últimos 3 meses
-        category_averages = db.session.query(
-            Transaction.category,
-            func.avg(func.sum(Transaction.amount)).label('avg_amount')
-        ).filter(
-            Transaction.family_id == current_user.family_id,
-            Transaction.transaction_type == 'despesa',
-            Transaction.date >= date(current_date.year, max(1, current_date.month - 3), 1)
-        ).group_by(
-            Transaction.category,
-            extract('month', Transaction.date),
-            extract('year', Transaction.date)
-        ).group_by(Transaction.category).all()
-        
-        for category, avg_amount in category_averages:
-            suggestions.append({
-                'category': category,
-                'suggested_amount': round(avg_amount * 1.1, 2),  # 10% de margem
-                'reason': f'Baseado na média dos últimos meses (R$ {avg_amount:.2f})',
-                'confidence': 'high' if avg_amount > 100 else 'medium'
-            })
-        
-        # Sugestão de receita baseada no histórico
-        avg_income = db.session.query(func.avg(func.sum(Transaction.amount))).filter(
-            Transaction.family_id == current_user.family_id,
-            Transaction.transaction_type == 'receita',
-            Transaction.date >= date(current_date.year, max(1, current_date.month - 3), 1)
-        ).group_by(
-            extract('month', Transaction.date),
-            extract('year', Transaction.date)
-        ).scalar() or 0
-        
-        return jsonify({
-            'category_suggestions': suggestions,
-            'suggested_income': round(avg_income, 2),
-            'total_suggested_expenses': round(sum(s['suggested_amount'] for s in suggestions), 2)
-        })
+        months = request.args.get('months', SUGGESTION_MONTHS, type=int)
+        months = min(max(months, 1), MAX_SUGGESTION_MONTHS)
+        return jsonify(cached_budget_suggestions(
+            current_user.family_id, current_date.year, current_date.month, months
+        ))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,10 +1,21 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
+from datetime import date, datetime
+from sqlalchemy.exc import IntegrityError
 from src.routes.auth import token_required
+from src.models import db
 from src.models.budget_models import Budget, BudgetCategory
+from src.services.budgets import (
+    DEFAULT_TREND_MONTHS, MAX_TREND_MONTHS, MAX_SUGGESTION_MONTHS, SUGGESTION_MONTHS,
+    cached_budget_suggestions, category_spend_history, trend_fields, trend_window
+)
+from src.services.events import family_changed
+from src.services.forecast import family_forecast
 
 budget_bp = Blueprint('budget', __name__)
 
+# Limite de meses criados por uma única chamada de rollover
+MAX_ROLLOVER_MONTHS = 24
+
 @budget_bp.route('/budget/current', methods=['GET'])
 @token_required
 def get_current_budget(current_user):
@@ -15,11 +26,8 @@ def get_current_budget(current_user):
         if not budget:
             # Criar orçamento vazio para o mês atual
             current_date = datetime.now()
-            budget_id = Budget.create_or_update_budget(
-                current_user.family_id, 
-                current_date.month, 
-                current_date.year
-            )
+            Budget.ensure_budget(current_user.family_id, current_date.month, current_date.year)
+            db.session.commit()
             budget = Budget.get_current_budget(current_user.family_id)
         
         # Buscar categorias do orçamento
@@ -29,6 +37,7 @@ def get_current_budget(current_user):
         
         return jsonify(budget), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @budget_bp.route('/budget', methods=['POST'])
@@ -52,12 +61,15 @@ def create_or_update_budget(current_user):
             total_income,
             total_planned
         )
+        db.session.commit()
+        family_changed(current_user.family_id, 'budgets', 'updated', budget_id)
         
         # Buscar orçamento atualizado
         budget = Budget.get_current_budget(current_user.family_id)
         
         return jsonify(budget), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @budget_bp.route('/budget/<int:budget_id>/categories', methods=['POST'])
@@ -75,9 +87,104 @@ def create_budget_category(current_user, budget_id):
             data.get('description', ''),
             data.get('priority', 2)
         )
+        db.session.commit()
+        family_changed(current_user.family_id, 'budget_categories', 'created', category_id)
         
         return jsonify({'id': category_id, 'message': 'Categoria criada com sucesso'}), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Categoria já existe neste orçamento'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def _parse_categories(items):
+    """Valida a lista enviada ao PUT de categorias; levanta ValueError com a mensagem para o cliente"""
+    if not isinstance(items, list):
+        raise ValueError('Envie a lista de categorias')
+    categories = []
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('Cada categoria deve ser um objeto')
+        name = str(item.get('category_name') or '').strip()
+        if not name or len(name) > 100:
+            raise ValueError('Cada categoria precisa de um nome com até 100 caracteres')
+        if name in seen:
+            raise ValueError(f'Categoria repetida: {name}')
+        seen.add(name)
+        try:
+            planned_amount = float(item.get('planned_amount', 0))
+            priority = int(item.get('priority', 2))
+        except (TypeError, ValueError):
+            raise ValueError(f'Valores inválidos na categoria {name}')
+        categories.append({
+            'category_name': name,
+            'planned_amount': planned_amount,
+            'color': item.get('color') or '#3B82F6',
+            'description': item.get('description') or '',
+            'priority': priority
+        })
+    return categories
+
+@budget_bp.route('/budget/<int:budget_id>/categories', methods=['PUT'])
+@token_required
+def replace_budget_categories(current_user, budget_id):
+    """Substituir as categorias do orçamento pela lista enviada, em lote"""
+    data = request.get_json(silent=True)
+    try:
+        categories = _parse_categories(data.get('categories') if isinstance(data, dict) else data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if not Budget.belongs_to(budget_id, current_user.family_id):
+            return jsonify({'error': 'Orçamento não encontrado'}), 404
+        deleted, upserted = BudgetCategory.replace_categories(budget_id, categories)
+        db.session.commit()
+        family_changed(current_user.family_id, 'budget_categories', 'updated')
+        
+        return jsonify({
+            'deleted': deleted,
+            'upserted': upserted,
+            'categories': BudgetCategory.get_categories_by_budget(budget_id)
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@budget_bp.route('/budget/rollover', methods=['POST'])
+@token_required
+def rollover_budget(current_user):
+    """Copiar o orçamento de um mês e suas categorias para os meses seguintes"""
+    try:
+        data = request.get_json() or {}
+        month = int(data.get('month', datetime.now().month))
+        year = int(data.get('year', datetime.now().year))
+        months = int(data.get('months', 1))
+        adjustment_percent = float(data.get('adjustment_percent', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Parâmetros inválidos'}), 400
+    if not 1 <= month <= 12 or not 1 <= months <= MAX_ROLLOVER_MONTHS or adjustment_percent <= -100:
+        return jsonify({'error': f'Informe um mês válido e de 1 a {MAX_ROLLOVER_MONTHS} meses'}), 400
+
+    try:
+        result = Budget.rollover(current_user.family_id, year, month, months, adjustment_percent)
+        if result is None:
+            return jsonify({'error': 'Orçamento de origem não encontrado'}), 404
+        source_id, created, skipped, categories_copied = result
+        db.session.commit()
+        if created:
+            family_changed(current_user.family_id, 'budgets', 'created')
+        
+        return jsonify({
+            'source_budget_id': source_id,
+            'created': [{'year': y, 'month': m} for y, m in created],
+            'skipped': [{'year': y, 'month': m} for y, m in skipped],
+            'categories_copied': categories_copied
+        }), 201
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @budget_bp.route('/budget/analytics', methods=['GET'])
@@ -90,8 +197,19 @@ def get_budget_analytics(current_user):
         if not budget:
             return jsonify({'message': 'Nenhum orçamento encontrado'}), 404
         
+        trend_months = request.args.get('trend_months', DEFAULT_TREND_MONTHS, type=int)
+        trend_months = min(max(trend_months, 2), MAX_TREND_MONTHS)
         categories = BudgetCategory.get_categories_by_budget(budget['id'])
         
+        # Tendência de todas as categorias a partir de uma única consulta
+        history = category_spend_history(
+            current_user.family_id, budget['year'], budget['month'], trend_months
+        )
+        for category in categories:
+            values = history.get(category['category_name'], [0] * trend_months)
+            category.update(trend_fields(values))
+            category['trend_history'] = values
+        
         # Calcular métricas básicas
         total_planned = sum(cat['planned_amount'] for cat in categories)
         total_spent = sum(cat['spent_amount'] for cat in categories)
@@ -101,25 +219,49 @@ def get_budget_analytics(current_user):
             'total_spent': total_spent,
             'remaining': total_planned - total_spent,
             'categories_count': len(categories),
-            'categories': categories
+            'categories': categories,
+            'trend_months': [
+                f'{month:02d}/{year}'
+                for year, month in trend_window(budget['year'], budget['month'], trend_months)
+            ]
         }
         
         return jsonify(analytics), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@budget_bp.route('/budget/forecast', methods=['GET'])
+@token_required
+def get_budget_forecast(current_user):
+    """Previsão do gasto de cada categoria no fim do mês atual, comparada ao planejado"""
+    try:
+        forecast = family_forecast(current_user.family_id, date.today())
+        budget = Budget.get_current_budget(current_user.family_id)
+        planned = {}
+        if budget:
+            planned = {
+                category['category_name']: category['planned_amount']
+                for category in BudgetCategory.get_categories_by_budget(budget['id'])
+            }
+        for category in forecast['categories']:
+            category['planned_amount'] = planned.get(category['category'])
+            category['over_budget'] = (
+                category['planned_amount'] is not None and category['forecast'] > category['planned_amount']
+            )
+        
+        return jsonify(forecast), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @budget_bp.route('/budget/suggestions', methods=['GET'])
 @token_required
 def get_budget_suggestions(current_user):
-    """Obter sugestões de orçamento"""
+    """Obter sugestões de orçamento a partir do histórico de despesas"""
     try:
-        # Sugestões básicas por enquanto
-        suggestions = [
-            {'category': 'Alimentação', 'suggested_amount': 800.0, 'reason': 'Baseado na média nacional'},
-            {'category': 'Transporte', 'suggested_amount': 400.0, 'reason': 'Inclui combustível e manutenção'},
-            {'category': 'Lazer', 'suggested_amount': 300.0, 'reason': 'Recomendado 10% da renda'},
-            {'category': 'Reserva de Emergência', 'suggested_amount': 500.0, 'reason': 'Importante para imprevistos'}
-        ]
+        today = datetime.now()
+        months = request.args.get('months', SUGGESTION_MONTHS, type=int)
+        months = min(max(months, 1), MAX_SUGGESTION_MONTHS)
+        suggestions = cached_budget_suggestions(current_user.family_id, today.year, today.month, months)
         
         return jsonify(suggestions), 200
     except Exception as e:
@@ -0,0 +1,35 @@
+from flask import Blueprint, Response, current_app, g, request, jsonify
+from src.routes.auth import token_required, load_principal
+from src.services.events import BrokerFull, broker, event_stream
+
+events_bp = Blueprint('events', __name__)
+
+@events_bp.route('/events', methods=['GET'])
+def family_events():
+    """Stream SSE com as alterações feitas pelos membros da família"""
+    # EventSource não envia cabeçalhos customizados: load_principal aceita o token na query string
+    if not (request.headers.get('x-access-token') or request.args.get('access_token')):
+        return jsonify({"message": "Token is missing!"}), 401
+    current_user = load_principal()
+    if current_user is None:
+        return jsonify({"message": "Token is invalid!"}), 401
+
+    try:
+        subscriber = broker.subscribe(current_user.family_id)
+    except BrokerFull:
+        return jsonify({'error': 'Limite de conexões de eventos atingido'}), 503
+
+    # Sem stream_with_context: a sessão do banco é liberada ao fim da requisição,
+    # não ao fim da conexão SSE
+    claims = g.token_claims
+    return Response(
+        event_stream(subscriber, expires_at=claims['exp'], jti=claims['jti'],
+                     app=current_app._get_current_object()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@events_bp.route('/events/stats', methods=['GET'])
+@token_required
+def events_stats(current_user):
+    return jsonify(broker.stats())
@@ -1,17 +1,181 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from datetime import datetime, date
+import base64
+import binascii
+import codecs
+import csv
+import io
+import json
+import os
 from src.models import db
 from src.models.transaction import Transaction, CreditCard, Investment, Debt, Goal
+from src.models.rollup import record_transaction, forget_transaction
 from src.routes.auth import token_required, get_current_user_family_id
-from sqlalchemy import func, extract
+from src.services.dashboard import build_dashboard_summary
+from src.services.cache import dashboard_cache
+from src.services.events import family_changed
+from src.services.ingest import parse_amount, parse_transaction, insert_transactions
+from src.services.serialization import row_plan, list_family_rows
+from src.services.search import search_transactions
+from src.services.sync import collect_changes
+from src.services.statement_import import STATEMENT_PARSERS, DEFAULT_CHUNK_SIZE, import_statement
+from sqlalchemy import func, select, tuple_
 
 transactions_bp = Blueprint('transactions', __name__)
 
+# Paginação de transações
+transaction_plan = row_plan(Transaction)
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+
+def encode_cursor(transaction_date, transaction_id):
+    """Cursor opaco com a posição (date, id) da última transação da página"""
+    raw = json.dumps([transaction_date.isoformat(), transaction_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    raw_date, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.strptime(raw_date, '%Y-%m-%d').date(), int(transaction_id)
+
+def filter_transactions(query, args):
+    """Aplica os filtros da query string (período, categoria, tipo, forma de pagamento e valor)"""
+    if args.get('date_from'):
+        query = query.filter(Transaction.date >= datetime.strptime(args['date_from'], '%Y-%m-%d').date())
+    if args.get('date_to'):
+        query = query.filter(Transaction.date <= datetime.strptime(args['date_to'], '%Y-%m-%d').date())
+    if args.get('category'):
+        query = query.filter(Transaction.category == args['category'])
+    if args.get('transaction_type'):
+        query = query.filter(Transaction.transaction_type == args['transaction_type'])
+    if args.get('payment_method'):
+        query = query.filter(Transaction.payment_method == args['payment_method'])
+    if args.get('min_amount'):
+        query = query.filter(Transaction.amount >= parse_amount(args['min_amount']))
+    if args.get('max_amount'):
+        query = query.filter(Transaction.amount <= parse_amount(args['max_amount']))
+    return query
+
 @transactions_bp.route('/transactions', methods=['GET'])
 @token_required
 def get_transactions(current_user):
-    transactions = Transaction.query.filter_by(family_id=current_user.family_id).all()
-    return jsonify([transaction.to_dict() for transaction in transactions])
+    """Lista transações da família paginadas por cursor (date, id), mais recentes primeiro"""
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_LIMIT)), 1), MAX_PAGE_LIMIT)
+        query = filter_transactions(
+            transaction_plan.select().where(Transaction.family_id == current_user.family_id),
+            request.args
+        )
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            query = query.filter(tuple_(Transaction.date, Transaction.id) < (cursor_date, cursor_id))
+    except (ValueError, TypeError, binascii.Error):
+        return jsonify({'error': 'Parâmetros de consulta inválidos'}), 400
+
+    query = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1)
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+
+    return jsonify({
+        'items': transaction_plan.serialize(rows),
+        'next_cursor': next_cursor
+    })
+
+# Exportação do histórico completo
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = (
+    Transaction.id,
+    Transaction.date,
+    Transaction.description,
+    Transaction.category,
+    Transaction.amount,
+    Transaction.transaction_type,
+    Transaction.payment_method,
+    Transaction.created_at,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+def _export_values(row):
+    return [value.isoformat() if isinstance(value, (date, datetime)) else value for value in row]
+
+def _export_csv(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_export_values(row) for row in rows)
+        yield buffer.getvalue()
+
+def _export_ndjson(partitions):
+    for rows in partitions:
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_FIELDS, _export_values(row))), ensure_ascii=False) + '\n'
+            for row in rows
+        )
+
+@transactions_bp.route('/transactions/export', methods=['GET'])
+@token_required
+def export_transactions(current_user):
+    """Exporta todas as transações da família em CSV ou NDJSON, em streaming"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Formato inválido. Use csv ou ndjson.'}), 400
+
+    try:
+        statement = filter_transactions(
+            select(*EXPORT_COLUMNS).where(Transaction.family_id == current_user.family_id),
+            request.args
+        )
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Parâmetros de consulta inválidos'}), 400
+
+    # Linhas do Core lidas em lotes de um cursor no servidor, sem instanciar objetos ORM
+    statement = statement.order_by(Transaction.date, Transaction.id).execution_options(
+        stream_results=True,
+        yield_per=EXPORT_BATCH_SIZE
+    )
+    partitions = db.session.execute(statement).partitions()
+
+    if export_format == 'csv':
+        body, mimetype = _export_csv(partitions), 'text/csv'
+    else:
+        body, mimetype = _export_ndjson(partitions), 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=transacoes.{export_format}'}
+    )
+
+# Busca textual por descrição
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+@transactions_bp.route('/transactions/search', methods=['GET'])
+@token_required
+def search_family_transactions(current_user):
+    """Busca transações pela descrição, ordenadas por relevância e paginadas"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Informe o termo de busca (q)'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de consulta inválidos'}), 400
+
+    items = search_transactions(current_user.family_id, query, limit + 1, offset)
+    has_more = len(items) > limit
+    return jsonify({
+        'items': items[:limit],
+        'next_offset': offset + limit if has_more else None
+    })
 
 @transactions_bp.route('/transactions', methods=['POST'])
 @token_required
@@ -20,21 +184,112 @@ def create_transaction(current_user):
     
     # Converter string de data para objeto date
     transaction_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    try:
+        amount = parse_amount(data['amount'])
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     
     transaction = Transaction()
     transaction.family_id = current_user.family_id
     transaction.date = transaction_date
     transaction.description = data['description']
     transaction.category = data['category']
-    transaction.amount = float(data['amount'])
+    transaction.amount = amount
     transaction.transaction_type = data['transaction_type']
     transaction.payment_method = data['payment_method']
     
     db.session.add(transaction)
+    record_transaction(transaction)
     db.session.commit()
+    family_changed(current_user.family_id, 'transactions', 'created', transaction.id)
     
     return jsonify(transaction.to_dict()), 201
 
+# Limite de itens por requisição de importação em lote
+MAX_BATCH_SIZE = 5000
+
+@transactions_bp.route('/transactions/batch', methods=['POST'])
+@token_required
+def create_transactions_batch(current_user):
+    """Cria várias transações em uma única requisição e transação de banco.
+
+    Itens inválidos são reportados individualmente sem abortar o restante do lote.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('transactions') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Envie uma lista de transações'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_SIZE} transações por lote'}), 413
+
+    results = []
+    rows = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(parse_transaction(item, current_user.family_id))
+            results.append({'index': index, 'status': 'created'})
+        except ValueError as e:
+            results.append({'index': index, 'status': 'error', 'error': str(e)})
+
+    created = insert_transactions(rows)
+    db.session.commit()
+    if created:
+        family_changed(current_user.family_id, 'transactions', 'imported')
+
+    status_code = 201 if created == len(items) else 207 if created else 400
+    return jsonify({
+        'created': created,
+        'failed': len(items) - created,
+        'results': results
+    }), status_code
+
+@transactions_bp.route('/transactions/import', methods=['POST'])
+@token_required
+def import_transactions(current_user):
+    """Importa um extrato bancário (CSV ou OFX) enviado como arquivo"""
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Arquivo do extrato é obrigatório'}), 400
+
+    statement_format = request.form.get('format') or os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+    if statement_format not in STATEMENT_PARSERS:
+        return jsonify({'error': 'Formato inválido. Use csv ou ofx.'}), 400
+
+    try:
+        chunk_size = max(int(request.form.get('chunk_size', DEFAULT_CHUNK_SIZE)), 1)
+    except ValueError:
+        return jsonify({'error': 'chunk_size inválido'}), 400
+
+    encoding = request.form.get('encoding', 'utf-8-sig')
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return jsonify({'error': 'encoding inválido'}), 400
+
+    # Cada lote é confirmado ao ser gravado: se a importação falhar no meio, os
+    # lotes já gravados ficam e ainda precisam chegar ao cache e aos clientes
+    committed = {'imported': 0}
+
+    def on_progress(partial):
+        committed['imported'] = partial['imported']
+
+    # O upload é lido linha a linha, sem carregar o arquivo inteiro
+    lines = io.TextIOWrapper(upload.stream, encoding=encoding, errors='replace')
+    try:
+        report = import_statement(
+            lines,
+            statement_format,
+            current_user.family_id,
+            chunk_size=chunk_size,
+            progress=on_progress,
+            category=request.form.get('category', 'Outros'),
+            payment_method=request.form.get('payment_method', 'Importado')
+        )
+    finally:
+        if committed['imported']:
+            family_changed(current_user.family_id, 'transactions', 'imported')
+    return jsonify(report), 201 if report['imported'] else 400
+
 @transactions_bp.route('/transactions/<int:transaction_id>', methods=['DELETE'])
 @token_required
 def delete_transaction(current_user, transaction_id):
@@ -44,93 +299,33 @@ def delete_transaction(current_user, transaction_id):
     ).first_or_404()
     
     db.session.delete(transaction)
+    forget_transaction(transaction)
     db.session.commit()
+    family_changed(current_user.family_id, 'transactions', 'deleted', transaction_id)
     return '', 204
 
 @transactions_bp.route('/dashboard/summary', methods=['GET'])
 @token_required
 def get_dashboard_summary(current_user):
-    # Obter mês e ano atual
-    current_month = date.today().month
-    current_year = date.today().year
-    
-    # Receitas do mês atual
-    total_income = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.family_id == current_user.family_id,
-        Transaction.transaction_type == 'receita',
-        extract('month', Transaction.date) == current_month,
-        extract('year', Transaction.date) == current_year
-    ).scalar() or 0
-    
-    # Despesas do mês atual
-    total_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.family_id == current_user.family_id,
-        Transaction.transaction_type == 'despesa',
-        extract('month', Transaction.date) == current_month,
-        extract('year', Transaction.date) == current_year
-    ).scalar() or 0
-    
-    # Saldo
-    balance = total_income - total_expenses
-    
-    # Despesas por categoria (mês atual)
-    expenses_by_category = db.session.query(
-        Transaction.category,
-        func.sum(Transaction.amount).label('total')
-    ).filter(
-        Transaction.family_id == current_user.family_id,
-        Transaction.transaction_type == 'despesa',
-        extract('month', Transaction.date) == current_month,
-        extract('year', Transaction.date) == current_year
-    ).group_by(Transaction.category).all()
-    
-    # Evolução dos últimos 6 meses
-    monthly_evolution = []
-    for i in range(6):
-        month_date = date.today().replace(day=1)
-        if month_date.month - i <= 0:
-            target_month = 12 + (month_date.month - i)
-            target_year = month_date.year - 1
-        else:
-            target_month = month_date.month - i
-            target_year = month_date.year
-        
-        month_income = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.family_id == current_user.family_id,
-            Transaction.transaction_type == 'receita',
-            extract('month', Transaction.date) == target_month,
-            extract('year', Transaction.date) == target_year
-        ).scalar() or 0
-        
-        month_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.family_id == current_user.family_id,
-            Transaction.transaction_type == 'despesa',
-            extract('month', Transaction.date) == target_month,
-            extract('year', Transaction.date) == target_year
-        ).scalar() or 0
-        
-        monthly_evolution.append({
-            'month': f"{target_month:02d}/{target_year}",
-            'income': month_income,
-            'expenses': month_expenses
-        })
-    
-    monthly_evolution.reverse()  # Ordem cronológica
-    
-    return jsonify({
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'balance': balance,
-        'expenses_by_category': [{'category': cat, 'amount': float(total)} for cat, total in expenses_by_category],
-        'monthly_evolution': monthly_evolution
-    })
+    today = date.today()
+    cache_key = (current_user.family_id, today.year, today.month)
+    generation = dashboard_cache.generation(current_user.family_id)
+    summary = dashboard_cache.get(cache_key)
+    if summary is None:
+        summary = build_dashboard_summary(current_user.family_id, today)
+        dashboard_cache.set(cache_key, summary, generation)
+    return jsonify(summary)
+
+@transactions_bp.route('/dashboard/cache-stats', methods=['GET'])
+@token_required
+def get_dashboard_cache_stats(current_user):
+    return jsonify(dashboard_cache.stats())
 
 # Rotas para Cartões de Crédito
 @transactions_bp.route('/credit-cards', methods=['GET'])
 @token_required
 def get_credit_cards(current_user):
-    cards = CreditCard.query.filter_by(family_id=current_user.family_id).all()
-    return jsonify([card.to_dict() for card in cards])
+    return jsonify(list_family_rows(CreditCard, current_user.family_id))
 
 @transactions_bp.route('/credit-cards', methods=['POST'])
 @token_required
@@ -145,6 +340,7 @@ def create_credit_card(current_user):
     
     db.session.add(card)
     db.session.commit()
+    family_changed(current_user.family_id, 'credit_cards', 'created', card.id)
     
     return jsonify(card.to_dict()), 201
 
@@ -158,6 +354,7 @@ def delete_credit_card(current_user, card_id):
     
     db.session.delete(card)
     db.session.commit()
+    family_changed(current_user.family_id, 'credit_cards', 'deleted', card_id)
     
     return jsonify({'message': 'Cartão excluído com sucesso'}), 200
 
@@ -165,8 +362,7 @@ def delete_credit_card(current_user, card_id):
 @transactions_bp.route('/investments', methods=['GET'])
 @token_required
 def get_investments(current_user):
-    investments = Investment.query.filter_by(family_id=current_user.family_id).all()
-    return jsonify([investment.to_dict() for investment in investments])
+    return jsonify(list_family_rows(Investment, current_user.family_id))
 
 @transactions_bp.route('/investments', methods=['POST'])
 @token_required
@@ -184,6 +380,7 @@ def create_investment(current_user):
     
     db.session.add(investment)
     db.session.commit()
+    family_changed(current_user.family_id, 'investments', 'created', investment.id)
     
     return jsonify(investment.to_dict()), 201
 
@@ -211,8 +408,7 @@ def get_investments_summary(current_user):
 @transactions_bp.route('/debts', methods=['GET'])
 @token_required
 def get_debts(current_user):
-    debts = Debt.query.filter_by(family_id=current_user.family_id).all()
-    return jsonify([debt.to_dict() for debt in debts])
+    return jsonify(list_family_rows(Debt, current_user.family_id))
 
 @transactions_bp.route('/debts', methods=['POST'])
 @token_required
@@ -228,6 +424,7 @@ def create_debt(current_user):
     
     db.session.add(debt)
     db.session.commit()
+    family_changed(current_user.family_id, 'debts', 'created', debt.id)
     
     return jsonify(debt.to_dict()), 201
 
@@ -235,8 +432,7 @@ def create_debt(current_user):
 @transactions_bp.route('/goals', methods=['GET'])
 @token_required
 def get_goals(current_user):
-    goals = Goal.query.filter_by(family_id=current_user.family_id).all()
-    return jsonify([goal.to_dict() for goal in goals])
+    return jsonify(list_family_rows(Goal, current_user.family_id))
 
 @transactions_bp.route('/goals', methods=['POST'])
 @token_required
@@ -251,6 +447,7 @@ def create_goal(current_user):
     
     db.session.add(goal)
     db.session.commit()
+    family_changed(current_user.family_id, 'goals', 'created', goal.id)
     
     return jsonify(goal.to_dict()), 201
 
@@ -265,6 +462,22 @@ def update_goal_progress(current_user, goal_id):
     data = request.get_json()
     goal.saved_amount = float(data['saved_amount'])
     db.session.commit()
+    family_changed(current_user.family_id, 'goals', 'updated', goal_id)
     
     return jsonify(goal.to_dict())
 
+# Sincronização incremental
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 5000
+
+@transactions_bp.route('/sync', methods=['GET'])
+@token_required
+def sync_changes(current_user):
+    """Retorna o que foi criado, alterado ou excluído desde o cursor informado"""
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+        limit = min(max(int(request.args.get('limit', DEFAULT_SYNC_LIMIT)), 1), MAX_SYNC_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de consulta inválidos'}), 400
+
+    return jsonify(collect_changes(current_user.family_id, since, limit))
@@ -1,26 +1,12 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import User, db
-from werkzeug.security import generate_password_hash
+from src.services.passwords import HasherBusy
 import uuid
-import jwt
-import os
+from src.routes.auth import load_principal
+from src.services.events import user_changed
 
 user_bp = Blueprint("user", __name__)
 
-def get_current_user():
-    """Helper function to get current user from token"""
-    token = request.headers.get('x-access-token')
-    if not token:
-        return None
-    
-    try:
-        secret_key = os.environ.get('JWT_SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-        data = jwt.decode(token, secret_key, algorithms=['HS256'])
-        current_user = User.query.filter_by(id=data['id']).first()
-        return current_user
-    except Exception as e:
-        return None
-
 @user_bp.route("/register", methods=["POST"])
 def register_user():
     data = request.get_json()
@@ -49,7 +35,10 @@ def register_user():
         email=email,
         family_id=family_id,
     )
-    new_user.set_password(password)
+    try:
+        new_user.set_password(password)
+    except HasherBusy:
+        return jsonify({"message": "Servidor ocupado, tente novamente"}), 503, {"Retry-After": "1"}
 
     db.session.add(new_user)
     db.session.commit()
@@ -64,7 +53,7 @@ def get_users():
 @user_bp.route("/users/family-id", methods=["GET"])
 def get_family_id():
     """Get current user's family ID"""
-    current_user = get_current_user()
+    current_user = load_principal()
     if not current_user:
         return jsonify({"error": "Token inválido ou não fornecido"}), 401
     
@@ -73,7 +62,8 @@ def get_family_id():
 @user_bp.route("/users/family-id", methods=["PUT"])
 def update_family_id():
     """Update user's family ID to join another family"""
-    current_user = get_current_user()
+    principal = load_principal()
+    current_user = db.session.get(User, principal.id) if principal else None
     if not current_user:
         return jsonify({"error": "Token inválido ou não fornecido"}), 401
     
@@ -85,6 +75,8 @@ def update_family_id():
     
     current_user.family_id = new_family_id
     db.session.commit()
+    # A próxima requisição, em qualquer worker, já deve enxergar a nova família
+    user_changed(current_user.id)
     
     return jsonify({"message": "Family ID atualizado com sucesso", "family_id": new_family_id}), 200
 
@@ -0,0 +1,148 @@
+import os
+from statistics import mean, median
+from sqlalchemy import func
+from src.models import db
+from src.models.money import cents, from_cents
+from src.models.rollup import MonthlyRollup
+from src.services.cache import suggestion_cache
+from src.services.periods import shift_month
+
+# Janela padrão e máxima da tendência por categoria na análise do orçamento
+DEFAULT_TREND_MONTHS = 2
+MAX_TREND_MONTHS = 24
+
+# Meses completos analisados pelas sugestões e percentil usado como teto sugerido
+SUGGESTION_MONTHS = int(os.environ.get('BUDGET_SUGGESTION_MONTHS', 6))
+MAX_SUGGESTION_MONTHS = 60
+SUGGESTION_PERCENTILE = float(os.environ.get('BUDGET_SUGGESTION_PERCENTILE', 75))
+
+
+def trend_window(year, month, months):
+    """Meses (ano, mês) da janela que termina em year/month, do mais antigo ao atual"""
+    return [shift_month(year, month, offset) for offset in range(-(months - 1), 1)]
+
+
+def _rollup_history(family_id, window, transaction_types):
+    """Totais por (tipo, categoria) em cada mês da janela, em uma única consulta agrupada"""
+    months = len(window)
+    first_year, first_month = window[0]
+    month_index = MonthlyRollup.year * 12 + MonthlyRollup.month
+    start_index = first_year * 12 + first_month
+
+    rows = db.session.query(
+        MonthlyRollup.transaction_type,
+        MonthlyRollup.category,
+        MonthlyRollup.year,
+        MonthlyRollup.month,
+        cents(func.sum(MonthlyRollup.total_amount))
+    ).filter(
+        MonthlyRollup.family_id == family_id,
+        MonthlyRollup.transaction_type.in_(transaction_types),
+        month_index >= start_index,
+        month_index < start_index + months
+    ).group_by(
+        MonthlyRollup.transaction_type, MonthlyRollup.category, MonthlyRollup.year, MonthlyRollup.month
+    ).all()
+
+    position = {key: i for i, key in enumerate(window)}
+    history = {}
+    for transaction_type, category, row_year, row_month, total in rows:
+        values = history.setdefault((transaction_type, category), [0] * months)
+        values[position[(row_year, row_month)]] = from_cents(total or 0)
+    return history
+
+
+def category_spend_history(family_id, year, month, months=DEFAULT_TREND_MONTHS):
+    """Despesas por categoria em cada mês da janela, em uma única consulta agrupada.
+
+    Retorna {categoria: [valor do mês mais antigo, ..., valor de year/month]},
+    lendo o agregado mensal em vez de uma soma por categoria.
+    """
+    history = _rollup_history(family_id, trend_window(year, month, months), ('despesa',))
+    return {category: values for (_, category), values in history.items()}
+
+
+def trend_fields(values):
+    """Variação percentual do último mês sobre o anterior, no formato da API"""
+    if len(values) < 2 or values[-2] <= 0:
+        return {'trend': 0, 'trend_direction': 'stable'}
+    trend = (values[-1] - values[-2]) / values[-2] * 100
+    return {
+        'trend': round(trend, 1),
+        'trend_direction': 'up' if trend > 0 else 'down' if trend < 0 else 'stable',
+    }
+
+
+def percentile(values, pct):
+    """Percentil com interpolação linear entre as posições vizinhas"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _active_months(history):
+    """Descarta os meses anteriores ao primeiro registro da família na janela"""
+    first = min(
+        (next(i for i, value in enumerate(values) if value) for values in history.values() if any(values)),
+        default=None
+    )
+    if first is None:
+        return {}
+    return {key: values[first:] for key, values in history.items()}
+
+
+def build_budget_suggestions(family_id, year, month, months=SUGGESTION_MONTHS, pct=SUGGESTION_PERCENTILE):
+    """Sugere valores por categoria a partir dos últimos `months` meses completos.
+
+    Uma única consulta ao agregado mensal traz os totais por categoria e mês;
+    meses sem gasto contam como zero. O valor sugerido é o percentil `pct`
+    dos totais mensais, e a margem é a distância dele até a mediana.
+    """
+    last_year, last_month = shift_month(year, month, -1)
+    history = _active_months(
+        _rollup_history(family_id, trend_window(last_year, last_month, months), ('despesa', 'receita'))
+    )
+
+    active_months = len(next(iter(history.values()), []))
+    income = [0] * active_months
+    suggestions = []
+    for (transaction_type, category), values in history.items():
+        if transaction_type == 'receita':
+            income = [a + b for a, b in zip(income, values)]
+            continue
+        typical = median(values)
+        average = mean(values)
+        suggested = round(percentile(values, pct), 2)
+        spread = (sum((v - average) ** 2 for v in values) / len(values)) ** 0.5
+        suggestions.append({
+            'category': category,
+            'suggested_amount': suggested,
+            'mean': round(average, 2),
+            'median': round(typical, 2),
+            'margin': round(suggested - typical, 2),
+            'months': len(values),
+            'reason': f'Percentil {pct:g} dos últimos {len(values)} meses (mediana R$ {typical:.2f})',
+            'confidence': 'high' if len(values) >= 3 and average and spread / average < 0.5 else 'medium'
+        })
+    suggestions.sort(key=lambda suggestion: -suggestion['suggested_amount'])
+
+    return {
+        'category_suggestions': suggestions,
+        'suggested_income': round(median(income), 2) if income else 0,
+        'total_suggested_expenses': round(sum(s['suggested_amount'] for s in suggestions), 2),
+        'window_months': months,
+        'percentile': pct
+    }
+
+
+def cached_budget_suggestions(family_id, year, month, months=SUGGESTION_MONTHS):
+    """Sugestões do mês, reaproveitadas até a próxima escrita da família"""
+    key = (family_id, year, month, months)
+    generation = suggestion_cache.generation(family_id)
+    suggestions = suggestion_cache.get(key)
+    if suggestions is None:
+        suggestions = build_budget_suggestions(family_id, year, month, months)
+        suggestion_cache.set(key, suggestions, generation)
+    return suggestions
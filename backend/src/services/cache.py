@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class FamilyLRUCache:
+    """Cache LRU limitado para resultados calculados por família.
+
+    As chaves são tuplas cujo primeiro elemento é o family_id, o que permite
+    invalidar todas as entradas de uma família após qualquer escrita dela.
+    Cada invalidação dá à família uma geração nova, de um contador global:
+    quem lê `generation()` antes de calcular e a repassa ao `set()` não grava
+    um resultado calculado antes de uma escrita concorrente. As gerações
+    guardadas são limitadas a `maxsize` famílias; as descartadas valem o piso,
+    a maior geração já descartada, e nunca voltam a um valor anterior.
+
+    Com `ttl`, cada entrada também expira após `ttl` segundos: uma escrita
+    que não passou por family_changed fica visível no máximo após esse prazo.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._keys_by_family = {}
+        self._generations = OrderedDict()
+        self._last_generation = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self._discard_family_key(key)
+            self.misses += 1
+            return None
+
+    def generation(self, family_id):
+        with self._lock:
+            return self._generations.get(family_id, self._generation_floor)
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generations.get(key[0], self._generation_floor):
+                # A família foi invalidada durante o cálculo: o valor já nasceu defasado
+                return
+            expires_at = self._clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            self._keys_by_family.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, _ = self._entries.popitem(last=False)
+                self._discard_family_key(old_key)
+                self.evictions += 1
+
+    def invalidate_family(self, family_id):
+        with self._lock:
+            self._last_generation += 1
+            self._generations[family_id] = self._last_generation
+            self._generations.move_to_end(family_id)
+            while len(self._generations) > self.maxsize:
+                _, generation = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, generation)
+            for key in self._keys_by_family.pop(family_id, ()):
+                self._entries.pop(key, None)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_family.clear()
+            self._generations.clear()
+            self._last_generation = self._generation_floor = 0
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _discard_family_key(self, key):
+        keys = self._keys_by_family.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_family[key[0]]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+class TTLCache:
+    """Cache LRU limitado em que cada entrada expira após `ttl` segundos"""
+
+    def __init__(self, maxsize=10000, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# Resumos do dashboard por (family_id, ano, mês). O TTL é só uma rede de
+# segurança: a invalidação normal vem de family_changed a cada escrita
+dashboard_cache = FamilyLRUCache(
+    maxsize=int(os.environ.get('DASHBOARD_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', 300)),
+)
+
+# Sugestões de orçamento por (family_id, ano, mês, janela)
+suggestion_cache = FamilyLRUCache(
+    maxsize=int(os.environ.get('SUGGESTION_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('SUGGESTION_CACHE_TTL', 300)),
+)
+
+
+# (id, family_id) por usuário, usado na autenticação. update_family_id descarta
+# a entrada em todos os workers via user_changed; a expiração curta limita o
+# atraso de alterações feitas fora da API
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL', 60)),
+)
+
+
+def invalidate_family(family_id):
+    """Descarta os resultados calculados de uma família após uma escrita"""
+    dashboard_cache.invalidate_family(family_id)
+    suggestion_cache.invalidate_family(family_id)
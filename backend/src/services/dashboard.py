@@ -0,0 +1,65 @@
+from datetime import date
+from src.models.money import cents, from_cents
+from src.models.rollup import MonthlyRollup
+from src.services.periods import shift_month
+
+# Quantidade de meses exibidos na evolução mensal do dashboard
+EVOLUTION_MONTHS = 6
+
+
+def build_dashboard_summary(family_id, today=None):
+    """Monta o resumo do dashboard a partir de uma única consulta.
+
+    Lê o agregado mensal (family_id, ano, mês, tipo, categoria) da janela dos
+    últimos EVOLUTION_MONTHS meses e deriva desse único resultado os totais
+    do mês atual, as despesas por categoria e a evolução mensal.
+    """
+    today = today or date.today()
+    first_year, first_month = shift_month(today.year, today.month, -(EVOLUTION_MONTHS - 1))
+
+    month_index = MonthlyRollup.year * 12 + MonthlyRollup.month
+    start_index = first_year * 12 + first_month
+    rows = MonthlyRollup.query.with_entities(
+        MonthlyRollup.year,
+        MonthlyRollup.month,
+        MonthlyRollup.transaction_type,
+        MonthlyRollup.category,
+        cents(MonthlyRollup.total_amount)
+    ).filter(
+        MonthlyRollup.family_id == family_id,
+        month_index >= start_index,
+        month_index < start_index + EVOLUTION_MONTHS
+    ).all()
+
+    # Totais em centavos por (ano, mês, tipo) e despesas por categoria no mês atual
+    monthly_totals = {}
+    expenses_by_category = {}
+    for year, month, transaction_type, category, total in rows:
+        key = (year, month, transaction_type)
+        monthly_totals[key] = monthly_totals.get(key, 0) + total
+        if transaction_type == 'despesa' and key[:2] == (today.year, today.month):
+            expenses_by_category[category] = expenses_by_category.get(category, 0) + total
+
+    income_cents = monthly_totals.get((today.year, today.month, 'receita'), 0)
+    expense_cents = monthly_totals.get((today.year, today.month, 'despesa'), 0)
+
+    # Evolução dos últimos meses em ordem cronológica
+    monthly_evolution = []
+    for offset in range(-(EVOLUTION_MONTHS - 1), 1):
+        year, month = shift_month(today.year, today.month, offset)
+        monthly_evolution.append({
+            'month': f"{month:02d}/{year}",
+            'income': from_cents(monthly_totals.get((year, month, 'receita'), 0)),
+            'expenses': from_cents(monthly_totals.get((year, month, 'despesa'), 0))
+        })
+
+    return {
+        'total_income': from_cents(income_cents),
+        'total_expenses': from_cents(expense_cents),
+        'balance': from_cents(income_cents - expense_cents),
+        'expenses_by_category': [
+            {'category': category, 'amount': from_cents(total)}
+            for category, total in sorted(expenses_by_category.items())
+        ],
+        'monthly_evolution': monthly_evolution
+    }
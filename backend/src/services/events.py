@@ -0,0 +1,211 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from src.services.cache import invalidate_family, principal_cache
+from src.services.revocation import revoked_tokens, sync_revocations
+
+# Limites do registro de conexões e da fila de cada assinante
+MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 1000))
+MAX_SUBSCRIBERS_PER_FAMILY = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS_PER_FAMILY', 20))
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+
+
+class BrokerFull(Exception):
+    """Limite de conexões de eventos atingido"""
+
+
+class Subscriber:
+    """Conexão SSE de um membro da família, com fila limitada.
+
+    Quando o cliente não consome a fila a tempo, as notificações pendentes
+    são descartadas e substituídas por um único evento 'resync', que pede ao
+    cliente para recarregar os dados: o publicador nunca bloqueia.
+    """
+
+    def __init__(self, family_id, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.family_id = family_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflows = 0
+        self._lock = threading.Lock()
+
+    def offer(self, event):
+        with self._lock:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                self.overflows += 1
+                while True:
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                self.queue.put_nowait({'entity': '*', 'action': 'resync'})
+
+    def next_event(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LocalBackend:
+    """Entrega em processo: atende um único worker e os testes"""
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, message):
+        self._deliver(message)
+
+
+class RedisBackend:
+    """Distribui as notificações entre workers via Redis pub/sub"""
+
+    def __init__(self, url, channel='planner-familiar:events'):
+        import redis  # Dependência opcional, só exigida quando configurada
+        self._redis = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def start(self, deliver):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        def listen():
+            for message in pubsub.listen():
+                deliver(json.loads(message['data']))
+
+        threading.Thread(target=listen, name='events-redis', daemon=True).start()
+
+    def publish(self, message):
+        self._redis.publish(self.channel, json.dumps(message))
+
+
+class EventBroker:
+    """Registro de assinantes por família e publicação de notificações"""
+
+    def __init__(self, backend=None, max_subscribers=MAX_SUBSCRIBERS,
+                 max_per_family=MAX_SUBSCRIBERS_PER_FAMILY):
+        self.max_subscribers = max_subscribers
+        self.max_per_family = max_per_family
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        # Identifica as mensagens deste processo, que já invalidou o cache ao publicar
+        self.origin = uuid.uuid4().hex
+        self.backend = backend or LocalBackend()
+        self.backend.start(self._deliver)
+
+    def subscribe(self, family_id):
+        with self._lock:
+            family = self._subscribers.setdefault(family_id, set())
+            if self._count >= self.max_subscribers or len(family) >= self.max_per_family:
+                if not family:
+                    del self._subscribers[family_id]
+                raise BrokerFull()
+            subscriber = Subscriber(family_id)
+            family.add(subscriber)
+            self._count += 1
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            family = self._subscribers.get(subscriber.family_id)
+            if family and subscriber in family:
+                family.discard(subscriber)
+                self._count -= 1
+                if not family:
+                    del self._subscribers[subscriber.family_id]
+
+    def publish(self, family_id, event):
+        self.backend.publish({'family_id': family_id, 'event': event, 'origin': self.origin})
+
+    def publish_user(self, user_id):
+        self.backend.publish({'user_id': user_id, 'origin': self.origin})
+
+    def _deliver(self, message):
+        if 'user_id' in message:
+            # Identidade alterada em outro worker: o Principal em cache ficou defasado
+            if message.get('origin') != self.origin:
+                principal_cache.invalidate(message['user_id'])
+            return
+        family_id = message['family_id']
+        # Outros workers descartam o cache da família ao receber a notificação;
+        # quem publicou já o fez em family_changed
+        if message.get('origin') != self.origin:
+            invalidate_family(family_id)
+        with self._lock:
+            subscribers = list(self._subscribers.get(family_id, ()))
+        for subscriber in subscribers:
+            subscriber.offer(message['event'])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self._count,
+                'families': len(self._subscribers),
+                'max_subscribers': self.max_subscribers
+            }
+
+
+def _create_backend():
+    if os.environ.get('EVENTS_BACKEND', 'local') == 'redis':
+        return RedisBackend(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    return LocalBackend()
+
+
+broker = EventBroker(_create_backend())
+
+
+def family_changed(family_id, entity, action, entity_id=None):
+    """Registra uma escrita da família: descarta o cache local e notifica os membros conectados"""
+    invalidate_family(family_id)
+    event = {'entity': entity, 'action': action}
+    if entity_id is not None:
+        event['id'] = entity_id
+    broker.publish(family_id, event)
+
+
+def user_changed(user_id):
+    """Registra uma alteração de identidade (family_id): descarta o Principal em todos os workers"""
+    principal_cache.invalidate(user_id)
+    broker.publish_user(user_id)
+
+
+def _token_active(expires_at, jti, app):
+    if expires_at is not None and time.time() >= expires_at:
+        return False
+    if jti is None:
+        return True
+    if app is not None:
+        # O gerador roda fora da requisição: a sincronização precisa do contexto da aplicação
+        with app.app_context():
+            sync_revocations()
+    return jti not in revoked_tokens
+
+
+def event_stream(subscriber, heartbeat=HEARTBEAT_SECONDS, expires_at=None, jti=None, app=None):
+    """Gera o corpo text/event-stream de um assinante até a conexão cair.
+
+    Com `expires_at`/`jti` do token, o stream termina com um evento 'expired'
+    quando o token expira ou é revogado, conferido a cada heartbeat; o
+    cliente reconecta com um token renovado.
+    """
+    try:
+        yield f'retry: 5000\nevent: ready\ndata: {{}}\n\n'
+        while True:
+            timeout = heartbeat if expires_at is None else max(min(heartbeat, expires_at - time.time()), 0)
+            event = subscriber.next_event(timeout=timeout)
+            if event is not None:
+                yield f'event: change\ndata: {json.dumps(event)}\n\n'
+            elif not _token_active(expires_at, jti, app):
+                yield 'event: expired\ndata: {}\n\n'
+                return
+            else:
+                # Comentário SSE: mantém proxies e o navegador com a conexão aberta
+                yield ': heartbeat\n\n'
+    finally:
+        broker.unsubscribe(subscriber)
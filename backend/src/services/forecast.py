@@ -0,0 +1,168 @@
+import calendar
+import os
+from datetime import datetime
+import numpy as np
+from sqlalchemy import delete, extract, func, insert
+from src.models import db
+from src.models.forecast import SpendForecast
+from src.models.money import cents
+from src.models.rollup import MonthlyRollup
+from src.models.transaction import Transaction
+from src.services.periods import month_bounds, shift_month
+
+# Meia-vida, em dias, do peso dos gastos recentes no ritmo diário
+HALF_LIFE_DAYS = float(os.environ.get('FORECAST_HALF_LIFE_DAYS', 7))
+# Meses anteriores usados para a média e a sazonalidade (o primeiro é o mesmo mês do ano passado)
+HISTORY_MONTHS = 12
+SEASONAL_LIMITS = (0.5, 2.0)
+
+# Separador das chaves (família, categoria) nos arrays de séries
+_KEY_SEPARATOR = '\x1f'
+
+
+def project_month_end(daily, history, day, days_in_month, half_life=HALF_LIFE_DAYS):
+    """Projeta o total do mês de cada série com operações vetorizadas.
+
+    `daily` tem forma (séries, dias do mês) com os gastos até `day`; `history`
+    tem forma (séries, HISTORY_MONTHS) com os totais dos meses anteriores, do
+    mais antigo (mesmo mês do ano passado) ao mês passado. O ritmo do mês é a
+    média diária ponderada pela recência, projetada nos dias restantes; o
+    esperado pelo histórico é a média mensal ajustada pelo índice sazonal. As
+    duas estimativas são combinadas conforme a fração do mês já decorrida.
+    """
+    elapsed = daily[:, :day]
+    spent = elapsed.sum(axis=1)
+    weights = 0.5 ** (np.arange(day - 1, -1, -1) / half_life)
+    rate = elapsed @ weights / weights.sum()
+    pace = spent + rate * (days_in_month - day)
+
+    # Média só a partir do primeiro mês com gasto, para séries com histórico curto
+    has_spend = history > 0
+    months = np.where(has_spend.any(axis=1), history.shape[1] - has_spend.argmax(axis=1), 0)
+    average = history.sum(axis=1) / np.maximum(months, 1)
+    same_month = history[:, 0]
+    seasonal = np.ones_like(average)
+    full_year = (months == history.shape[1]) & (same_month > 0)
+    seasonal[full_year] = np.clip(same_month[full_year] / average[full_year], *SEASONAL_LIMITS)
+    expected = average * seasonal
+
+    progress = day / days_in_month
+    blended = progress * pace + (1 - progress) * expected
+    forecast = np.where(months > 0, np.maximum(blended, spent), pace)
+    return {
+        'spent_to_date': spent,
+        'pace': pace,
+        'expected': expected,
+        'seasonal_index': seasonal,
+        'forecast': forecast,
+    }
+
+
+def _load_series(as_of, family_id=None):
+    """Gastos por dia do mês corrente e totais dos meses anteriores, em duas consultas agrupadas"""
+    start, _ = month_bounds(as_of.year, as_of.month)
+    day = extract('day', Transaction.date)
+    daily = db.session.query(
+        Transaction.family_id, Transaction.category, day, cents(func.sum(Transaction.amount))
+    ).filter(
+        Transaction.transaction_type == 'despesa',
+        Transaction.date >= start,
+        Transaction.date <= as_of
+    )
+
+    first_year, first_month = shift_month(as_of.year, as_of.month, -HISTORY_MONTHS)
+    start_index = first_year * 12 + first_month
+    month_index = MonthlyRollup.year * 12 + MonthlyRollup.month
+    monthly = db.session.query(
+        MonthlyRollup.family_id, MonthlyRollup.category, month_index - start_index,
+        cents(MonthlyRollup.total_amount)
+    ).filter(
+        MonthlyRollup.transaction_type == 'despesa',
+        month_index >= start_index,
+        month_index < start_index + HISTORY_MONTHS
+    )
+    if family_id is not None:
+        daily = daily.filter(Transaction.family_id == family_id)
+        monthly = monthly.filter(MonthlyRollup.family_id == family_id)
+
+    daily = daily.group_by(Transaction.family_id, Transaction.category, day).all()
+    return daily, monthly.all()
+
+
+def _columns(rows):
+    """Converte as linhas (família, categoria, posição, centavos) em arrays"""
+    if not rows:
+        return np.array([], dtype=str), np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+    families, categories, positions, amounts = zip(*rows)
+    keys = np.char.add(np.char.add(np.array(families, dtype=str), _KEY_SEPARATOR), np.array(categories, dtype=str))
+    return keys, np.array(positions, dtype=np.int64), np.array(amounts, dtype=np.float64) / 100
+
+
+def compute_forecasts(as_of, family_id=None):
+    """Previsão de fim de mês para todas as (família, categoria) com gasto recente.
+
+    Retorna um dict com os arrays de project_month_end mais `family_id` e
+    `category`, alinhados por série. Sem `family_id`, cobre todas as famílias.
+    """
+    daily_rows, monthly_rows = _load_series(as_of, family_id)
+    daily_keys, days, daily_amounts = _columns(daily_rows)
+    monthly_keys, positions, monthly_amounts = _columns(monthly_rows)
+
+    keys, inverse = np.unique(np.concatenate([daily_keys, monthly_keys]), return_inverse=True)
+    days_in_month = calendar.monthrange(as_of.year, as_of.month)[1]
+    daily = np.zeros((len(keys), days_in_month))
+    history = np.zeros((len(keys), HISTORY_MONTHS))
+    np.add.at(daily, (inverse[:len(daily_keys)], days - 1), daily_amounts)
+    np.add.at(history, (inverse[len(daily_keys):], positions), monthly_amounts)
+
+    result = project_month_end(daily, history, as_of.day, days_in_month)
+    split = np.char.partition(keys.astype(str), _KEY_SEPARATOR) if len(keys) else np.empty((0, 3), dtype=str)
+    result['family_id'] = split[:, 0]
+    result['category'] = split[:, 2]
+    result['days_in_month'] = days_in_month
+    return result
+
+
+def family_forecast(family_id, as_of):
+    """Previsão de uma família no formato da API, da maior categoria para a menor"""
+    result = compute_forecasts(as_of, family_id)
+    order = np.argsort(-result['forecast'], kind='stable')
+    categories = [{
+        'category': str(result['category'][i]),
+        'spent_to_date': round(float(result['spent_to_date'][i]), 2),
+        'forecast': round(float(result['forecast'][i]), 2),
+        'pace': round(float(result['pace'][i]), 2),
+        'expected': round(float(result['expected'][i]), 2),
+        'seasonal_index': round(float(result['seasonal_index'][i]), 3),
+    } for i in order]
+    return {
+        'as_of': as_of.isoformat(),
+        'days_in_month': result['days_in_month'],
+        'categories': categories,
+        'total_spent': round(float(result['spent_to_date'].sum()), 2),
+        'total_forecast': round(float(result['forecast'].sum()), 2),
+    }
+
+
+def store_forecasts(as_of, result):
+    """Grava a previsão do mês de todas as famílias, substituindo a execução anterior"""
+    table = SpendForecast.__table__
+    db.session.execute(delete(table).where(table.c.year == as_of.year, table.c.month == as_of.month))
+    computed_at = datetime.utcnow()
+    rows = [{
+        'family_id': family_id,
+        'year': as_of.year,
+        'month': as_of.month,
+        'category': category,
+        'as_of': as_of,
+        'spent_to_date': spent,
+        'forecast': forecast,
+        'computed_at': computed_at,
+    } for family_id, category, spent, forecast in zip(
+        result['family_id'].tolist(), result['category'].tolist(),
+        np.round(result['spent_to_date'], 2).tolist(), np.round(result['forecast'], 2).tolist()
+    )]
+    if rows:
+        db.session.execute(insert(table), rows)
+    db.session.commit()
+    return len(rows)
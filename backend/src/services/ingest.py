@@ -0,0 +1,76 @@
+import math
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert
+from src.models import db
+from src.models.transaction import Transaction
+from src.models.rollup import record_transactions
+from src.models.sync import reserve_sequence
+
+TRANSACTION_TYPES = ('receita', 'despesa')
+REQUIRED_FIELDS = ('date', 'description', 'category', 'amount', 'transaction_type', 'payment_method')
+
+
+def parse_amount(value):
+    """Converte um valor monetário recebido; nan e infinito são inválidos"""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('Valor inválido.')
+    if not math.isfinite(amount):
+        raise ValueError('Valor inválido.')
+    return amount
+
+
+def parse_transaction(data, family_id):
+    """Valida um lançamento recebido e devolve os valores das colunas.
+
+    Levanta ValueError com a mensagem exibida ao usuário quando o item é inválido.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Item inválido.')
+    missing = [field for field in REQUIRED_FIELDS if data.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Campos obrigatórios ausentes: {', '.join(missing)}.")
+
+    try:
+        transaction_date = datetime.strptime(str(data['date']), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Data inválida.')
+    amount = parse_amount(data['amount'])
+    if amount <= 0:
+        raise ValueError('O valor da transação deve ser maior que zero.')
+    if data['transaction_type'] not in TRANSACTION_TYPES:
+        raise ValueError('Tipo de transação inválido.')
+
+    return {
+        'family_id': family_id,
+        'date': transaction_date,
+        'description': str(data['description'])[:200],
+        'category': str(data['category'])[:100],
+        'amount': amount,
+        'transaction_type': data['transaction_type'],
+        'payment_method': str(data['payment_method'])[:100],
+    }
+
+
+def insert_transactions(rows):
+    """Insere um lote de transações com um único executemany.
+
+    Atualiza o agregado mensal na mesma transação de banco e devolve a
+    quantidade de linhas inseridas. O commit fica a cargo de quem chama.
+    """
+    if not rows:
+        return 0
+    # O executemany não passa pelos eventos do ORM: numerar as alterações aqui
+    connection = db.session.connection()
+    sequences = {
+        family_id: reserve_sequence(connection, family_id, count)
+        for family_id, count in Counter(row['family_id'] for row in rows).items()
+    }
+    for row in rows:
+        row['change_seq'] = sequences[row['family_id']]
+        sequences[row['family_id']] += 1
+    db.session.execute(insert(Transaction), rows)
+    record_transactions(rows)
+    return len(rows)
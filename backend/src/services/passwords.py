@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Formato completo do werkzeug (método:parâmetros), comparado com o prefixo dos hashes salvos
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))
+
+
+class HasherBusy(Exception):
+    """Fila de hashing cheia: o chamador deve responder 503"""
+
+
+class PasswordHasher:
+    """Executa o hashing de senhas em um pool limitado de threads.
+
+    scrypt e pbkdf2 liberam o GIL, então o trabalho não trava as outras
+    requisições do worker; o semáforo limita quantos hashes podem estar
+    pendentes ao mesmo tempo. Com workers=0 o hash roda na própria thread.
+    """
+
+    def __init__(self, method=HASH_METHOD, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING):
+        self.method = method
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='password-hash') if workers else None
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+
+    def _run(self, fn, *args):
+        if self._pool is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+
+hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return hasher.hash(password)
+
+
+def verify_password(password_hash, password):
+    return hasher.verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return hasher.needs_rehash(password_hash)
@@ -0,0 +1,17 @@
+from datetime import date
+
+
+def shift_month(year, month, delta):
+    """Desloca (ano, mês) em `delta` meses, atravessando viradas de ano"""
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def month_bounds(year, month, months=1):
+    """Intervalo semiaberto [primeiro dia, primeiro dia após `months` meses).
+
+    Usado em filtros `date >= inicio AND date < fim`, que aproveitam os
+    índices em (family_id, date) ao contrário de extract('month', ...).
+    """
+    end_year, end_month = shift_month(year, month, months)
+    return date(year, month, 1), date(end_year, end_month, 1)
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from src.models import db
+from src.models.token import RevokedToken
+
+BUCKET_SECONDS = int(os.environ.get('REVOCATION_BUCKET_SECONDS', 300))
+# Intervalo máximo para um worker enxergar revogações feitas por outro
+SYNC_SECONDS = float(os.environ.get('REVOCATION_SYNC_SECONDS', 5))
+
+
+class RevocationList:
+    """Conjunto de jti revogados com expiração por faixas de tempo.
+
+    A consulta é um lookup em dicionário. Cada jti fica na faixa da sua
+    expiração, e faixas inteiras são descartadas quando vencem, pois o
+    próprio JWT já é recusado pelo `exp` a partir daí.
+    """
+
+    def __init__(self, bucket_seconds=BUCKET_SECONDS, clock=time.time):
+        self.bucket_seconds = bucket_seconds
+        self._clock = clock
+        self._bucket_by_jti = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._evicted_until = 0
+
+    def add(self, jti, expires_at):
+        """Registra o jti até `expires_at` (timestamp em segundos)"""
+        bucket = int(expires_at // self.bucket_seconds)
+        with self._lock:
+            if bucket < self._evicted_until or jti in self._bucket_by_jti:
+                return
+            self._bucket_by_jti[jti] = bucket
+            self._buckets.setdefault(bucket, set()).add(jti)
+        self.evict()
+
+    def __contains__(self, jti):
+        return jti in self._bucket_by_jti
+
+    def __len__(self):
+        return len(self._bucket_by_jti)
+
+    def evict(self):
+        """Descarta as faixas cuja expiração já passou"""
+        current = int(self._clock() // self.bucket_seconds)
+        if current <= self._evicted_until:
+            return
+        with self._lock:
+            for bucket in [bucket for bucket in self._buckets if bucket < current]:
+                for jti in self._buckets.pop(bucket):
+                    del self._bucket_by_jti[jti]
+            self._evicted_until = current
+
+    def clear(self):
+        with self._lock:
+            self._bucket_by_jti.clear()
+            self._buckets.clear()
+            self._evicted_until = 0
+
+    def stats(self):
+        return {'revoked': len(self._bucket_by_jti), 'buckets': len(self._buckets),
+                'bucket_seconds': self.bucket_seconds}
+
+
+revoked_tokens = RevocationList()
+_synced_at = {'monotonic': 0.0, 'revoked_at': datetime(1970, 1, 1)}
+_sync_lock = threading.Lock()
+
+
+def _timestamp(value):
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def revoke_token(jti, user_id, expires_at):
+    """Persiste a revogação e a aplica imediatamente neste worker"""
+    if jti in revoked_tokens:
+        return
+    expires = datetime.utcfromtimestamp(expires_at)
+    db.session.merge(RevokedToken(jti=jti, user_id=user_id, expires_at=expires))
+    db.session.commit()
+    revoked_tokens.add(jti, expires_at)
+
+
+def load_revocations():
+    """Reconstrói a lista em memória a partir do banco, removendo o que já expirou"""
+    now = datetime.utcnow()
+    RevokedToken.query.filter(RevokedToken.expires_at <= now).delete()
+    db.session.commit()
+    revoked_tokens.clear()
+    for jti, expires_at in db.session.query(RevokedToken.jti, RevokedToken.expires_at):
+        revoked_tokens.add(jti, _timestamp(expires_at))
+    _synced_at.update(monotonic=time.monotonic(), revoked_at=now)
+
+
+def sync_revocations(force=False):
+    """Traz as revogações feitas por outros workers, no máximo a cada SYNC_SECONDS"""
+    if not force and time.monotonic() - _synced_at['monotonic'] < SYNC_SECONDS:
+        return
+    if not _sync_lock.acquire(blocking=False):
+        return
+    try:
+        now = datetime.utcnow()
+        # Pequena sobreposição para não perder commits concorrentes com a última leitura
+        since = _synced_at['revoked_at'] - timedelta(seconds=SYNC_SECONDS)
+        rows = db.session.query(RevokedToken.jti, RevokedToken.expires_at).filter(
+            RevokedToken.revoked_at >= since
+        )
+        for jti, expires_at in rows:
+            revoked_tokens.add(jti, _timestamp(expires_at))
+        _synced_at.update(monotonic=time.monotonic(), revoked_at=now)
+    finally:
+        _sync_lock.release()
@@ -0,0 +1,60 @@
+import re
+from sqlalchemy import column, func, literal_column, table, text
+from src.models import db
+from src.models.transaction import Transaction
+from src.services.serialization import row_plan
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+transaction_fts = table('transaction_fts', column('rowid'), column('rank'))
+
+
+def search_terms(query):
+    """Palavras da busca, sem a sintaxe de operadores do motor de busca"""
+    return TOKEN.findall(query.lower())
+
+
+def postgres_match(terms):
+    """tsvector da descrição e tsquery dos termos, ambos sem acentos como no FTS5.
+
+    O documento repete a expressão do índice GIN ix_transaction_description_unaccent_fts.
+    """
+    config = literal_column("'portuguese'")
+    document = func.to_tsvector(config, func.immutable_unaccent(Transaction.description))
+    tsquery = func.to_tsquery(config, func.immutable_unaccent(' & '.join(terms[:-1] + [f'{terms[-1]}:*'])))
+    return document, tsquery
+
+
+def search_transactions(family_id, query, limit, offset=0):
+    """Busca transações da família pela descrição, ordenadas por relevância.
+
+    Todos os termos precisam aparecer e o último é tratado como prefixo,
+    para que 'merc' encontre 'mercado' enquanto o usuário digita.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    plan = row_plan(Transaction)
+    statement = plan.select().where(Transaction.family_id == family_id)
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        # 'rank' do FTS5 é o bm25: menor é mais relevante
+        match = ' '.join(f'"{term}"' for term in terms) + '*'
+        statement = statement.join(
+            transaction_fts, transaction_fts.c.rowid == Transaction.id
+        ).where(
+            text('transaction_fts MATCH :match').bindparams(match=match)
+        ).order_by(transaction_fts.c.rank, Transaction.id.desc())
+    elif dialect == 'postgresql':
+        document, tsquery = postgres_match(terms)
+        statement = statement.where(document.op('@@')(tsquery)).order_by(
+            func.ts_rank(document, tsquery).desc(), Transaction.id.desc()
+        )
+    else:
+        for term in terms:
+            statement = statement.where(Transaction.description.ilike(f'%{term}%'))
+        statement = statement.order_by(Transaction.date.desc(), Transaction.id.desc())
+
+    rows = db.session.execute(statement.limit(limit).offset(offset))
+    return plan.serialize(rows)
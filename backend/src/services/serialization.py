@@ -0,0 +1,74 @@
+from datetime import date, datetime
+from sqlalchemy import select
+from src.models import db
+from src.models.transaction import Debt, Goal
+
+# Colunas internas que não fazem parte de to_dict()
+INTERNAL_COLUMNS = {'change_seq'}
+
+# Campos derivados de to_dict(), calculados sobre o dicionário já montado
+COMPUTED_FIELDS = {
+    Debt: (
+        ('remaining_amount', lambda item: item['total_amount'] - item['paid_amount']),
+    ),
+    Goal: (
+        ('progress_percentage', lambda item: (item['saved_amount'] / item['target_amount'] * 100)
+            if item['target_amount'] > 0 else 0),
+    ),
+}
+
+
+class RowPlan:
+    """Plano de serialização de um modelo a partir de tuplas do Core.
+
+    Seleciona as colunas da tabela sem instanciar objetos ORM e converte
+    cada tupla no mesmo dicionário produzido por `to_dict()`.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = [column for column in model.__table__.columns if column.key not in INTERNAL_COLUMNS]
+        self.keys = [column.key for column in self.columns]
+        self.temporal_positions = [
+            position for position, column in enumerate(self.columns)
+            if column.type.python_type in (date, datetime)
+        ]
+        self.computed = COMPUTED_FIELDS.get(model, ())
+
+    def select(self, *extra_columns):
+        """SELECT das colunas do plano; colunas extras vêm ao final e são ignoradas por serialize()"""
+        return select(*self.columns, *extra_columns)
+
+    def serialize(self, rows):
+        keys = self.keys
+        temporal_positions = self.temporal_positions
+        computed = self.computed
+        items = []
+        for row in rows:
+            values = list(row)
+            for position in temporal_positions:
+                value = values[position]
+                values[position] = value.isoformat() if value else None
+            item = dict(zip(keys, values))
+            for key, compute in computed:
+                item[key] = compute(item)
+            items.append(item)
+        return items
+
+
+_plans = {}
+
+
+def row_plan(model):
+    """Plano de serialização do modelo, montado uma vez e reutilizado"""
+    plan = _plans.get(model)
+    if plan is None:
+        plan = _plans[model] = RowPlan(model)
+    return plan
+
+
+def list_family_rows(model, family_id):
+    """Lista os registros de uma família no formato de `to_dict()`"""
+    plan = row_plan(model)
+    rows = db.session.execute(plan.select().where(model.family_id == family_id))
+    return plan.serialize(rows)
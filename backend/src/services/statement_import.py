@@ -0,0 +1,166 @@
+import csv
+import itertools
+import re
+import time
+from datetime import datetime
+from src.models import db
+from src.services.ingest import parse_transaction, insert_transactions
+
+DEFAULT_CHUNK_SIZE = 1000
+# Quantidade máxima de erros detalhados guardados no relatório
+MAX_REPORTED_ERRORS = 100
+
+# Cabeçalhos aceitos no CSV, em português ou inglês
+CSV_COLUMNS = {
+    'date': ('data', 'date', 'data lançamento', 'data lancamento'),
+    'description': ('descrição', 'descricao', 'description', 'histórico', 'historico'),
+    'amount': ('valor', 'amount'),
+    'category': ('categoria', 'category'),
+    'transaction_type': ('tipo', 'transaction_type'),
+    'payment_method': ('forma de pagamento', 'forma_pagamento', 'payment_method'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%Y%m%d')
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _normalize_date(value):
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+def _parse_amount(value):
+    """Converte '1.234,56', '-1234.56' ou 'R$ 10,00' em float"""
+    value = value.strip().replace('R$', '').replace(' ', '')
+    if ',' in value:
+        value = value.replace('.', '').replace(',', '.')
+    return float(value)
+
+
+def _statement_item(date_value, description, amount_value, category, transaction_type, payment_method):
+    """Monta um item no formato aceito por parse_transaction.
+
+    Valores negativos viram despesas e positivos receitas quando o extrato
+    não informa o tipo explicitamente.
+    """
+    try:
+        amount = _parse_amount(amount_value)
+    except (AttributeError, ValueError):
+        amount = amount_value
+    if not transaction_type and isinstance(amount, float):
+        transaction_type = 'despesa' if amount < 0 else 'receita'
+    return {
+        'date': _normalize_date(date_value or ''),
+        'description': (description or '').strip(),
+        'category': category,
+        'amount': abs(amount) if isinstance(amount, float) else amount,
+        'transaction_type': transaction_type,
+        'payment_method': payment_method,
+    }
+
+
+def iter_csv_statement(lines, category='Outros', payment_method='Importado'):
+    """Gera itens a partir de um extrato CSV, uma linha por vez"""
+    lines = iter(lines)
+    header_line = next(lines, '')
+    # Extratos de bancos brasileiros costumam usar ';' como separador
+    delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+    reader = csv.reader(itertools.chain([header_line], lines), delimiter=delimiter)
+    header = [column.strip().lower() for column in next(reader, [])]
+    positions = {
+        field: next((header.index(name) for name in names if name in header), None)
+        for field, names in CSV_COLUMNS.items()
+    }
+
+    def column(row, field, default=None):
+        position = positions[field]
+        if position is None or position >= len(row) or not row[position].strip():
+            return default
+        return row[position]
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield _statement_item(
+            column(row, 'date'),
+            column(row, 'description'),
+            column(row, 'amount'),
+            column(row, 'category', category),
+            column(row, 'transaction_type'),
+            column(row, 'payment_method', payment_method),
+        )
+
+
+def iter_ofx_statement(lines, category='Outros', payment_method='Importado'):
+    """Gera itens a partir de um extrato OFX (SGML ou XML), bloco <STMTTRN> por bloco"""
+    current = None
+    for line in lines:
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not closing:
+                    current = {}
+                elif current is not None:
+                    yield _ofx_item(current, category, payment_method)
+                    current = None
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+    if current:
+        yield _ofx_item(current, category, payment_method)
+
+
+def _ofx_item(fields, category, payment_method):
+    return _statement_item(
+        fields.get('DTPOSTED', '')[:8],
+        fields.get('MEMO') or fields.get('NAME'),
+        fields.get('TRNAMT'),
+        category,
+        None,
+        payment_method,
+    )
+
+
+STATEMENT_PARSERS = {
+    'csv': iter_csv_statement,
+    'ofx': iter_ofx_statement,
+}
+
+
+def import_statement(lines, statement_format, family_id, chunk_size=DEFAULT_CHUNK_SIZE,
+                     progress=None, **defaults):
+    """Importa um extrato em lotes, com um commit por lote.
+
+    `lines` é qualquer iterável de linhas de texto (arquivo aberto, stream
+    do upload); ele nunca é carregado inteiro na memória. `progress`, se
+    informado, recebe o relatório parcial após cada lote.
+    """
+    parser = STATEMENT_PARSERS[statement_format]
+    report = {'rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'elapsed': 0.0, 'rows_per_second': 0.0}
+    started = time.perf_counter()
+    chunk = []
+
+    def flush():
+        report['imported'] += insert_transactions(chunk)
+        db.session.commit()
+        chunk.clear()
+        report['elapsed'] = round(time.perf_counter() - started, 3)
+        report['rows_per_second'] = round(report['rows'] / report['elapsed'], 1) if report['elapsed'] else 0.0
+        if progress:
+            progress(report)
+
+    for item in parser(lines, **defaults):
+        report['rows'] += 1
+        try:
+            chunk.append(parse_transaction(item, family_id))
+        except ValueError as e:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': report['rows'], 'error': str(e)})
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return report
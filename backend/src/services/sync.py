@@ -0,0 +1,60 @@
+from sqlalchemy import select
+from src.models import db
+from src.models.sync import SYNCED_MODELS, Tombstone
+from src.services.serialization import row_plan
+
+
+def collect_changes(family_id, since, limit):
+    """Alterações da família com sequência maior que `since`, em ordem.
+
+    Cada coleção contribui com no máximo `limit + 1` linhas pelo índice
+    (family_id, change_seq); o resultado mesclado é cortado em `limit`
+    alterações e o cursor aponta para a última entregue, junto com a família
+    servida, para o cliente descartar um cursor de outra família. Tombstones
+    superados por um upsert posterior na mesma página são omitidos.
+    """
+    changes = []
+    for entity, model in SYNCED_MODELS.items():
+        plan = row_plan(model)
+        rows = db.session.execute(
+            plan.select(model.change_seq)
+            .where(model.family_id == family_id, model.change_seq > since)
+            .order_by(model.change_seq)
+            .limit(limit + 1)
+        ).all()
+        items = plan.serialize(rows)
+        changes.extend((row[-1], entity, 'upsert', item) for row, item in zip(rows, items))
+
+    tombstones = db.session.execute(
+        select(Tombstone.change_seq, Tombstone.entity, Tombstone.entity_id)
+        .where(Tombstone.family_id == family_id, Tombstone.change_seq > since)
+        .order_by(Tombstone.change_seq)
+        .limit(limit + 1)
+    ).all()
+    changes.extend((seq, entity, 'delete', entity_id) for seq, entity, entity_id in tombstones)
+
+    changes.sort(key=lambda change: change[0])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Um upsert posterior do mesmo (entidade, id) supera o tombstone da página:
+    # o cliente aplica exclusões e upserts em listas separadas, sem a ordem
+    upserted = {}
+    for seq, entity, kind, payload in changes:
+        if kind == 'upsert':
+            upserted[entity, payload['id']] = seq
+    changes = [
+        change for change in changes
+        if change[2] == 'upsert' or upserted.get((change[1], change[3]), 0) < change[0]
+    ]
+
+    response = {
+        'family_id': family_id,
+        'cursor': changes[-1][0] if changes else since,
+        'has_more': has_more,
+        'changes': {entity: [] for entity in SYNCED_MODELS},
+        'deleted': {entity: [] for entity in SYNCED_MODELS},
+    }
+    for _, entity, kind, payload in changes:
+        response['changes' if kind == 'upsert' else 'deleted'][entity].append(payload)
+    return response
@@ -1,7 +1,29 @@
+import csv
+import io
 import os
 import pytest
+import time
 from main import app, db
-from flask import json
+from flask import json, jsonify
+from datetime import date, timedelta
+from sqlalchemy import create_engine, event, insert, inspect, select, text
+from werkzeug.security import generate_password_hash
+from src.models.migrations import MIGRATIONS, SchemaVersion, schema_version, upgrade, convert_money_columns, autoincrement_synced_ids, migration_lock, POSTGRES_SEARCH_DDL
+from src.models.rollup import MonthlyRollup, upsert_rollup, verify_rollup, rebuild_rollup
+from src.routes.auth import principal_cache
+from src.services.budgets import build_budget_suggestions, percentile
+from src.services.forecast import compute_forecasts, family_forecast, store_forecasts
+from src.services.cache import FamilyLRUCache, TTLCache, dashboard_cache, suggestion_cache
+from src.services.passwords import HasherBusy, PasswordHasher, hasher
+from src.services.revocation import RevocationList, load_revocations, revoked_tokens, sync_revocations
+from src.services.events import BrokerFull, EventBroker, LocalBackend, broker, event_stream, family_changed
+from src.services.search import postgres_match
+from src.services.serialization import list_family_rows
+from src.models.budget_models import UPSERT_BUDGET_SQL, budgets_table
+from src.models.user import User
+from src.models.forecast import SpendForecast
+from src.models.sync import Tombstone
+from src.models.transaction import Transaction, CreditCard, Investment, Debt, Goal
 
 @pytest.fixture
 def client():
@@ -19,6 +41,10 @@ def setup_and_teardown():
     with app.app_context():
         db.drop_all()
         db.create_all()
+    dashboard_cache.clear()
+    suggestion_cache.clear()
+    principal_cache.clear()
+    revoked_tokens.clear()
 
 
 def test_register_and_login(client):
@@ -166,6 +192,17 @@ def test_create_transaction_invalid_amount(client):
     assert 'Data inválida.' in response.get_json()['error']
 
 
+def test_create_transaction_rejects_non_finite_amount(client):
+    headers = {'x-access-token': _register_and_login(client, 'user4b')}
+    for amount in ('inf', 'nan', 'abc'):
+        response = client.post('/api/transactions', json={
+            'date': '2025-09-01', 'description': 'Teste', 'category': 'Teste',
+            'amount': amount, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+        }, headers=headers)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Valor inválido.'
+
+
 def test_pagination_and_filters(client):
     client.post('/api/register', json={
         'username': 'user5',
@@ -210,3 +247,1121 @@ def test_pagination_and_filters(client):
     data = response.get_json()
     for item in data['items']:
         assert item['currency'] == 'USD'
+
+
+def _register_and_login(client, username):
+    client.post('/api/register', json={
+        'username': username,
+        'email': f'{username}@email.com',
+        'password': 'senha',
+        'confirm_password': 'senha'
+    })
+    login_resp = client.post('/api/auth/login', json={
+        'email': f'{username}@email.com',
+        'password': 'senha'
+    })
+    return login_resp.get_json()['token']
+
+
+class _QueryCounter:
+    """Conta os statements SQL emitidos enquanto o contexto está ativo"""
+
+    def __init__(self):
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def test_dashboard_summary_single_aggregation(client):
+    token = _register_and_login(client, 'user6')
+    today = date.today()
+    this_month = today.replace(day=1)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    entries = [
+        (this_month, 'Salário', 5000.0, 'receita'),
+        (this_month, 'Mercado', 300.0, 'despesa'),
+        (this_month, 'Mercado', 200.0, 'despesa'),
+        (this_month, 'Transporte', 100.0, 'despesa'),
+        (last_month, 'Salário', 4000.0, 'receita'),
+        (last_month, 'Lazer', 150.0, 'despesa'),
+    ]
+    for entry_date, category, amount, transaction_type in entries:
+        client.post('/api/transactions',
+            json={
+                'date': entry_date.isoformat(),
+                'description': category,
+                'category': category,
+                'amount': amount,
+                'transaction_type': transaction_type,
+                'payment_method': 'PIX'
+            },
+            headers={'x-access-token': token}
+        )
+
+    with _QueryCounter() as counter:
+        response = client.get('/api/dashboard/summary', headers={'x-access-token': token})
+    assert response.status_code == 200
+    # Busca do usuário autenticado + uma única agregação
+    assert counter.count <= 2
+
+    data = response.get_json()
+    assert data['total_income'] == 5000.0
+    assert data['total_expenses'] == 600.0
+    assert data['balance'] == 4400.0
+    assert data['expenses_by_category'] == [
+        {'category': 'Mercado', 'amount': 500.0},
+        {'category': 'Transporte', 'amount': 100.0},
+    ]
+    evolution = data['monthly_evolution']
+    assert len(evolution) == 6
+    assert evolution[-1] == {'month': this_month.strftime('%m/%Y'), 'income': 5000.0, 'expenses': 600.0}
+    assert evolution[-2] == {'month': last_month.strftime('%m/%Y'), 'income': 4000.0, 'expenses': 150.0}
+    assert evolution[0]['income'] == 0 and evolution[0]['expenses'] == 0
+
+
+def test_transaction_indexes_created():
+    with app.app_context():
+        upgrade()
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('transaction')}
+    assert {'ix_transaction_family_date', 'ix_transaction_family_type_date'} <= indexes
+
+
+def test_monthly_rollup_tracks_writes(client):
+    token = _register_and_login(client, 'user7')
+    ids = []
+    for amount in (10.0, 25.0, 40.0):
+        response = client.post('/api/transactions',
+            json={
+                'date': '2025-09-05',
+                'description': 'Mercado',
+                'category': 'Alimentação',
+                'amount': amount,
+                'transaction_type': 'despesa',
+                'payment_method': 'PIX'
+            },
+            headers={'x-access-token': token}
+        )
+        ids.append(response.get_json()['id'])
+    client.delete(f'/api/transactions/{ids[-1]}', headers={'x-access-token': token})
+
+    with app.app_context():
+        row = MonthlyRollup.query.filter_by(category='Alimentação', year=2025, month=9).one()
+        assert (row.total_amount, row.count, row.min_amount, row.max_amount) == (35.0, 2, 10.0, 25.0)
+        assert verify_rollup() == []
+
+        # Divergência detectada e corrigida pela reconstrução
+        row.total_amount = 999.0
+        db.session.commit()
+        assert len(verify_rollup()) == 1
+        rebuild_rollup()
+        assert verify_rollup() == []
+
+
+def test_dashboard_cache_invalidated_on_write(client):
+    token = _register_and_login(client, 'user8')
+    headers = {'x-access-token': token}
+    transaction = {
+        'date': date.today().isoformat(),
+        'description': 'Salário',
+        'category': 'Salário',
+        'amount': 1000.0,
+        'transaction_type': 'receita',
+        'payment_method': 'PIX'
+    }
+    client.post('/api/transactions', json=transaction, headers=headers)
+
+    assert client.get('/api/dashboard/summary', headers=headers).get_json()['total_income'] == 1000.0
+    with _QueryCounter() as counter:
+        response = client.get('/api/dashboard/summary', headers=headers)
+    assert response.get_json()['total_income'] == 1000.0
+    assert not any('monthly_rollup' in statement for statement in counter.statements)
+
+    client.post('/api/transactions', json=transaction, headers=headers)
+    assert client.get('/api/dashboard/summary', headers=headers).get_json()['total_income'] == 2000.0
+
+    stats = client.get('/api/dashboard/cache-stats', headers=headers).get_json()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (1, 2, 1)
+
+
+def test_cache_skips_fill_computed_before_invalidation():
+    cache = FamilyLRUCache()
+    generation = cache.generation('familia')
+    cache.invalidate_family('familia')  # escrita concorrente durante o cálculo
+    cache.set(('familia', 2025, 3), 'defasado', generation)
+    assert cache.get(('familia', 2025, 3)) is None
+
+    cache.set(('familia', 2025, 3), 'atual', cache.generation('familia'))
+    assert cache.get(('familia', 2025, 3)) == 'atual'
+
+    # Gerações limitadas a maxsize famílias, sem voltar a um valor já lido
+    small = FamilyLRUCache(maxsize=2)
+    before = small.generation('a')
+    for family_id in ('a', 'b', 'c'):
+        small.invalidate_family(family_id)
+    assert len(small._generations) == 2
+    small.set(('a', 2025, 3), 'defasado', before)
+    assert small.get(('a', 2025, 3)) is None
+
+
+def test_family_cache_entries_expire_after_ttl():
+    now = [0.0]
+    cache = FamilyLRUCache(ttl=300, clock=lambda: now[0])
+    cache.set(('familia', 2025, 3), 'resumo')
+    now[0] = 299
+    assert cache.get(('familia', 2025, 3)) == 'resumo'
+    now[0] = 301  # escrita fora do servidor, sem family_changed
+    assert cache.get(('familia', 2025, 3)) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_family_write_invalidates_cache_once_per_worker():
+    dashboard_cache.set(('familia', 2025, 3), 'resumo')
+    before = dashboard_cache._last_generation
+    family_changed('familia', 'transactions', 'created', 1)
+    assert dashboard_cache.get(('familia', 2025, 3)) is None
+    assert dashboard_cache._last_generation == before + 1
+
+    # Notificação de outro worker: invalida ao receber
+    broker._deliver({'family_id': 'familia', 'event': {'entity': '*'}, 'origin': 'outro'})
+    assert dashboard_cache._last_generation == before + 2
+
+
+def test_transactions_keyset_pagination(client):
+    token = _register_and_login(client, 'user9')
+    headers = {'x-access-token': token}
+    for i in range(7):
+        client.post('/api/transactions',
+            json={
+                'date': f'2025-09-{i + 1:02d}',
+                'description': f'Transação {i}',
+                'category': 'Mercado' if i % 2 == 0 else 'Lazer',
+                'amount': 10.0 * (i + 1),
+                'transaction_type': 'despesa',
+                'payment_method': 'PIX'
+            },
+            headers=headers
+        )
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/transactions?limit=3' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url, headers=headers).get_json()
+        assert len(data['items']) <= 3
+        seen.extend(item['date'] for item in data['items'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert seen == [f'2025-09-{day:02d}' for day in range(7, 0, -1)]
+
+    data = client.get('/api/transactions?category=Mercado&min_amount=20&date_to=2025-09-05',
+                      headers=headers).get_json()
+    assert [item['amount'] for item in data['items']] == [50.0, 30.0]
+
+    response = client.get('/api/transactions?cursor=invalido', headers=headers)
+    assert response.status_code == 400
+    for bound in ('min_amount=nan', 'max_amount=inf'):
+        assert client.get(f'/api/transactions?{bound}', headers=headers).status_code == 400
+        assert client.get(f'/api/transactions/export?{bound}', headers=headers).status_code == 400
+
+
+def test_export_transactions_streams_csv_and_ndjson(client):
+    token = _register_and_login(client, 'user10')
+    headers = {'x-access-token': token}
+    for i in range(3):
+        client.post('/api/transactions',
+            json={
+                'date': f'2025-08-0{i + 1}',
+                'description': f'Compra, item {i}',
+                'category': 'Mercado',
+                'amount': 10.5 + i,
+                'transaction_type': 'despesa',
+                'payment_method': 'PIX'
+            },
+            headers=headers
+        )
+
+    response = client.get('/api/transactions/export?format=csv', headers=headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][:5] == ['id', 'date', 'description', 'category', 'amount']
+    assert [row[1:5] for row in rows[1:]] == [
+        ['2025-08-01', 'Compra, item 0', 'Mercado', '10.5'],
+        ['2025-08-02', 'Compra, item 1', 'Mercado', '11.5'],
+        ['2025-08-03', 'Compra, item 2', 'Mercado', '12.5'],
+    ]
+
+    response = client.get('/api/transactions/export?format=ndjson', headers=headers)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['amount'] for line in lines] == [10.5, 11.5, 12.5]
+
+    assert client.get('/api/transactions/export?format=xml', headers=headers).status_code == 400
+
+
+def test_batch_transactions_reports_partial_failures(client):
+    token = _register_and_login(client, 'user11')
+    headers = {'x-access-token': token}
+    item = {
+        'date': '2025-07-10',
+        'description': 'Feira',
+        'category': 'Mercado',
+        'amount': 20.0,
+        'transaction_type': 'despesa',
+        'payment_method': 'PIX'
+    }
+    batch = [item, dict(item, amount=-5), dict(item, date='10-07-2025'), dict(item, amount=30.0)]
+
+    with _QueryCounter() as counter:
+        response = client.post('/api/transactions/batch', json={'transactions': batch}, headers=headers)
+    assert response.status_code == 207
+    data = response.get_json()
+    assert (data['created'], data['failed']) == (2, 2)
+    assert [result['status'] for result in data['results']] == ['created', 'error', 'error', 'created']
+    assert data['results'][1]['error'] == 'O valor da transação deve ser maior que zero.'
+    assert sum(statement.lstrip().upper().startswith('INSERT INTO "TRANSACTION"')
+               or statement.lstrip().upper().startswith('INSERT INTO TRANSACTION')
+               for statement in counter.statements) == 1
+
+    listed = client.get('/api/transactions', headers=headers).get_json()['items']
+    assert sorted(item['amount'] for item in listed) == [20.0, 30.0]
+    with app.app_context():
+        assert verify_rollup() == []
+
+    # Valores não finitos são erros do item, não do lote
+    response = client.post('/api/transactions/batch', json=[item, dict(item, amount='nan'), dict(item, amount='inf')],
+                           headers=headers)
+    assert response.status_code == 207
+    assert [result.get('error') for result in response.get_json()['results']] == [None, 'Valor inválido.', 'Valor inválido.']
+
+
+def test_import_validates_encoding_and_publishes_partial_imports(client, monkeypatch):
+    from src.services import statement_import
+    token = _register_and_login(client, 'user12b')
+    headers = {'x-access-token': token}
+    csv_statement = 'Data;Descrição;Valor\n05/06/2025;Padaria;-10,00\n06/06/2025;Feira;-20,00\n'
+
+    def upload(**form):
+        return client.post('/api/transactions/import', headers=headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(csv_statement.encode()), 'extrato.csv'), **form})
+
+    assert upload(encoding='nao-existe').status_code == 400
+
+    # O segundo lote falha depois do primeiro já confirmado
+    insert_chunk = statement_import.insert_transactions
+    calls = []
+
+    def failing_insert(rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError('falha no meio da importação')
+        return insert_chunk(rows)
+
+    monkeypatch.setattr(statement_import, 'insert_transactions', failing_insert)
+    with app.app_context():
+        family_id = User.query.filter_by(username='user12b').first().family_id
+    dashboard_cache.set((family_id, 2025, 6), 'antes da importação')
+    with pytest.raises(RuntimeError):
+        upload(chunk_size='1')
+    assert dashboard_cache.get((family_id, 2025, 6)) is None
+    assert [item['description'] for item in client.get('/api/transactions', headers=headers).get_json()['items']] == ['Padaria']
+
+
+def test_import_csv_and_ofx_statements(client):
+    token = _register_and_login(client, 'user12')
+    headers = {'x-access-token': token}
+    csv_statement = (
+        'Data;Descrição;Valor\n'
+        '05/06/2025;Supermercado;-150,25\n'
+        '06/06/2025;Salário;3.000,00\n'
+        'ontem;Linha inválida;-10,00\n'
+    )
+    response = client.post('/api/transactions/import',
+        data={'file': (io.BytesIO(csv_statement.encode()), 'extrato.csv'), 'chunk_size': '1'},
+        headers=headers,
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201
+    report = response.get_json()
+    assert (report['rows'], report['imported'], report['failed']) == (3, 2, 1)
+    assert report['errors'] == [{'row': 3, 'error': 'Data inválida.'}]
+
+    ofx_statement = (
+        'OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+        '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20250610120000[-3:BRT]\n<TRNAMT>-42.90\n<MEMO>Uber\n</STMTTRN>\n'
+        '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250611<TRNAMT>100.00<NAME>Pix recebido</STMTTRN>\n'
+        '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+    )
+    response = client.post('/api/transactions/import',
+        data={'file': (io.BytesIO(ofx_statement.encode()), 'extrato.ofx')},
+        headers=headers,
+        content_type='multipart/form-data'
+    )
+    assert response.get_json()['imported'] == 2
+
+    items = client.get('/api/transactions', headers=headers).get_json()['items']
+    assert [(item['date'], item['description'], item['amount'], item['transaction_type']) for item in items] == [
+        ('2025-06-11', 'Pix recebido', 100.0, 'receita'),
+        ('2025-06-10', 'Uber', 42.9, 'despesa'),
+        ('2025-06-06', 'Salário', 3000.0, 'receita'),
+        ('2025-06-05', 'Supermercado', 150.25, 'despesa'),
+    ]
+
+
+def test_lean_serialization_matches_to_dict(client):
+    token = _register_and_login(client, 'user13')
+    headers = {'x-access-token': token}
+    client.post('/api/transactions', json={
+        'date': '2025-05-01', 'description': 'Açougue', 'category': 'Mercado',
+        'amount': 89.9, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }, headers=headers)
+    client.post('/api/credit-cards', json={'name': 'Nubank', 'closing_day': 3, 'due_day': 10}, headers=headers)
+    client.post('/api/investments', json={
+        'date': '2025-05-02', 'asset_name': 'Tesouro Selic', 'broker': 'XP', 'amount': 1000
+    }, headers=headers)
+    client.post('/api/debts', json={'description': 'Carro', 'total_amount': 20000, 'paid_amount': 2500.5,
+                                    'monthly_payment': 800}, headers=headers)
+    client.post('/api/goals', json={'name': 'Viagem', 'target_amount': 0, 'saved_amount': 0}, headers=headers)
+    client.post('/api/goals', json={'name': 'Reserva', 'target_amount': 3000, 'saved_amount': 1000}, headers=headers)
+
+    with app.test_request_context():
+        family_id = User.query.filter_by(username='user13').one().family_id
+        for model in (Transaction, CreditCard, Investment, Debt, Goal):
+            records = model.query.filter_by(family_id=family_id).all()
+            assert records
+            expected = jsonify([record.to_dict() for record in records]).get_data()
+            assert jsonify(list_family_rows(model, family_id)).get_data() == expected
+
+
+def test_postgres_search_ignores_accents_like_sqlite():
+    from sqlalchemy.dialects import postgresql
+    document, tsquery = postgres_match(['acucar', 'refin'])
+    compiled = str(document.op('@@')(tsquery).compile(dialect=postgresql.dialect()))
+    assert compiled.count('immutable_unaccent(') == 2
+    index_ddl = POSTGRES_SEARCH_DDL[-1]
+    assert "to_tsvector('portuguese', immutable_unaccent(description))" in index_ddl
+
+
+def test_search_transactions_by_description(client):
+    token = _register_and_login(client, 'user14')
+    other_token = _register_and_login(client, 'user15')
+    with app.app_context():
+        upgrade()
+    headers = {'x-access-token': token}
+    descriptions = ['Mercado Pão de Açúcar', 'Uber para o trabalho', 'Mercadinho da esquina', 'Uber Eats mercado']
+    for description in descriptions:
+        client.post('/api/transactions', json={
+            'date': '2025-04-01', 'description': description, 'category': 'Outros',
+            'amount': 10.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+        }, headers=headers)
+    client.post('/api/transactions', json={
+        'date': '2025-04-01', 'description': 'Mercado de outra família', 'category': 'Outros',
+        'amount': 10.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }, headers={'x-access-token': other_token})
+
+    data = client.get('/api/transactions/search?q=uber', headers=headers).get_json()
+    assert sorted(item['description'] for item in data['items']) == ['Uber Eats mercado', 'Uber para o trabalho']
+
+    # Prefixo, acentos ignorados e paginação
+    data = client.get('/api/transactions/search?q=merc&limit=2', headers=headers).get_json()
+    assert len(data['items']) == 2 and data['next_offset'] == 2
+    rest = client.get('/api/transactions/search?q=merc&limit=2&offset=2', headers=headers).get_json()
+    found = {item['description'] for item in data['items'] + rest['items']}
+    assert found == {'Mercado Pão de Açúcar', 'Mercadinho da esquina', 'Uber Eats mercado'}
+    assert client.get('/api/transactions/search?q=acucar', headers=headers).get_json()['items'][0]['description'] \
+        == 'Mercado Pão de Açúcar'
+
+    # Remoções saem do índice
+    transaction_id = client.get('/api/transactions/search?q=uber eats', headers=headers).get_json()['items'][0]['id']
+    client.delete(f'/api/transactions/{transaction_id}', headers=headers)
+    data = client.get('/api/transactions/search?q=uber', headers=headers).get_json()
+    assert [item['description'] for item in data['items']] == ['Uber para o trabalho']
+
+
+def test_money_stored_as_integer_cents(client):
+    token = _register_and_login(client, 'user16')
+    headers = {'x-access-token': token}
+    for amount in (0.1, 0.2):
+        client.post('/api/transactions', json={
+            'date': date.today().isoformat(), 'description': 'Troco', 'category': 'Outros',
+            'amount': amount, 'transaction_type': 'despesa', 'payment_method': 'Dinheiro'
+        }, headers=headers)
+    assert client.get('/api/dashboard/summary', headers=headers).get_json()['total_expenses'] == 0.3
+    with app.app_context():
+        stored = db.session.execute(text('SELECT amount FROM "transaction" ORDER BY id')).scalars().all()
+    assert stored == [10, 20]
+
+    # Bancos antigos com colunas FLOAT são convertidos para centavos
+    legacy = create_engine('sqlite://')
+    with legacy.begin() as conn:
+        conn.execute(text('CREATE TABLE goal (id INTEGER PRIMARY KEY, family_id VARCHAR(50) NOT NULL, '
+                          'name VARCHAR(200) NOT NULL, target_amount FLOAT NOT NULL, saved_amount FLOAT, '
+                          'created_at DATETIME)'))
+        conn.execute(text("INSERT INTO goal (family_id, name, target_amount, saved_amount) "
+                          "VALUES ('f', 'Viagem', 1500.75, 0.1)"))
+    assert convert_money_columns(legacy) == ['goal.target_amount', 'goal.saved_amount']
+    with legacy.connect() as conn:
+        assert conn.execute(text('SELECT target_amount, saved_amount FROM goal')).one() == (150075, 10)
+        assert conn.execute(select(Goal.target_amount, Goal.saved_amount)).one() == (1500.75, 0.1)
+    assert convert_money_columns(legacy) == []
+
+
+def test_migration_lock_serializes_upgrades(tmp_path):
+    import threading
+    engine = create_engine(f"sqlite:///{tmp_path / 'planner.db'}")
+    inside = []
+    overlaps = []
+
+    def migrate():
+        with migration_lock(engine):
+            inside.append(1)
+            if len(inside) > 1:
+                overlaps.append(len(inside))
+            time.sleep(0.05)
+            inside.pop()
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+    assert (tmp_path / 'planner.db.migrate.lock').exists()
+
+
+def test_delta_sync_returns_only_changes_since_cursor(client):
+    token = _register_and_login(client, 'user17')
+    headers = {'x-access-token': token}
+    transaction = client.post('/api/transactions', json={
+        'date': '2025-03-01', 'description': 'Farmácia', 'category': 'Saúde',
+        'amount': 35.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }, headers=headers).get_json()
+    goal = client.post('/api/goals', json={'name': 'Reserva', 'target_amount': 1000}, headers=headers).get_json()
+
+    full = client.get('/api/sync?since=0', headers=headers).get_json()
+    assert [item['id'] for item in full['changes']['transactions']] == [transaction['id']]
+    assert [item['id'] for item in full['changes']['goals']] == [goal['id']]
+    assert full['has_more'] is False
+    with app.app_context():
+        assert full['family_id'] == User.query.filter_by(username='user17').first().family_id
+
+    client.put(f"/api/goals/{goal['id']}/update", json={'saved_amount': 250}, headers=headers)
+    client.delete(f"/api/transactions/{transaction['id']}", headers=headers)
+    client.post('/api/transactions/batch', json=[{
+        'date': '2025-03-02', 'description': 'Padaria', 'category': 'Mercado',
+        'amount': 12.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }], headers=headers)
+
+    delta = client.get(f"/api/sync?since={full['cursor']}", headers=headers).get_json()
+    assert [item['saved_amount'] for item in delta['changes']['goals']] == [250.0]
+    assert [item['description'] for item in delta['changes']['transactions']] == ['Padaria']
+    assert delta['deleted']['transactions'] == [transaction['id']]
+    assert delta['cursor'] > full['cursor']
+
+    first = client.get(f"/api/sync?since={full['cursor']}&limit=1", headers=headers).get_json()
+    assert first['has_more'] is True and first['changes']['goals'] and first['cursor'] == full['cursor'] + 1
+
+    empty = client.get(f"/api/sync?since={delta['cursor']}", headers=headers).get_json()
+    assert empty['cursor'] == delta['cursor'] and not any(empty['changes'].values())
+
+
+def test_sync_never_deletes_a_recreated_id(client):
+    token = _register_and_login(client, 'user17b')
+    headers = {'x-access-token': token}
+    payload = {'date': '2025-03-01', 'description': 'Farmácia', 'category': 'Saúde',
+               'amount': 35.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'}
+    first = client.post('/api/transactions', json=payload, headers=headers).get_json()
+    client.delete(f"/api/transactions/{first['id']}", headers=headers)
+    second = client.post('/api/transactions', json=payload, headers=headers).get_json()
+    assert second['id'] > first['id']
+
+    # Banco antigo que reutilizou o id: o upsert posterior supera o tombstone
+    family_id = db.session.get(Transaction, second['id']).family_id
+    db.session.add(Tombstone(family_id=family_id, entity='transactions', entity_id=second['id'], change_seq=1))
+    db.session.commit()
+    page = client.get('/api/sync?since=0', headers=headers).get_json()
+    assert [item['id'] for item in page['changes']['transactions']] == [second['id']]
+    assert page['deleted']['transactions'] == [first['id']]
+
+
+def test_autoincrement_migration_skips_deleted_ids():
+    legacy = create_engine('sqlite://')
+    with legacy.begin() as conn:
+        conn.execute(text('CREATE TABLE tombstone (id INTEGER PRIMARY KEY, family_id VARCHAR(50), entity VARCHAR(30), '
+                          'entity_id INTEGER, change_seq BIGINT, deleted_at DATETIME)'))
+        conn.execute(text("INSERT INTO tombstone (family_id, entity, entity_id, change_seq) VALUES ('f', 'goals', 7, 2)"))
+        conn.execute(text('CREATE TABLE goal (id INTEGER PRIMARY KEY, family_id VARCHAR(50) NOT NULL, '
+                          'name VARCHAR(200) NOT NULL, target_amount BIGINT NOT NULL, saved_amount BIGINT, '
+                          'created_at DATETIME, change_seq BIGINT)'))
+        conn.execute(text("INSERT INTO goal (id, family_id, name, target_amount) VALUES (3, 'f', 'Viagem', 100)"))
+    assert autoincrement_synced_ids(legacy) == ['goal']
+    with legacy.begin() as conn:
+        conn.execute(text("INSERT INTO goal (family_id, name, target_amount) VALUES ('f', 'Carro', 100)"))
+        assert conn.execute(text('SELECT id FROM goal ORDER BY id')).scalars().all() == [3, 8]
+    assert autoincrement_synced_ids(legacy) == []
+
+
+def test_events_stream_notifies_family_members(client):
+    token = _register_and_login(client, 'user18')
+    headers = {'x-access-token': token}
+    response = client.get(f'/api/events?access_token={token}', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = (chunk.decode() for chunk in response.response)
+    assert next(chunks).startswith('retry: 5000\nevent: ready')
+
+    created = client.post('/api/transactions', json={
+        'date': '2025-02-01', 'description': 'Cinema', 'category': 'Lazer',
+        'amount': 40.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }, headers=headers).get_json()
+    event = next(chunks)
+    assert event.startswith('event: change\n')
+    assert json.loads(event.split('data: ', 1)[1]) == {
+        'entity': 'transactions', 'action': 'created', 'id': created['id']
+    }
+    assert client.get('/api/events/stats', headers=headers).get_json()['subscribers'] == 1
+    response.close()
+    assert broker.stats()['subscribers'] == 0
+
+
+def test_events_stream_ends_when_token_expires_or_is_revoked():
+    expiring = event_stream(broker.subscribe('familia'), heartbeat=0.01, expires_at=time.time() + 0.05, jti='sse-a')
+    chunks = list(expiring)
+    assert chunks[0].startswith('retry: 5000') and chunks[-1] == 'event: expired\ndata: {}\n\n'
+
+    revoked_tokens.add('sse-b', time.time() + 60)
+    revoked = event_stream(broker.subscribe('familia'), heartbeat=0.01, expires_at=time.time() + 60, jti='sse-b', app=app)
+    assert list(revoked)[-1] == 'event: expired\ndata: {}\n\n'
+    assert broker.stats()['subscribers'] == 0
+
+
+def test_event_subscriber_queue_is_bounded():
+    local_broker = EventBroker(LocalBackend(), max_subscribers=2, max_per_family=1)
+    subscriber = local_broker.subscribe('familia')
+    with pytest.raises(BrokerFull):
+        local_broker.subscribe('familia')
+
+    for i in range(subscriber.queue.maxsize + 5):
+        local_broker.publish('familia', {'entity': 'transactions', 'action': 'created', 'id': i})
+    # Assinante lento: pendências descartadas e substituídas por um pedido de recarga
+    assert subscriber.overflows == 1
+    events = [subscriber.next_event(timeout=0) for _ in range(subscriber.queue.qsize())]
+    assert events[0] == {'entity': '*', 'action': 'resync'}
+    assert subscriber.queue.qsize() == 0
+
+
+def test_principal_is_cached_between_requests(client):
+    token = _register_and_login(client, 'user19')
+    headers = {'x-access-token': token}
+    assert client.get('/api/transactions', headers=headers).status_code == 200
+
+    with _QueryCounter() as counter:
+        assert client.get('/api/users/family-id', headers=headers).status_code == 200
+    assert not [sql for sql in counter.statements if 'FROM users' in sql]
+
+    # Trocar de família invalida o principal em cache imediatamente
+    client.put('/api/users/family-id', json={'family_id': 'outra_familia'}, headers=headers)
+    resp = client.get('/api/users/family-id', headers=headers)
+    assert resp.get_json()['family_id'] == 'outra_familia'
+
+    # Outro worker trocou a família: a notificação descarta o principal deste
+    user_id = next(iter(principal_cache._entries))
+    broker._deliver({'user_id': user_id, 'origin': 'outro'})
+    assert principal_cache.get(user_id) is None
+
+
+def test_ttl_cache_expires_entries():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('c', 3)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    now[0] = 11
+    assert cache.get('b') is None
+    assert cache.stats()['size'] == 1
+
+
+def test_login_upgrades_outdated_password_hash(client):
+    from main import app
+    _register_and_login(client, 'user20')
+    with app.app_context():
+        user = User.query.filter_by(username='user20').first()
+        user.password_hash = generate_password_hash('senha', 'pbkdf2:sha256:1000')
+        db.session.commit()
+
+    resp = client.post('/api/auth/login', json={'email': 'user20@email.com', 'password': 'senha'})
+    assert resp.status_code == 200
+    with app.app_context():
+        password_hash = User.query.filter_by(username='user20').first().password_hash
+    assert password_hash.startswith(hasher.method + '$')
+    assert client.post('/api/auth/login', json={
+        'email': 'user20@email.com', 'password': 'senha'
+    }).status_code == 200
+
+
+def test_password_hasher_rejects_when_queue_is_full():
+    limited = PasswordHasher(method='pbkdf2:sha256:1000', workers=1, max_pending=1)
+    password_hash = limited.hash('senha')
+    assert limited.verify(password_hash, 'senha')
+    assert not limited.needs_rehash(password_hash)
+
+    limited._slots.acquire()
+    with pytest.raises(HasherBusy):
+        limited.hash('senha')
+    limited._slots.release()
+    limited.shutdown()
+
+
+def test_refresh_token_rotation_and_logout(client):
+    client.post('/api/register', json={
+        'username': 'user21', 'email': 'user21@email.com',
+        'password': 'senha', 'confirm_password': 'senha'
+    })
+    tokens = client.post('/api/auth/login', json={
+        'email': 'user21@email.com', 'password': 'senha'
+    }).get_json()
+    assert tokens['expires_in'] > 0
+
+    refreshed = client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert refreshed.status_code == 200
+    # O refresh é de uso único
+    assert client.post('/api/auth/refresh', json={
+        'refresh_token': tokens['refresh_token']
+    }).status_code == 401
+    # Token de refresh não vale como token de acesso
+    assert client.get('/api/transactions', headers={
+        'x-access-token': refreshed.get_json()['refresh_token']
+    }).status_code == 401
+
+    headers = {'x-access-token': refreshed.get_json()['token']}
+    assert client.get('/api/transactions', headers=headers).status_code == 200
+    sync_revocations(force=True)
+    with _QueryCounter() as counter:
+        client.get('/api/users/family-id', headers=headers)
+    assert not [sql for sql in counter.statements if 'revoked_token' in sql]
+
+    client.post('/api/auth/logout', json={'refresh_token': refreshed.get_json()['refresh_token']},
+                headers=headers)
+    assert client.get('/api/transactions', headers=headers).status_code == 401
+
+    # A lista em memória é reconstruída a partir do banco na inicialização
+    revoked_tokens.clear()
+    with app.app_context():
+        load_revocations()
+    assert client.get('/api/transactions', headers=headers).status_code == 401
+
+
+def test_expired_and_legacy_tokens_are_rejected(client):
+    import jwt
+    _register_and_login(client, 'user22')
+    secret_key = os.environ.get('JWT_SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+    legacy = jwt.encode({'id': 1, 'family_id': 'familia'}, secret_key, algorithm='HS256')
+    expired = jwt.encode({'id': 1, 'family_id': 'familia', 'type': 'access', 'jti': 'x', 'exp': 1},
+                         secret_key, algorithm='HS256')
+    for token in (legacy, expired):
+        assert client.get('/api/transactions', headers={'x-access-token': token}).status_code == 401
+
+
+def test_revocation_list_evicts_expired_buckets():
+    now = [1000.0]
+    revocations = RevocationList(bucket_seconds=60, clock=lambda: now[0])
+    revocations.add('a', 1030)
+    revocations.add('b', 1500)
+    assert 'a' in revocations and 'b' in revocations
+    now[0] = 1100
+    revocations.evict()
+    assert 'a' not in revocations and 'b' in revocations
+    assert revocations.stats()['buckets'] == 1
+
+
+def test_upgrade_records_schema_version():
+    with app.app_context():
+        upgrade()
+        assert schema_version(db.engine) == MIGRATIONS[-1][0]
+        # Versões já registradas não são reaplicadas
+        assert upgrade() == []
+        assert SchemaVersion.query.count() == len(MIGRATIONS)
+
+
+def test_current_budget_issues_only_its_queries(client):
+    token = _register_and_login(client, 'user23')
+    headers = {'x-access-token': token}
+    today = date.today()
+    client.post('/api/budget', json={
+        'month': today.month, 'year': today.year, 'planned_income': 5000, 'planned_expenses': 3000
+    }, headers=headers)
+    budget_id = client.get('/api/budget/current', headers=headers).get_json()['id']
+    client.post(f'/api/budget/{budget_id}/categories', json={
+        'category_name': 'Mercado', 'planned_amount': 800
+    }, headers=headers)
+
+    with _QueryCounter() as counter:
+        response = client.get('/api/budget/current', headers=headers)
+    assert response.status_code == 200
+    assert [category['category_name'] for category in response.get_json()['categories']] == ['Mercado']
+    # Orçamento + categorias, sem sondagens de DDL
+    assert counter.count == 2
+    assert not [sql for sql in counter.statements if 'LIMIT 1' in sql or 'CREATE' in sql]
+
+
+def test_budget_categories_report_live_spend(client):
+    token = _register_and_login(client, 'user24')
+    headers = {'x-access-token': token}
+    today = date.today()
+    client.post('/api/budget', json={'month': today.month, 'year': today.year}, headers=headers)
+    budget_id = client.get('/api/budget/current', headers=headers).get_json()['id']
+    for name in ('Mercado', 'Transporte', 'Lazer'):
+        client.post(f'/api/budget/{budget_id}/categories', json={
+            'category_name': name, 'planned_amount': 500
+        }, headers=headers)
+    for category, amount, kind in (('Mercado', 120.5, 'despesa'), ('Mercado', 79.5, 'despesa'),
+                                   ('Lazer', 30.0, 'despesa'), ('Mercado', 999.0, 'receita')):
+        client.post('/api/transactions', json={
+            'date': today.isoformat(), 'description': category, 'category': category,
+            'amount': amount, 'transaction_type': kind, 'payment_method': 'PIX'
+        }, headers=headers)
+
+    with _QueryCounter() as counter:
+        analytics = client.get('/api/budget/analytics', headers=headers).get_json()
+    # Orçamento, categorias com gasto e histórico de tendência
+    assert counter.count == 3
+    spent = {category['category_name']: category['spent_amount'] for category in analytics['categories']}
+    assert spent == {'Mercado': 200.0, 'Transporte': 0.0, 'Lazer': 30.0}
+    assert analytics['total_spent'] == 230.0
+    assert analytics['remaining'] == 1270.0
+
+
+def test_budget_analytics_trends_in_single_query(client):
+    token = _register_and_login(client, 'user25')
+    headers = {'x-access-token': token}
+    today = date.today()
+    client.post('/api/budget', json={'month': today.month, 'year': today.year}, headers=headers)
+    budget_id = client.get('/api/budget/current', headers=headers).get_json()['id']
+    for name in ('Mercado', 'Lazer', 'Saúde', 'Educação'):
+        client.post(f'/api/budget/{budget_id}/categories', json={
+            'category_name': name, 'planned_amount': 100
+        }, headers=headers)
+    first_of_month = today.replace(day=1)
+    for when, category, amount in ((first_of_month, 'Mercado', 150.0),
+                                   (first_of_month - timedelta(days=1), 'Mercado', 100.0),
+                                   (first_of_month - timedelta(days=40), 'Lazer', 60.0)):
+        client.post('/api/transactions', json={
+            'date': when.isoformat(), 'description': category, 'category': category,
+            'amount': amount, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+        }, headers=headers)
+
+    with _QueryCounter() as counter:
+        analytics = client.get('/api/budget/analytics?trend_months=3', headers=headers).get_json()
+    assert counter.count == 3
+    assert len(analytics['trend_months']) == 3
+    assert analytics['trend_months'][-1] == today.strftime('%m/%Y')
+    by_name = {category['category_name']: category for category in analytics['categories']}
+    assert by_name['Mercado']['trend_history'] == [0, 100.0, 150.0]
+    assert by_name['Mercado']['trend'] == 50.0
+    assert by_name['Mercado']['trend_direction'] == 'up'
+    assert by_name['Lazer']['trend_history'] == [60.0, 0, 0]
+    assert by_name['Saúde']['trend_direction'] == 'stable'
+
+
+def test_budget_suggestions_window_crosses_january(client):
+    token = _register_and_login(client, 'user26')
+    headers = {'x-access-token': token}
+    spend = {'2024-10-10': 300.0, '2024-11-10': 100.0, '2024-12-10': 200.0, '2025-01-10': 999.0}
+    for when, amount in spend.items():
+        client.post('/api/transactions', json={
+            'date': when, 'description': 'Mercado', 'category': 'Mercado',
+            'amount': amount, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+        }, headers=headers)
+    client.post('/api/transactions', json={
+        'date': '2024-12-05', 'description': 'Salário', 'category': 'Salário',
+        'amount': 5000.0, 'transaction_type': 'receita', 'payment_method': 'PIX'
+    }, headers=headers)
+
+    with app.app_context():
+        family_id = User.query.filter_by(username='user26').first().family_id
+        # Janeiro/2025: os 3 meses completos anteriores são out/nov/dez de 2024
+        result = build_budget_suggestions(family_id, 2025, 1, months=3, pct=75)
+    mercado = result['category_suggestions'][0]
+    assert mercado['category'] == 'Mercado'
+    assert mercado['months'] == 3
+    assert mercado['median'] == 200.0
+    assert mercado['mean'] == 200.0
+    assert mercado['suggested_amount'] == percentile([300.0, 100.0, 200.0], 75) == 250.0
+    assert mercado['margin'] == 50.0
+    assert result['suggested_income'] == 0
+    assert result['total_suggested_expenses'] == 250.0
+
+
+def test_budget_suggestions_cached_until_family_writes(client):
+    token = _register_and_login(client, 'user27')
+    headers = {'x-access-token': token}
+    last_month = date.today().replace(day=1) - timedelta(days=1)
+    client.post('/api/transactions', json={
+        'date': last_month.isoformat(), 'description': 'Mercado', 'category': 'Mercado',
+        'amount': 400.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }, headers=headers)
+
+    first = client.get('/api/budget/suggestions', headers=headers).get_json()
+    assert first['category_suggestions'][0]['suggested_amount'] == 400.0
+    with _QueryCounter() as counter:
+        assert client.get('/api/budget/suggestions', headers=headers).get_json() == first
+    assert counter.count == 0
+
+    client.post('/api/transactions', json={
+        'date': last_month.isoformat(), 'description': 'Feira', 'category': 'Mercado',
+        'amount': 100.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }, headers=headers)
+    refreshed = client.get('/api/budget/suggestions', headers=headers).get_json()
+    assert refreshed['category_suggestions'][0]['suggested_amount'] == 500.0
+
+
+def test_budget_rollover_copies_year_in_one_transaction(client):
+    token = _register_and_login(client, 'user28')
+    headers = {'x-access-token': token}
+    client.post('/api/budget', json={
+        'month': 11, 'year': 2025, 'planned_income': 5000, 'planned_expenses': 1000
+    }, headers=headers)
+    client.post('/api/budget', json={'month': 2, 'year': 2026, 'planned_income': 1}, headers=headers)
+    with app.app_context():
+        source_id = db.session.execute(text(
+            "SELECT id FROM budgets WHERE month = 11 AND year = 2025"
+        )).scalar()
+    for name, amount in (('Mercado', 800), ('Lazer', 150.5), ('Moradia', 2000)):
+        client.post(f'/api/budget/{source_id}/categories', json={
+            'category_name': name, 'planned_amount': amount
+        }, headers=headers)
+
+    with _QueryCounter() as counter:
+        resp = client.post('/api/budget/rollover', json={
+            'month': 11, 'year': 2025, 'months': 12, 'adjustment_percent': 10
+        }, headers=headers)
+    assert resp.status_code == 201
+    data = resp.get_json()
+    assert len(data['created']) == 11
+    assert data['skipped'] == [{'year': 2026, 'month': 2}]
+    assert data['created'][1] == {'year': 2026, 'month': 1}
+    assert data['categories_copied'] == 33
+    assert len([sql for sql in counter.statements if sql.lstrip().upper().startswith('INSERT')]) == 2
+
+    with app.app_context():
+        rows = db.session.execute(text('''
+            SELECT b.total_income, bc.category_name, bc.planned_amount
+            FROM budgets b JOIN budget_categories bc ON bc.budget_id = b.id
+            WHERE b.year = 2026 AND b.month = 10 ORDER BY bc.category_name
+        ''')).all()
+        untouched = db.session.execute(text(
+            "SELECT total_income FROM budgets WHERE year = 2026 AND month = 2"
+        )).scalar()
+    assert [tuple(row) for row in rows] == [
+        (5500.0, 'Lazer', 165.55), (5500.0, 'Mercado', 880.0), (5500.0, 'Moradia', 2200.0)
+    ]
+    assert untouched == 1.0
+    # Repetir (ou concorrer com) o mesmo rollover mantém os meses já criados
+    again = client.post('/api/budget/rollover', json={'month': 11, 'year': 2025, 'months': 12},
+                        headers=headers)
+    assert again.status_code == 201
+    assert again.get_json()['created'] == [] and len(again.get_json()['skipped']) == 12
+    assert client.post('/api/budget/rollover', json={'month': 5, 'year': 2020, 'months': 2},
+                       headers=headers).status_code == 404
+
+
+def test_replace_budget_categories_applies_diff_in_bulk(client):
+    token = _register_and_login(client, 'user29')
+    headers = {'x-access-token': token}
+    today = date.today()
+    client.post('/api/budget', json={'month': today.month, 'year': today.year}, headers=headers)
+    budget_id = client.get('/api/budget/current', headers=headers).get_json()['id']
+    initial = [{'category_name': f'Categoria {i:02d}', 'planned_amount': 100 + i} for i in range(30)]
+    assert client.put(f'/api/budget/{budget_id}/categories', json={'categories': initial},
+                      headers=headers).status_code == 200
+    first_id = client.get('/api/budget/current', headers=headers).get_json()['categories'][0]['id']
+
+    edited = [dict(category, planned_amount=500) for category in initial[:20]]
+    edited.append({'category_name': 'Nova', 'planned_amount': 42, 'priority': 1})
+    with _QueryCounter() as counter:
+        resp = client.put(f'/api/budget/{budget_id}/categories', json={'categories': edited},
+                          headers=headers)
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert (data['deleted'], data['upserted']) == (10, 21)
+    # Verificação do orçamento, DELETE, INSERT ... ON CONFLICT em lote e leitura final
+    assert counter.count <= 4
+    by_name = {category['category_name']: category for category in data['categories']}
+    assert len(by_name) == 21
+    assert by_name['Categoria 00']['planned_amount'] == 500
+    # Categorias mantidas preservam o id
+    assert by_name['Categoria 00']['id'] == first_id
+    assert by_name['Nova']['planned_amount'] == 42
+
+    duplicated = [{'category_name': 'A', 'planned_amount': 1}, {'category_name': 'A', 'planned_amount': 2}]
+    assert client.put(f'/api/budget/{budget_id}/categories', json={'categories': duplicated},
+                      headers=headers).status_code == 400
+    for invalid in (['Mercado'], [42], [None]):
+        assert client.put(f'/api/budget/{budget_id}/categories', json={'categories': invalid},
+                          headers=headers).status_code == 400
+    assert client.post(f'/api/budget/{budget_id}/categories', json={
+        'category_name': 'Nova', 'planned_amount': 1
+    }, headers=headers).status_code == 409
+    other = _register_and_login(client, 'user30')
+    assert client.put(f'/api/budget/{budget_id}/categories', json={'categories': []},
+                      headers={'x-access-token': other}).status_code == 404
+
+
+def test_budget_upsert_is_single_statement(client):
+    token = _register_and_login(client, 'user31')
+    headers = {'x-access-token': token}
+    with _QueryCounter() as counter:
+        client.post('/api/budget', json={'month': 3, 'year': 2025, 'planned_income': 100}, headers=headers)
+    upserts = [sql for sql in counter.statements if 'ON CONFLICT' in sql]
+    assert len(upserts) == 1
+    client.post('/api/budget', json={'month': 3, 'year': 2025, 'planned_income': 200}, headers=headers)
+    with app.app_context():
+        rows = db.session.execute(text(
+            "SELECT family_id, total_income FROM budgets WHERE year = 2025 AND month = 3"
+        )).all()
+        family_id = User.query.filter_by(username='user31').first().family_id
+    assert [tuple(row) for row in rows] == [(family_id, 200.0)]
+
+
+def test_parallel_budget_creates_keep_one_row(tmp_path):
+    import threading
+    engine = create_engine(f"sqlite:///{tmp_path / 'budgets.db'}", connect_args={'timeout': 30})
+    budgets_table.create(engine)
+    barrier = threading.Barrier(8)
+    ids = []
+    errors = []
+
+    def create(i):
+        barrier.wait()
+        try:
+            with engine.begin() as conn:
+                ids.append(conn.execute(text(UPSERT_BUDGET_SQL), {
+                    'family_id': 'familia-uuid', 'month': 1, 'year': 2026,
+                    'total_income': 1000 + i, 'total_planned': 0
+                }).scalar())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=create, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(ids)) == 1
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM budgets')).scalar() == 1
+    engine.dispose()
+
+
+def test_concurrent_rollup_writes_create_one_group(tmp_path):
+    import threading
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollup.db'}", connect_args={'timeout': 30})
+    MonthlyRollup.__table__.create(engine)
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def write(amount):
+        barrier.wait()
+        try:
+            with engine.begin() as conn:
+                upsert_rollup(conn, {('familia', 2025, 4, 'despesa', 'Mercado'): (amount, 1, amount, amount)})
+        except Exception as e:
+            errors.append(e)
+
+    # Sessões separadas gravando a primeira linha do mesmo grupo
+    threads = [threading.Thread(target=write, args=(amount,)) for amount in (1050, 2001)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with engine.connect() as conn:
+        assert conn.execute(select(
+            MonthlyRollup.total_amount, MonthlyRollup.count, MonthlyRollup.min_amount, MonthlyRollup.max_amount
+        )).all() == [(30.51, 2, 10.5, 20.01)]
+    engine.dispose()
+
+
+def _seed_forecast_history(family_id):
+    """Março/2025 até o dia 10 com R$ 10 por dia em duas categorias; Mercado tem um ano de histórico"""
+    rows = []
+    for day in range(1, 11):
+        for category in ('Mercado', 'Lazer'):
+            rows.append({'date': date(2025, 3, day), 'category': category, 'amount': 10.0})
+    for months_back in range(1, 13):
+        year, month = divmod(2025 * 12 + 2 - months_back, 12)
+        # Março do ano passado gastou o dobro: índice sazonal acima de 1
+        amount = 600.0 if (year, month + 1) == (2024, 3) else 300.0
+        rows.append({'date': date(year, month + 1, 15), 'category': 'Mercado', 'amount': amount})
+    db.session.execute(insert(Transaction), [dict(
+        row, family_id=family_id, description=row['category'], transaction_type='despesa',
+        payment_method='PIX'
+    ) for row in rows])
+    db.session.commit()
+    rebuild_rollup()
+
+
+def test_forecast_projects_month_end_per_category(client):
+    with app.app_context():
+        _seed_forecast_history('familia_previsao')
+        _seed_forecast_history('outra_familia')
+        result = compute_forecasts(date(2025, 3, 10))
+        assert sorted(set(result['family_id'].tolist())) == ['familia_previsao', 'outra_familia']
+
+        forecast = family_forecast('familia_previsao', date(2025, 3, 10))
+        by_category = {item['category']: item for item in forecast['categories']}
+        # Sem histórico: só o ritmo do mês (R$ 10/dia nos 21 dias restantes)
+        assert by_category['Lazer']['forecast'] == by_category['Lazer']['pace'] == 310.0
+        mercado = by_category['Mercado']
+        assert mercado['spent_to_date'] == 100.0
+        assert mercado['seasonal_index'] == round(600 / 325, 3)
+        assert mercado['expected'] == 600.0
+        assert mercado['forecast'] == round(10 / 31 * 310 + 21 / 31 * 600, 2)
+        assert forecast['total_forecast'] == round(mercado['forecast'] + 310.0, 2)
+
+        assert store_forecasts(date(2025, 3, 10), result) == 4
+        assert store_forecasts(date(2025, 3, 10), result) == 4
+        stored = SpendForecast.query.filter_by(family_id='familia_previsao', category='Lazer').one()
+        assert stored.forecast == 310.0
+
+
+def test_budget_forecast_endpoint_compares_with_plan(client):
+    token = _register_and_login(client, 'user32')
+    headers = {'x-access-token': token}
+    today = date.today()
+    client.post('/api/budget', json={'month': today.month, 'year': today.year}, headers=headers)
+    budget_id = client.get('/api/budget/current', headers=headers).get_json()['id']
+    client.put(f'/api/budget/{budget_id}/categories', json={'categories': [
+        {'category_name': 'Mercado', 'planned_amount': 50}
+    ]}, headers=headers)
+    client.post('/api/transactions', json={
+        'date': today.replace(day=1).isoformat(), 'description': 'Mercado', 'category': 'Mercado',
+        'amount': 80.0, 'transaction_type': 'despesa', 'payment_method': 'PIX'
+    }, headers=headers)
+
+    data = client.get('/api/budget/forecast', headers=headers).get_json()
+    assert data['as_of'] == today.isoformat()
+    [mercado] = data['categories']
+    assert mercado['spent_to_date'] == 80.0
+    assert mercado['forecast'] >= 80.0
+    assert mercado['planned_amount'] == 50
+    assert mercado['over_budget'] is True
@@ -4,6 +4,7 @@ import { Alert, AlertDescription } from '@/components/ui/alert'
 import { Button } from '@/components/ui/button'
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog'
 import { Input } from '@/components/ui/input'
+import { freshAccessToken } from '@/lib/auth'
 import { 
   TrendingUp, 
   TrendingDown, 
@@ -41,6 +42,37 @@ const Dashboard = () => {
     fetchFamilyId()
   }, [])
 
+  // Atualiza o resumo quando outro membro da família registra algo, sem polling
+  useEffect(() => {
+    let events = null
+    let retry = null
+    let stopped = false
+
+    // O stream autentica só na abertura: ao expirar ou cair, reabre com um token renovado
+    const connect = async () => {
+      const token = await freshAccessToken()
+      if (stopped || !token) return
+      const source = new EventSource(`http://localhost:5000/api/events?access_token=${encodeURIComponent(token)}`)
+      const reconnect = (delay) => {
+        if (events !== source) return
+        source.close()
+        events = null
+        retry = setTimeout(connect, delay)
+      }
+      source.addEventListener('change', () => fetchDashboardData())
+      source.addEventListener('expired', () => reconnect(0))
+      source.onerror = () => reconnect(5000)
+      events = source
+    }
+
+    connect()
+    return () => {
+      stopped = true
+      clearTimeout(retry)
+      if (events) events.close()
+    }
+  }, [])
+
   const fetchDashboardData = async () => {
     try {
       const token = localStorage.getItem('token')
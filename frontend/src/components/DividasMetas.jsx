@@ -16,6 +16,7 @@ import {
   Edit,
   Trash2
 } from 'lucide-react'
+import { syncCollections } from '@/lib/sync'
 
 const DividasMetas = () => {
   const [debts, setDebts] = useState([])
@@ -49,20 +50,10 @@ const DividasMetas = () => {
   const fetchDebts = async () => {
     try {
       const token = localStorage.getItem('token')
-      const response = await fetch('http://localhost:5000/api/debts', {
-        headers: {
-          'x-access-token': token,
-        },
-      })
-
-      if (response.ok) {
-        const data = await response.json()
-        setDebts(data)
-      } else {
-        setError('Erro ao carregar dívidas')
-      }
+      const collections = await syncCollections(token)
+      setDebts(collections.debts || [])
     } catch (error) {
-      setError('Erro de conexão')
+      setError('Erro ao carregar dívidas')
     } finally {
       setLoading(false)
     }
@@ -71,20 +62,10 @@ const DividasMetas = () => {
   const fetchGoals = async () => {
     try {
       const token = localStorage.getItem('token')
-      const response = await fetch('http://localhost:5000/api/goals', {
-        headers: {
-          'x-access-token': token,
-        },
-      })
-
-      if (response.ok) {
-        const data = await response.json()
-        setGoals(data)
-      } else {
-        setError('Erro ao carregar metas')
-      }
+      const collections = await syncCollections(token)
+      setGoals(collections.goals || [])
     } catch (error) {
-      setError('Erro de conexão')
+      setError('Erro ao carregar metas')
     }
   }
 
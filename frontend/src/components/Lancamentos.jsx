@@ -18,6 +18,7 @@ import {
 
 const Lancamentos = () => {
   const [transactions, setTransactions] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
   const [dialogOpen, setDialogOpen] = useState(false)
@@ -46,10 +47,11 @@ const Lancamentos = () => {
     fetchTransactions()
   }, [])
 
-  const fetchTransactions = async () => {
+  const fetchTransactions = async (cursor = null) => {
     try {
       const token = localStorage.getItem('token')
-      const response = await fetch('http://localhost:5000/api/transactions', {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''
+      const response = await fetch(`http://localhost:5000/api/transactions${query}`, {
         headers: {
           'x-access-token': token,
         },
@@ -57,7 +59,8 @@ const Lancamentos = () => {
 
       if (response.ok) {
         const data = await response.json()
-        setTransactions(data)
+        setTransactions(cursor ? (prev) => [...prev, ...data.items] : data.items)
+        setNextCursor(data.next_cursor)
       } else {
         setError('Erro ao carregar transações')
       }
@@ -399,6 +402,15 @@ const Lancamentos = () => {
                   </div>
                 </div>
               ))}
+              {nextCursor && (
+                <Button
+                  variant="outline"
+                  className="w-full"
+                  onClick={() => fetchTransactions(nextCursor)}
+                >
+                  Carregar mais
+                </Button>
+              )}
             </div>
           )}
         </CardContent>
@@ -1,5 +1,7 @@
 import { useState } from 'react'
 import { Outlet, Link, useLocation, useNavigate } from 'react-router-dom'
+import { API_BASE_URL } from '@/config/api'
+import { clearTokens } from '@/lib/auth'
 import { Button } from '@/components/ui/button'
 import { Sheet, SheetContent, SheetTrigger, SheetTitle, SheetDescription } from '@/components/ui/sheet'
 import { 
@@ -30,7 +32,16 @@ const Layout = ({ setIsAuthenticated }) => {
   ]
 
   const handleLogout = () => {
-    localStorage.removeItem('token')
+    // Revoga os tokens no servidor; a saída local não depende da resposta
+    fetch(`${API_BASE_URL}/auth/logout`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'x-access-token': localStorage.getItem('token') || '',
+      },
+      body: JSON.stringify({ refresh_token: localStorage.getItem('refresh_token') }),
+    }).catch(() => {})
+    clearTokens()
     setIsAuthenticated(false)
     navigate('/login')
   }
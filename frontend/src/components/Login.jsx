@@ -7,6 +7,7 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/com
 import { Alert, AlertDescription } from '@/components/ui/alert'
 import { LogIn, Users } from 'lucide-react'
 import { API_BASE_URL } from '@/config/api'
+import { storeTokens } from '@/lib/auth'
 
 const Login = ({ setIsAuthenticated }) => {
   const [formData, setFormData] = useState({
@@ -59,7 +60,7 @@ const Login = ({ setIsAuthenticated }) => {
       }
 
       const data = await response.json()
-      localStorage.setItem('token', data.token)
+      storeTokens(data)
       setIsAuthenticated(true)
       navigate('/dashboard')
       
@@ -253,21 +253,34 @@ const Orcamento = () => {
     }
   }
 
-  const updateCategory = async (categoryId, updates) => {
-    try {
-      const token = localStorage.getItem('token')
-      const response = await fetch(`http://localhost:5000/api/budget/categories/${categoryId}`, {
-        method: 'PUT',
-        headers: {
-          'Content-Type': 'application/json',
-          'x-access-token': token
-        },
-        body: JSON.stringify(updates)
+  // Grava a lista completa de categorias em uma única requisição (diferença aplicada no servidor)
+  const saveCategories = async (categories) => {
+    const token = localStorage.getItem('token')
+    const response = await fetch(`http://localhost:5000/api/budget/${currentBudget.id}/categories`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+        'x-access-token': token
+      },
+      body: JSON.stringify({
+        categories: categories.map(({ category_name, planned_amount, color, description, priority }) => ({
+          category_name, planned_amount, color, description, priority
+        }))
       })
+    })
+    if (response.ok) {
+      await fetchBudgetData()
+      await fetchAnalytics()
+    }
+    return response.ok
+  }
 
-      if (response.ok) {
-        await fetchBudgetData()
-        await fetchAnalytics()
+  const updateCategory = async (categoryId, updates) => {
+    try {
+      const categories = (currentBudget?.categories || []).map((category) =>
+        category.id === categoryId ? { ...category, ...updates } : category
+      )
+      if (await saveCategories(categories)) {
         setEditingCategory(null)
       } else {
         setError('Erro ao atualizar categoria')
@@ -281,16 +294,8 @@ const Orcamento = () => {
     if (!confirm('Tem certeza que deseja excluir esta categoria?')) return
 
     try {
-      const token = localStorage.getItem('token')
-      const response = await fetch(`http://localhost:5000/api/budget/categories/${categoryId}`, {
-        method: 'DELETE',
-        headers: { 'x-access-token': token }
-      })
-
-      if (response.ok) {
-        await fetchBudgetData()
-        await fetchAnalytics()
-      } else {
+      const categories = (currentBudget?.categories || []).filter((category) => category.id !== categoryId)
+      if (!(await saveCategories(categories))) {
         setError('Erro ao excluir categoria')
       }
     } catch (error) {
@@ -0,0 +1,80 @@
+import { API_BASE_URL } from '@/config/api'
+
+const REFRESH_URL = `${API_BASE_URL}/auth/refresh`
+
+export function storeTokens(data) {
+  localStorage.setItem('token', data.token)
+  if (data.refresh_token) {
+    localStorage.setItem('refresh_token', data.refresh_token)
+  }
+}
+
+export function clearTokens() {
+  localStorage.removeItem('token')
+  localStorage.removeItem('refresh_token')
+}
+
+// Expiração (ms) lida do payload do JWT; 0 se o token não puder ser lido
+const tokenExpiresAt = (token) => {
+  try {
+    return JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/'))).exp * 1000
+  } catch {
+    return 0
+  }
+}
+
+// Um único refresh em andamento, compartilhado pelas requisições que receberam 401 juntas
+let pendingRefresh = null
+
+const refreshTokens = (nativeFetch) => {
+  if (!pendingRefresh) {
+    const refreshToken = localStorage.getItem('refresh_token')
+    pendingRefresh = (refreshToken
+      ? nativeFetch(REFRESH_URL, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh_token: refreshToken }),
+        }).then(async (response) => {
+          if (!response.ok) return null
+          const data = await response.json()
+          storeTokens(data)
+          return data.token
+        })
+      : Promise.resolve(null)
+    ).finally(() => {
+      pendingRefresh = null
+    })
+  }
+  return pendingRefresh
+}
+
+// Tokens de acesso expiram em minutos: ao receber 401, renova com o refresh token e repete a requisição
+let nativeFetch = (...args) => window.fetch(...args)
+
+export function installTokenRefresh() {
+  nativeFetch = window.fetch.bind(window)
+  window.fetch = async (input, init = {}) => {
+    const response = await nativeFetch(input, init)
+    const headers = new Headers(init.headers || {})
+    if (response.status !== 401 || !headers.has('x-access-token')) {
+      return response
+    }
+    const token = await refreshTokens(nativeFetch)
+    if (!token) {
+      clearTokens()
+      return response
+    }
+    headers.set('x-access-token', token)
+    return nativeFetch(input, { ...init, headers })
+  }
+}
+
+// Token de acesso ainda válido por pelo menos um minuto, renovado se preciso.
+// Para conexões que não passam pelo fetch, como o EventSource
+export async function freshAccessToken() {
+  const token = localStorage.getItem('token')
+  if (token && tokenExpiresAt(token) - Date.now() > 60000) {
+    return token
+  }
+  return refreshTokens(nativeFetch)
+}
@@ -0,0 +1,62 @@
+const SYNC_URL = 'http://localhost:5000/api/sync'
+const STATE_KEY = 'sync'
+
+const emptyState = (familyId = null) => ({ familyId, cursor: 0, collections: {} })
+
+const loadState = () => {
+  try {
+    return JSON.parse(localStorage.getItem(STATE_KEY)) || emptyState()
+  } catch {
+    return emptyState()
+  }
+}
+
+// Busca só o que mudou desde o último cursor e aplica sobre a cópia local
+const runSync = async (token) => {
+  let state = loadState()
+
+  let hasMore = true
+  while (hasMore) {
+    const response = await fetch(`${SYNC_URL}?since=${state.cursor}`, {
+      headers: { 'x-access-token': token },
+    })
+    if (!response.ok) {
+      throw new Error('Erro ao sincronizar')
+    }
+    const data = await response.json()
+
+    // O cursor é da família servida pela API, não da família no token, que
+    // fica defasada após trocar de família: outra família recomeça do zero
+    if (data.family_id !== state.familyId) {
+      const restart = state.cursor !== 0
+      state = emptyState(data.family_id)
+      if (restart) continue
+    }
+
+    for (const [entity, items] of Object.entries(data.changes)) {
+      const byId = new Map((state.collections[entity] || []).map((item) => [item.id, item]))
+      // Exclusões primeiro: um id reaproveitado chega como upsert mais novo
+      ;(data.deleted[entity] || []).forEach((id) => byId.delete(id))
+      items.forEach((item) => byId.set(item.id, item))
+      state.collections[entity] = [...byId.values()]
+    }
+    state.cursor = data.cursor
+    hasMore = data.has_more
+  }
+
+  localStorage.setItem(STATE_KEY, JSON.stringify(state))
+  return state.collections
+}
+
+// Uma sincronização por vez: chamadas simultâneas compartilham a que está em andamento,
+// em vez de ler o mesmo cursor e sobrescrever o estado uma da outra
+let pendingSync = null
+
+export function syncCollections(token) {
+  if (!pendingSync) {
+    pendingSync = runSync(token).finally(() => {
+      pendingSync = null
+    })
+  }
+  return pendingSync
+}
@@ -2,12 +2,15 @@ import React, { StrictMode } from 'react'
 import { createRoot } from 'react-dom/client'
 import './index.css'
 import App from './App.jsx'
+import { installTokenRefresh } from './lib/auth'
 
 // Garantir que o React esteja disponível globalmente em produção
 if (typeof window !== 'undefined') {
   window.React = React
 }
 
+installTokenRefresh()
+
 const container = document.getElementById('root')
 if (!container) {
   throw new Error('Root element not found')